@@ -2,26 +2,27 @@ from outcome_switch.main import OutcomeSwitchingDetector
 from outcome_switch.utils import get_sections_text
 from outcome_switch.visual import get_sankey_diagram, get_highlighted_text, get_markdown
 import json
+
+with open('./config.json', 'r') as f:
+    config = json.load(f)
+# models are loaded in a background thread while gradio is imported and the interface is built, 
+# requests sent before the end of the loading wait for it
+osd = OutcomeSwitchingDetector({"model_loading": "background"} | config)
+
 import gradio as gr
 
 TITLE = "Outcome Switching Detection"
 DESCRIPTION = open("front/DESCRIPTION.md").read()
 ARTICLE_TEXT_TEMPLATE = open("front/ARTICLE_TEXT_TEMPLATE.md").read()
-EXAMPLES_TITLE = open("front/EXAMPLES_TITLE.html").read()
-PMC_LINK = open("front/PMC_LINK_BOX.html").read()
 PMID_EXAMPLES = json.load(open("front/EXAMPLES.json"))
 pmcid_start_value = PMID_EXAMPLES[0]
 
-with open('./config.json', 'r') as f:
-    config = json.load(f)
-osd = OutcomeSwitchingDetector(config)
-
 def detect_outswitch_pmid(id:str):
     output = osd.detect(str(id))
     filtered_article = get_markdown(output, ARTICLE_TEXT_TEMPLATE) if output["filtered_sections"] else "*Article not found*"
     detected_annotations = [("No annotations found", None)] if not output["raw_entities"] else get_highlighted_text(output["raw_entities"], get_sections_text(output["filtered_sections"]))
     registry_outcomes = {"CTGOV": "No registry entry found"} if not output["detected_nct_id"]  else {"NCT_ID": output["detected_nct_id"]} | {"registry_outcomes" : output["registry_outcomes"]}
-    similarity_diagram = get_sankey_diagram(output) if output["connections"] and "NCT_ID" in registry_outcomes and not ("No annotations found", None) in detected_annotations else None
+    similarity_diagram = get_sankey_diagram(output) if len(output["connections"]) and "NCT_ID" in registry_outcomes and not ("No annotations found", None) in detected_annotations else None
     return filtered_article, detected_annotations, registry_outcomes, similarity_diagram
 
 def clean():
@@ -0,0 +1,229 @@
+"""Offline benchmark of the whole detection pipeline. The NCBI id converter, E-utilities efetch and
+ClinicalTrials.gov API v2 are replaced by a local stub server replaying the recorded fixtures of
+`test/examples` (article `NCT01623843_PMC6206648/raw.xml` and API v2 record `ctgov_example_apiv2.json`),
+cloned into a synthetic corpus of `--articles` articles (distinct pmids / pmcids) linked to `--trials`
+distinct trials. The registry is read with the API v2 backend (no html fixture of the classic record).
+
+Three phases are run on the same detector (models are loaded once, the embedding cache is disabled) :
+- batch : `detect_many` on the whole corpus, throughput in articles per second
+- single : `detect` on the first `--requests` articles, p50 / p95 latency of a request
+- stages : each stage (xml parsing, section filtering, ner, registry, similarity) timed on its own per article,
+  registry records are already in the memory of the API v2 backend at this point
+Each phase also reports the stage metrics recorded by `outcome_switch.metrics` and the peak RSS of the process.
+
+Usage : python benchmarks/bench_pipeline.py [--config config.json] [--articles 200] [--trials 50] [--output results.json]
+"""
+import sys
+import copy
+import json
+import time
+import platform
+import resource
+import argparse
+import threading
+import subprocess
+import numpy as np
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from xml.etree import ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Callable
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.main import OutcomeSwitchingDetector
+from outcome_switch.article.parse import ResponseParser
+from outcome_switch.utils import get_sections_text, filter_outcomes
+from outcome_switch.metrics import METRICS
+
+EXAMPLES_DIR = Path(__file__).parent.parent / "test" / "examples"
+EXAMPLE_XML = EXAMPLES_DIR / "NCT01623843_PMC6206648" / "raw.xml"
+EXAMPLE_STUDY = EXAMPLES_DIR / "ctgov_example_apiv2.json"
+EXAMPLE_IDS = {"pmid": "30373659", "pmcid": "6206648", "nct_id": "NCT01623843"}
+
+
+class SyntheticCorpus:
+    """Clones of the example article with their own pmid, pmcid and nct id, and the registry records of their trials"""
+
+    def __init__(self, n_articles: int, n_trials: int) -> None:
+        example_xml = EXAMPLE_XML.read_text(encoding="utf-8")
+        with open(EXAMPLE_STUDY, "r", encoding="utf-8") as f:
+            example_study = json.load(f)
+        self.pmids = [str(90000000 + i) for i in range(n_articles)]
+        self.pmcids = [f"PMC{9000000 + i}" for i in range(n_articles)]
+        self.nct_ids = [f"NCT9{i % n_trials:07d}" for i in range(n_articles)]
+        self.articles = {} # pmcid : article xml
+        for pmid, pmcid, nct_id in zip(self.pmids, self.pmcids, self.nct_ids):
+            self.articles[pmcid] = (example_xml.replace(EXAMPLE_IDS["pmid"], pmid)
+                                               .replace(EXAMPLE_IDS["pmcid"], pmcid[3:])
+                                               .replace(EXAMPLE_IDS["nct_id"], nct_id))
+        self.studies = {} # nct id : API v2 record
+        for nct_id in dict.fromkeys(self.nct_ids):
+            study = copy.deepcopy(example_study)
+            study["protocolSection"]["identificationModule"]["nctId"] = nct_id
+            self.studies[nct_id] = study
+        self.id_records = {} # pmid or pmcid : id converter record
+        for pmid, pmcid in zip(self.pmids, self.pmcids):
+            self.id_records[pmid] = self.id_records[pmcid] = {"pmcid": pmcid, "pmid": pmid}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers the id converter (`/idconv`), efetch (`/eutils/efetch.fcgi`) and API v2 (`/api/v2/studies`) requests from the corpus"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        corpus = self.server.corpus
+        if url.path == "/idconv":
+            records = [{"requested-id": id} | corpus.id_records.get(id, {"errmsg": "invalid article id"})
+                       for id in params["ids"][0].split(",")]
+            self._send(json.dumps({"status": "ok", "responseDate": "", "records": records}).encode(), "application/json")
+        elif url.path == "/eutils/efetch.fcgi":
+            articles = [corpus.articles[pmcid] for pmcid in params["id"][0].split(",") if pmcid in corpus.articles]
+            body = "<pmc-articleset>" + "".join(articles) + "</pmc-articleset>"
+            self._send(body.encode("utf-8"), "text/xml")
+        elif url.path == "/api/v2/studies":
+            studies = [corpus.studies[nct_id] for nct_id in params["filter.ids"][0].split(",") if nct_id in corpus.studies]
+            self._send(json.dumps({"studies": studies}).encode(), "application/json")
+        else:
+            self._send(b"not found", "text/plain", 404)
+
+    do_POST = do_GET # efetch requests of 200 ids are POST requests (parameters are still in the url)
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(corpus: SyntheticCorpus) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.corpus = corpus
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_detector(config: Dict[str, Any], stub_url: str) -> OutcomeSwitchingDetector:
+    """Detector of the config, without persistent caches nor rate limit, whose clients send their requests to the stub server"""
+    config = {key: value for key, value in config.items() if not key.endswith(("_cache_dir", "id_store_dir"))}
+    config |= {"registry_backend": "api_v2", "embedding_cache_max_memory": 0, "ncbi_request_rate": 1e6}
+    detector = OutcomeSwitchingDetector(config)
+    detector.article_downloader.id_converter.ID_CONVERTER_URL = stub_url + "/idconv"
+    detector.article_downloader.entrez_downloader.E_UTILITIES_URL = stub_url + "/eutils/"
+    detector.registry_extractor.backend.api_url = stub_url + "/api/v2/studies"
+    detector.wait_until_ready() # models loading is not part of the phases
+    return detector
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the process in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024 # kilobytes on linux
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Count, mean, p50, p95 and max of latencies in seconds"""
+    if not latencies:
+        return {"count": 0}
+    return {"count": len(latencies), "mean": float(np.mean(latencies)), "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)), "max": float(np.max(latencies))}
+
+
+def timed(function: Callable, *args) -> Any:
+    start = time.perf_counter()
+    ret = function(*args)
+    return ret, time.perf_counter() - start
+
+
+def bench_batch(detector: OutcomeSwitchingDetector, corpus: SyntheticCorpus, batch_size: int) -> Dict[str, Any]:
+    results, duration = timed(lambda: list(detector.detect_many(corpus.pmids, batch_size=batch_size)))
+    assert all(r.detected_nct_id == nct_id for r, nct_id in zip(results, corpus.nct_ids)), "wrong detections"
+    return {"articles": len(results), "duration": duration, "articles_per_second": len(results) / duration}
+
+
+def bench_single(detector: OutcomeSwitchingDetector, corpus: SyntheticCorpus, n_requests: int) -> Dict[str, Any]:
+    latencies = [timed(detector.detect, pmid)[1] for pmid in corpus.pmids[:n_requests]]
+    return {"latency": summarize(latencies), "articles_per_second": len(latencies) / sum(latencies) if latencies else 0.0}
+
+
+def bench_stages(detector: OutcomeSwitchingDetector, corpus: SyntheticCorpus, n_articles: int) -> Dict[str, Any]:
+    response_parser = ResponseParser()
+    latencies = {stage: [] for stage in ("xml_parsing", "section_filter", "ner", "registry", "similarity")}
+    for pmcid, nct_id in list(zip(corpus.pmcids, corpus.nct_ids))[:n_articles]:
+        parsed, duration = timed(response_parser._parse_article_response, ET.fromstring(corpus.articles[pmcid]), "pmc")
+        latencies["xml_parsing"].append(duration)
+        filtered, duration = timed(detector.section_filter.filter_sections, parsed["text_sections"], parsed["text_type"])
+        latencies["section_filter"].append(duration)
+        entities, duration = timed(detector.outcomes_ner, get_sections_text(filtered["filtered_sections"]))
+        latencies["ner"].append(duration)
+        registry_output, duration = timed(detector.detect_registry_outcomes, nct_id)
+        latencies["registry"].append(duration)
+        _, duration = timed(detector.compare_outcomes, registry_output["registry_outcomes"], filter_outcomes(entities))
+        latencies["similarity"].append(duration)
+    return {stage: summarize(stage_latencies) for stage, stage_latencies in latencies.items()}
+
+
+def run_phase(name: str, function: Callable, *args) -> Dict[str, Any]:
+    METRICS.reset()
+    print(f"running {name} phase", file=sys.stderr)
+    ret = function(*args)
+    return ret | {"metrics": METRICS.to_dict(), "peak_rss_bytes": peak_rss()}
+
+
+def get_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--config", default="config.json", help="detector config file (models paths and settings)")
+    arg_parser.add_argument("--articles", type=int, default=200, help="number of articles of the synthetic corpus")
+    arg_parser.add_argument("--trials", type=int, default=50, help="number of distinct trials of the synthetic corpus")
+    arg_parser.add_argument("--batch-size", type=int, default=100, help="batch size of the batch phase")
+    arg_parser.add_argument("--requests", type=int, default=20, help="number of requests of the single phase")
+    arg_parser.add_argument("--stage-articles", type=int, default=20, help="number of articles of the stages phase")
+    arg_parser.add_argument("--output", default="", help="json results file (default : stdout)")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    corpus = SyntheticCorpus(args.articles, args.trials)
+    server = start_stub_server(corpus)
+    try:
+        detector, load_duration = timed(build_detector, config, f"http://127.0.0.1:{server.server_address[1]}")
+        results = {
+            "version": get_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "config": config,
+            "model_load_duration": load_duration,
+            "phases": {
+                "batch": run_phase("batch", bench_batch, detector, corpus, args.batch_size),
+                "single": run_phase("single", bench_single, detector, corpus, args.requests),
+                "stages": run_phase("stages", bench_stages, detector, corpus, args.stage_articles),
+            },
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
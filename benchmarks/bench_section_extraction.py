@@ -0,0 +1,107 @@
+"""Micro-benchmark of `XMLParser._get_sections` against its previous implementation (kept below as
+reference), on the example article and on a synthetic article with deeply nested sections.
+
+Usage : python benchmarks/bench_section_extraction.py [--repeat 20] [--depth 8] [--paragraphs 20]
+"""
+import sys
+import timeit
+import argparse
+from pathlib import Path
+from xml.etree import ElementTree as ET
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.parse import XMLParser
+
+EXAMPLE_XML = Path(__file__).parent.parent / "test" / "examples" / "NCT01623843_PMC6206648" / "raw.xml"
+
+
+class LegacyXMLParser(XMLParser):
+    """Previous implementation of the sections extraction"""
+
+    def _get_text(self, element):
+        text = element.text if element.text else ''
+        text += " " + element.tail if element.tail else ''
+        for child in element:
+            te = child.text if child.text else ''
+            ta = child.tail if child.tail else ''
+            text += " " + te + ta
+        return text.encode("ascii", "ignore").decode("utf-8").strip()
+
+    def _get_table(self, table_element):
+        columns = []
+        for row in table_element.findall('.//{*}tr'):
+            row_index = 0
+            for cell in row:
+                cell_type = cell.tag.split('}')[1] if '}' in cell.tag else cell.tag
+                cell_text = cell.text.encode("ascii", "ignore").decode("utf-8") if cell.text else ''
+                if cell_type == "th":
+                    columns.append(cell_text + " : ")
+                elif cell_type == "td" and row_index < len(columns):
+                    columns[row_index] += cell_text + " , "
+                row_index += 1
+        return columns
+
+    def _get_sections(self, element, prefix=""):
+        prefix = [prefix] if prefix else []
+        title_stack = []
+        result_dict = {}
+        for element, depth in self._depth_iter(element):
+            el_type = element.tag.split('}')[1] if '}' in element.tag else element.tag
+            if el_type == "title":
+                if not title_stack or title_stack[-1][0] < depth:
+                    title_stack.append((depth, element.text))
+                elif title_stack[-1][0] >= depth:
+                    while depth <= title_stack[-1][0]:
+                        title_stack.pop(-1)
+                        if not title_stack:
+                            break
+                    title_stack.append((depth, element.text))
+            elif el_type in ["p", "table", "label"]:
+                title = " - ".join(prefix + [text for _, text in title_stack if text])
+                content_text = self._get_table(element) if el_type == "table" else [self._get_text(element)]
+                if title not in result_dict:
+                    result_dict[title] = content_text
+                else:
+                    result_dict[title] += content_text
+        return result_dict
+
+
+def synthetic_body(depth: int, paragraphs: int, breadth: int = 3) -> ET.Element:
+    """Build an article body with `breadth` sections per level, `depth` levels of nesting
+    and `paragraphs` paragraphs (with inline children) per section"""
+    def add_section(parent, level, path):
+        sec = ET.SubElement(parent, "sec")
+        ET.SubElement(sec, "title").text = f"Section {path}"
+        for i in range(paragraphs):
+            p = ET.SubElement(sec, "p")
+            p.text = f"Paragraph {i} of section {path} with primary outcome measured at 12 months "
+            italic = ET.SubElement(p, "italic")
+            italic.text = "p < 0.05"
+            italic.tail = " and secondary outcomes évalués " * 5
+        if level < depth:
+            for i in range(breadth if level < 2 else 1):
+                add_section(sec, level + 1, f"{path}.{i}")
+    body = ET.Element("body")
+    for i in range(breadth):
+        add_section(body, 1, str(i))
+    return body
+
+
+def compare(name, element, repeat):
+    new_parser, legacy_parser = XMLParser(), LegacyXMLParser()
+    assert new_parser._get_sections(element) == legacy_parser._get_sections(element), "outputs differ"
+    new_time = min(timeit.repeat(lambda: new_parser._get_sections(element), number=1, repeat=repeat))
+    legacy_time = min(timeit.repeat(lambda: legacy_parser._get_sections(element), number=1, repeat=repeat))
+    print(f"{name:<30} legacy {legacy_time*1000:8.2f} ms | new {new_time*1000:8.2f} ms | speedup x{legacy_time/new_time:.2f}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--depth", type=int, default=8)
+    arg_parser.add_argument("--paragraphs", type=int, default=20)
+    args = arg_parser.parse_args()
+    example_body = ET.parse(EXAMPLE_XML).getroot().find(".//{*}body")
+    compare("example article body", example_body, args.repeat)
+    compare(f"synthetic body (depth {args.depth})", synthetic_body(args.depth, args.paragraphs), args.repeat)
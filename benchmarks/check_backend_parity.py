@@ -0,0 +1,107 @@
+"""Accuracy parity of an inference backend ("quantized" or "onnx", see `outcome_switch.inference`) with the
+fp32 pytorch models, on the fixtures of `test/examples/NCT01623843_PMC6206648` :
+- ner : outcome entities detected in the filtered sections, compared by (group, start, end) with the pytorch
+  entities (precision, recall, f1) and the article outcomes
+- similarity : cosine similarity matrix of the registry outcomes and the article outcomes (maximum absolute
+  difference) and connections between them
+
+Exits with status 1 if the ner f1 or the similarity difference exceed the thresholds.
+
+Usage : python benchmarks/check_backend_parity.py --backend quantized [--config config.json] [--output parity.json]
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.extraction import ChunkTokenClassificationPipeline
+from outcome_switch.outcome_comparison import OutcomeSimilarity
+from outcome_switch.utils import get_sections_text, filter_outcomes
+
+EXAMPLE_DIR = Path(__file__).parent.parent / "test" / "examples" / "NCT01623843_PMC6206648"
+
+
+def load_fixtures() -> Tuple[str, List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Text of the filtered sections, registry outcomes and article outcomes of the example"""
+    with open(EXAMPLE_DIR / "filtered_sections.json", "r") as f:
+        text = get_sections_text(json.load(f))
+    with open(EXAMPLE_DIR / "registry_info.json", "r") as f:
+        registry_outcomes = [(outcome["type"], outcome["text"]) for outcome in json.load(f)["outcomes"]]
+    with open(EXAMPLE_DIR / "article_outcomes.json", "r") as f:
+        article_outcomes = [tuple(outcome) for outcome in json.load(f)]
+    return text, registry_outcomes, article_outcomes
+
+
+def compare_entities(reference: List[Dict[str, Any]], entities: List[Dict[str, Any]]) -> Dict[str, float]:
+    reference_spans = {(e["entity_group"], e["start"], e["end"]) for e in reference if e["entity_group"] != "O"}
+    spans = {(e["entity_group"], e["start"], e["end"]) for e in entities if e["entity_group"] != "O"}
+    common = len(reference_spans & spans)
+    precision = common / len(spans) if spans else float(not reference_spans)
+    recall = common / len(reference_spans) if reference_spans else float(not spans)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"entities": len(spans), "reference_entities": len(reference_spans), "precision": precision, "recall": recall, "f1": f1,
+            "same_article_outcomes": filter_outcomes(reference) == filter_outcomes(entities)}
+
+
+def run_ner(model_path: str, backend: str, onnx_dir: str, text: str) -> Tuple[List[Dict[str, Any]], float]:
+    pipeline = ChunkTokenClassificationPipeline.from_pretrained(model_path, backend=backend, onnx_dir=onnx_dir,
+                                                                ignore_labels=[], aggregation_strategy="average", stride=64)
+    pipeline.predict_many([text]) # warm up
+    start = time.perf_counter()
+    entities = pipeline.predict_many([text])[0]
+    return entities, time.perf_counter() - start
+
+
+def run_similarity(model_path: str, backend: str, onnx_dir: str, registry_outcomes, article_outcomes) -> Tuple[np.ndarray, np.ndarray, float]:
+    similarity = OutcomeSimilarity(model_path, backend=backend, onnx_dir=onnx_dir)
+    start = time.perf_counter()
+    scores = (similarity.encode(registry_outcomes) @ similarity.encode(article_outcomes).T).numpy()
+    duration = time.perf_counter() - start
+    return scores, similarity.get_similarity(registry_outcomes, article_outcomes, scores=scores), duration
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--backend", required=True, choices=["quantized", "onnx"], help="backend compared with pytorch")
+    arg_parser.add_argument("--config", default="config.json", help="config file with the models paths")
+    arg_parser.add_argument("--onnx-dir", default="cache/onnx", help="directory of the exported ONNX graphs")
+    arg_parser.add_argument("--min-f1", type=float, default=0.95, help="minimum f1 of the ner entities")
+    arg_parser.add_argument("--max-score-diff", type=float, default=0.02, help="maximum absolute difference of the similarity scores")
+    arg_parser.add_argument("--output", default="", help="json results file (default : stdout)")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    text, registry_outcomes, article_outcomes = load_fixtures()
+    reference_entities, reference_ner_duration = run_ner(config["outcome_extractor_path"], "pytorch", args.onnx_dir, text)
+    entities, ner_duration = run_ner(config["outcome_extractor_path"], args.backend, args.onnx_dir, text)
+    reference_scores, reference_connections, reference_sim_duration = run_similarity(config["outcome_sim_path"], "pytorch", args.onnx_dir, registry_outcomes, article_outcomes)
+    scores, connections, sim_duration = run_similarity(config["outcome_sim_path"], args.backend, args.onnx_dir, registry_outcomes, article_outcomes)
+
+    ner = compare_entities(reference_entities, entities) | {"pytorch_duration": reference_ner_duration, "duration": ner_duration}
+    similarity = {
+        "max_score_diff": float(np.abs(scores - reference_scores).max()),
+        "same_connections": [(c["registry"], c["article"]) for c in connections] == [(c["registry"], c["article"]) for c in reference_connections],
+        "pytorch_duration": reference_sim_duration,
+        "duration": sim_duration,
+    }
+    results = {"backend": args.backend, "ner": ner, "similarity": similarity,
+               "passed": ner["f1"] >= args.min_f1 and similarity["max_score_diff"] <= args.max_score_diff}
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if not results["passed"]:
+        sys.exit(1)
+    return results
+
+
+if __name__ == "__main__":
+    main()
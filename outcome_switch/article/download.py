@@ -5,10 +5,13 @@ import json
 import os
 from os.path import join
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterator, Tuple
 from xml.etree import ElementTree as ET
 from outcome_switch.article.parse import ResponseParser
 from outcome_switch.utils import get_batchs
+from outcome_switch.cache import DiskCache, LRUCache
+from outcome_switch.ratelimit import RequestScheduler, BATCH, get_ncbi_session
+from outcome_switch.metrics import METRICS
 # external python modules
 from pytz import timezone
 
@@ -22,7 +25,11 @@ class IDConverter:
         versions:bool=False,
         idtype:str='',
         logging_mode:str="file",
-        log_filepath:str='logs/pmid_conversion.log'
+        log_filepath:str='logs/pmid_conversion.log',
+        session:Optional[requests.Session]=None,
+        cache_size:int=10000,
+        store:Optional[DiskCache]=None,
+        scheduler:Optional[RequestScheduler]=None,
     ):
         """Instantiates a PubMed ID converter (PMID,PMCID,DOI) that will return request in specified 
         format and with or without multiple versions of the articles
@@ -44,6 +51,19 @@ class IDConverter:
             > id_converter = PubMedIDConverter()
             > id_converter.id_conversion(["14900"], idtype="pmcid")
             ```
+
+            session (requests.Session, optional): session used for the requests, a new pooled session 
+            is created if not given. Defaults to None.
+
+            cache_size (int, optional): number of converted records kept in memory, each record is 
+            kept under its pmid, pmcid and doi so that a later conversion of any of them does not 
+            need a request. Defaults to 10000.
+
+            store (DiskCache, optional): persistent store of converted records, also keyed by pmid, 
+            pmcid and doi. Defaults to None.
+
+            scheduler (RequestScheduler, optional): rate limiter shared by the NCBI clients, a new 
+            anonymous one (3 requests per second) is created if not given. Defaults to None.
         """
         if idtype not in ["pmcid","pmid","mid","doi",""]:
             raise ValueError("idtype must be one of pmcid, pmid, mid, doi or empty(auto_detection by API)")
@@ -53,6 +73,10 @@ class IDConverter:
         self.idtype = idtype if idtype else 'auto'
         self.versions = 'yes' if versions else 'no'
         self.log_filepath = log_filepath
+        self.session = session if session is not None else get_ncbi_session()
+        self.cache = LRUCache(maxsize=3*cache_size)
+        self.store = store
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
         # defining logging according to given mode
         if logging_mode == "file":
             logging.basicConfig(filename=log_filepath, encoding='utf-8', level=logging.INFO)
@@ -103,7 +127,10 @@ class IDConverter:
             "email":self.email,
             "tool":self.tool
         }
-        response_text = requests.get(self.ID_CONVERTER_URL, params=params).text
+        with METRICS.span("idconv"):
+            response = self.scheduler.request(self.session, "GET", self.ID_CONVERTER_URL, params=params)
+            response_text = response.text
+        METRICS.increment("downloaded_bytes", len(response.content))
         json_response = json.loads(response_text)
         if 'warning' in json_response:
             logging.warning(json_response['warning'])
@@ -116,17 +143,83 @@ class IDConverter:
             raise ValueError(json_response['message'])
         return converted_ids
 
+    def _is_cacheable(self) -> bool:
+        """Versions and mids conversions are not cached"""
+        return self.versions == 'no' and self.idtype != 'mid'
+
+    def normalize_id(self, id: str) -> str:
+        """Normalize a requested id (of type `idtype`), pmcids given as numeric values get their "PMC" prefix"""
+        id = id.strip()
+        if self.idtype == 'pmcid' and not id.upper().startswith("PMC"):
+            id = "PMC" + id
+        # dois are case insensitive
+        return id.upper() if id.upper().startswith("PMC") else id.lower()
+
+    def _cache_key(self, id: str) -> Optional[str]:
+        """Normalize a requested id into its cache key, returns None if conversions can not be cached"""
+        if not self._is_cacheable():
+            return None
+        return self.normalize_id(id)
+
+    @staticmethod
+    def _record_keys(record: Dict[str,str]) -> List[str]:
+        """Cache keys of a converted record : its pmid as is, its pmcid upper-cased and its doi lower-cased"""
+        normalizers = {'pmid': str.strip, 'pmcid': lambda id: id.strip().upper(), 'doi': lambda id: id.strip().lower()}
+        return [normalize(record[id_key]) for id_key, normalize in normalizers.items() if record.get(id_key)]
+
+    def _get_cached(self, id: str) -> Optional[Dict[str,str]]:
+        key = self._cache_key(id)
+        if key is None:
+            return None
+        record = self.cache.get(key)
+        if record is None and self.store is not None:
+            record = self.store.get(key)
+            if record is not None:
+                self.cache.set(key, record)
+        return record
+
+    def _set_cached(self, record: Dict[str,str]) -> None:
+        """Keep a successfully converted record under all its ids (pmid, pmcid and doi)"""
+        if "errmsg" in record or not self._is_cacheable():
+            return
+        record = {key: value for key, value in record.items() if key != "requested-id"}
+        for key in self._record_keys(record):
+            self.cache.set(key, record)
+            if self.store is not None:
+                self.store.set(key, record)
+
+    def prefetch(self, ids: List[str]) -> None:
+        """Convert all ids that are not in cache by chunks of 200 ids and keep the converted records, 
+        so that later conversions of these ids (or their linked ids) do not need any request"""
+        self.convert(ids)
+
     def convert(self, ids: List[str]) -> List[Dict[str,str]]:
-        """Get all linked ids from the given list of ids in PubMed
-        if the list is longer than 200 ids, it will be split into multiple requests
-        of maximum length 200 ids"""
+        """Get all linked ids from the given list of ids in PubMed, only ids that are not in cache 
+        are converted by the API, if the list is longer than 200 ids, it will be split into multiple 
+        requests of maximum length 200 ids"""
         if not isinstance(ids, list):
             raise TypeError("ids must be a list of strings")
         if not all(isinstance(id, str) for id in ids):
             raise TypeError("ids must be a list of strings")
         if len(ids) == 0:
             raise ValueError("ids list must not be empty")
-        elif len(ids) > 200 :
+        records = [self._get_cached(id) for id in ids]
+        missing_ids = list(dict.fromkeys(id for id, record in zip(ids, records) if record is None))
+        METRICS.increment("idconv_cache_hits", len(ids) - len(missing_ids))
+        METRICS.increment("idconv_cache_misses", len(missing_ids))
+        converted = {} # normalized requested id : record
+        if missing_ids:
+            # records are matched with the requested ids by their "requested-id", not by their position
+            for record in self._convert_uncached(missing_ids):
+                self._set_cached(record)
+                if record.get("requested-id"):
+                    converted[self.normalize_id(record["requested-id"])] = record
+        return [record | {"requested-id": id} if record is not None 
+                else converted.get(self.normalize_id(id), {"errmsg": "not converted"}) | {"requested-id": id}
+                for id, record in zip(ids, records)]
+
+    def _convert_uncached(self, ids: List[str]) -> List[Dict[str,str]]:
+        if len(ids) > 200 :
             split_ids = get_batchs(ids, 200)
             converted_ids = []
             for id_list in split_ids:
@@ -145,8 +238,23 @@ class PMCOAIDownloader:
     API_BUSY_HOUR_START = datetime.strptime("05:00", "%H:%M").time()
     API_BUSY_HOUR_END = datetime.strptime("21:00", "%H:%M").time()
 
-    def __init__(self, logging_mode: str = "file", log_filepath="logs/pmc-oai_download.log") -> None:
+    def __init__(self, logging_mode: str = "file", log_filepath="logs/pmc-oai_download.log", session:Optional[requests.Session]=None, 
+                 scheduler:Optional[RequestScheduler]=None, busy_hour_cost:float=3.0) -> None:
+        """Downloader of PMC fulltexts using the OAI-PMH service
+
+        Args:
+            logging_mode (str, optional): logging mode. Defaults to "file".
+            log_filepath (str, optional): log file. Defaults to "logs/pmc-oai_download.log".
+            session (requests.Session, optional): session used for the requests. Defaults to None.
+            scheduler (RequestScheduler, optional): rate limiter shared by the NCBI clients. Defaults to None (raises an 
+                exception during busy hours instead of throttling the requests, unless the download is forced).
+            busy_hour_cost (float, optional): number of scheduler tokens used by a request during busy hours, 
+                busy hours requests are also sent with batch priority. Defaults to 3.0.
+        """
         self.log_filepath = log_filepath
+        self.session = session if session is not None else get_ncbi_session()
+        self.scheduler = scheduler
+        self.busy_hour_cost = busy_hour_cost
         if logging_mode == "file":
             logging.basicConfig(filename=log_filepath, encoding='utf-8', level=logging.INFO)
         elif logging_mode == "console":
@@ -198,7 +306,8 @@ class PMCOAIDownloader:
                     f.write(fulltext)
 
     def get_fulltext(self, pmcid: str, force_busy_download:bool=False) -> str:
-        if self.is_busy_hour() and not force_busy_download:
+        is_busy_hour = self.is_busy_hour() and not force_busy_download
+        if is_busy_hour and self.scheduler is None:
             logging.error("API is busy, try again later")
             raise Exception(f"PMC API is busy between 5:00 AM and 9:00 PM EST. Current time is {datetime.now(self.API_TIMEZONE).time()}")
         assert type(pmcid) == str, "pmcid must be a string"
@@ -210,7 +319,14 @@ class PMCOAIDownloader:
             "identifier": "oai:pubmedcentral.nih.gov:" + pmcid,
             "metadataPrefix": "pmc",
         }
-        request_response = requests.get(self.OAI_PMH_URL, params=params)
+        with METRICS.span("oai_pmh"):
+            if self.scheduler is None :
+                request_response = self.session.get(self.OAI_PMH_URL, params=params)
+            elif is_busy_hour : # throttled instead of refused
+                request_response = self.scheduler.request(self.session, "GET", self.OAI_PMH_URL, cost=self.busy_hour_cost, priority=BATCH, params=params)
+            else :
+                request_response = self.scheduler.request(self.session, "GET", self.OAI_PMH_URL, params=params)
+        METRICS.increment("downloaded_bytes", len(request_response.content))
         if request_response.status_code == 200:
             logging.debug(f"{pmcid} request response : {request_response.text}")
         else :
@@ -229,8 +345,12 @@ class PMCOAIDownloader:
 class EntrezDownloader:
     E_UTILITIES_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
-    def __init__(self,logging_mode: str = "file", log_filepath="logs/pubmed-download.log"):
+    def __init__(self,logging_mode: str = "file", log_filepath="logs/pubmed-download.log", session:Optional[requests.Session]=None, 
+                 scheduler:Optional[RequestScheduler]=None):
         self.log_filepath = log_filepath 
+        self.session = session if session is not None else get_ncbi_session()
+        # rate limiter shared by the NCBI clients, anonymous rate (3 requests per second) if not given
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
         # defining logging according to given mode
         if logging_mode == "file":
             logging.basicConfig(filename=self.log_filepath, encoding='utf-8', level=logging.INFO)
@@ -252,7 +372,7 @@ class EntrezDownloader:
             "retmax" : 1,
             "retmode" : "json"
         }
-        response = requests.get(self.E_UTILITIES_URL + "esearch.fcgi", params=params)
+        response = self.scheduler.request(self.session, "GET", self.E_UTILITIES_URL + "esearch.fcgi", params=self.scheduler.add_api_key(params))
         if response.status_code == 200:
             print(response)
             ret = response
@@ -260,33 +380,76 @@ class EntrezDownloader:
             logging.error(f"no pmid found for title : {title}")
         return ret
 
-    def fetch_xml(self, pmcids: List[str], db:str="pmc", save_dir:str="") -> List[Dict[str,str]]:
-        article_xmls = []
+    def iter_fetch_xml(self, pmcids: List[str], db:str="pmc", save_dir:str="", keep_xml:bool=True) -> Iterator[Dict[str,str]]:
+        """Fetch articles xml of the given ids in a single efetch request (list must not be longer than 200 ids), 
+        the response is parsed while it is downloaded and each article is yielded as soon as it is parsed 
+        (see `ResponseParser.iter_parse_response`)"""
         params = {
             "db": db,
             "id": ",".join(pmcids),
             "retmode": "xml"
         }
-        request_function = requests.get if len(pmcids) < 200 else requests.post
-        response = request_function(self.E_UTILITIES_URL + "efetch.fcgi", params=params)
-        if response.status_code == 200:
-            xml_string = response.text
-            parser = ResponseParser()
-            article_xmls = parser.parse_multiple_response(xml_string, db, save_dir)
-        else : 
-            logging.error(f"Server Error while fetching xml for pmcids {pmcids}")
+        method = "GET" if len(pmcids) < 200 else "POST"
+        # only the time to the response headers, the body is parsed while it is downloaded
+        with METRICS.span("efetch"):
+            response = self.scheduler.request(self.session, method, self.E_UTILITIES_URL + "efetch.fcgi", params=self.scheduler.add_api_key(params), stream=True)
+        with response :
+            if response.status_code == 200:
+                response.raw.decode_content = True # decompress gzip responses
+                parser = ResponseParser()
+                yield from parser.iter_parse_response(response.raw, db, save_dir, keep_xml)
+                METRICS.increment("downloaded_bytes", response.raw.tell())
+            else : 
+                logging.error(f"Server Error while fetching xml for pmcids {pmcids}")
+
+    def fetch_xml_single_list(self, pmcids: List[str], db:str="pmc", save_dir:str="") -> List[Dict[str,str]]:
+        """Fetch articles xml of the given ids in a single efetch request (list must not be longer than 200 ids)"""
+        return list(self.iter_fetch_xml(pmcids, db, save_dir))
+
+    def fetch_xml(self, pmcids: List[str], db:str="pmc", save_dir:str="") -> List[Dict[str,str]]:
+        """Fetch articles xml of the given ids, if the list is longer than 200 ids, it will be 
+        split into multiple efetch requests of maximum length 200 ids"""
+        article_xmls = []
+        for id_list in get_batchs(pmcids, 200):
+            article_xmls += self.fetch_xml_single_list(id_list, db, save_dir)
         return article_xmls
 
 class IDDownloader :
 
-    def __init__(self, logging_mode: str = "file", id_logfile:str = "", entrez_logfile:str=""):
+    def __init__(self, logging_mode: str = "file", id_logfile:str = "", entrez_logfile:str="", 
+                 session:Optional[requests.Session]=None, cache:Optional[DiskCache]=None, 
+                 id_store:Optional[DiskCache]=None, scheduler:Optional[RequestScheduler]=None):
+        """Downloader of pubmed and pmc articles from pmids, pmcids or dois
+
+        Args:
+            logging_mode (str, optional): logging mode of the id converter and entrez downloader. Defaults to "file".
+            id_logfile (str, optional): log file of the id converter. Defaults to "".
+            entrez_logfile (str, optional): log file of the entrez downloader. Defaults to "".
+            session (requests.Session, optional): session shared by the id converter and entrez downloader,
+                a new pooled session is created if not given. Defaults to None.
+            cache (DiskCache, optional): cache of the parsed articles (xml string and text sections) keyed 
+                by retrieved article id (pmcid or pmid), checked before downloading. Defaults to None.
+            id_store (DiskCache, optional): persistent store of the id converter records. Defaults to None.
+            scheduler (RequestScheduler, optional): rate limiter shared by the id converter and entrez downloader,
+                a new anonymous one is created if not given. Defaults to None.
+        """
+        self.cache = cache
+        # both downloaders share the same session (and so the same connection pool)
+        self.session = session if session is not None else get_ncbi_session()
+        # and the same request rate limit
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
         self.id_converter = IDConverter(
             logging_mode=logging_mode,
-            log_filepath=id_logfile
+            log_filepath=id_logfile,
+            session=self.session,
+            store=id_store,
+            scheduler=self.scheduler
         )
         self.entrez_downloader = EntrezDownloader(
             logging_mode=logging_mode,
-            log_filepath=entrez_logfile
+            log_filepath=entrez_logfile,
+            session=self.session,
+            scheduler=self.scheduler
         )
 
     def fetch_xml(self, ids: List[str], save_dir: str="") -> List[Dict[str,str]]:
@@ -304,13 +467,68 @@ class IDDownloader :
             raise ValueError("ids must be a non empty list")
         # check ids type
         linked_ids = self.id_converter.convert(ids)
-        pmcids, pmids = [],[]
+        article_ids = []
         for id_dict in linked_ids :
             if 'pmcid' in id_dict :
-                pmcids.append(id_dict['pmcid'])
+                article_ids.append(id_dict['pmcid'])
             elif 'pmid' in id_dict :
-                pmids.append(id_dict['pmid'])
-        pmc_response_dict = self.entrez_downloader.fetch_xml(pmcids, save_dir=save_dir)
-        pubmed_response_dict = self.entrez_downloader.fetch_xml(pmids, db="pubmed", save_dir=save_dir)
-        return pubmed_response_dict + pmc_response_dict
+                article_ids.append(id_dict['pmid'])
+        return self._fetch_articles(article_ids, save_dir)
+
+    def _fetch_articles(self, article_ids: List[str], save_dir: str="") -> List[Dict[str,str]]:
+        """Fetch articles of the given pmcids ('PMC' prefixed) and pmids, articles found in cache 
+        are not downloaded and downloaded articles are added to the cache"""
+        return list(self._iter_fetch_articles(article_ids, save_dir))
+
+    def _iter_fetch_articles(self, article_ids: List[str], save_dir: str="") -> Iterator[Dict[str,str]]:
+        """Same as `_fetch_articles` but yields the cached articles then each downloaded article as soon as 
+        it is parsed (see `EntrezDownloader.iter_fetch_xml`), so that the caller can release its xml before 
+        the next article of the efetch response is read"""
+        pmcids, pmids = [], []
+        for article_id in article_ids :
+            cached_response = self.cache.get(article_id) if self.cache is not None else None
+            METRICS.increment("article_cache_hits" if cached_response is not None else "article_cache_misses")
+            if cached_response is not None :
+                if save_dir : # cached articles are saved too
+                    with open(join(save_dir, f'{cached_response["retrieved_article_id"]}.xml'), "w") as f:
+                        f.write(cached_response["article_xml_string"])
+                yield cached_response
+            elif article_id.startswith("PMC") :
+                pmcids.append(article_id)
+            else :
+                pmids.append(article_id)
+        for db, db_ids in (("pubmed", pmids), ("pmc", pmcids)) :
+            for id_list in get_batchs(db_ids, 200) :
+                for response in self.entrez_downloader.iter_fetch_xml(id_list, db, save_dir) :
+                    if self.cache is not None :
+                        self.cache.set(response["retrieved_article_id"], response)
+                    yield response
+
+    def fetch_xml_by_id(self, ids: List[str], save_dir: str="") -> Dict[str, Dict[str,str]]:
+        """Same as `fetch_xml` but returns a dict mapping each input id (as given by the caller) to its response 
+        dict, which also contains the `normalized_id` of the input id (see `IDConverter.normalize_id`). Input ids 
+        that could not be converted or retrieved are not in the returned dict. Id conversion and efetch requests 
+        are made by chunks of 200 ids, whatever the number of input ids."""
+        return dict(self.iter_fetch_xml_by_id(ids, save_dir))
+
+    def iter_fetch_xml_by_id(self, ids: List[str], save_dir: str="") -> Iterator[Tuple[str, Dict[str,str]]]:
+        """Same as `fetch_xml_by_id` but yields (input id, response dict) tuples as soon as each article is 
+        parsed (in download order, not in input order), so that the caller only keeps what it needs of each 
+        article (e.g. drops its xml) while the next ones are downloaded"""
+        if len(ids) == 0 :
+            raise ValueError("ids must be a non empty list")
+        linked_ids = self.id_converter.convert(ids)
+        # map each input id to the id that will be retrieved (pmcid if on PMC else pmid)
+        requested_ids = {}
+        for input_id, id_dict in zip(ids, linked_ids):
+            if id_dict.get('pmcid') :
+                requested_ids[input_id] = id_dict['pmcid']
+            elif id_dict.get('pmid') :
+                requested_ids[input_id] = id_dict['pmid']
+        input_ids_by_article = {}
+        for input_id, article_id in requested_ids.items():
+            input_ids_by_article.setdefault(article_id, []).append(input_id)
+        for response in self._iter_fetch_articles(list(input_ids_by_article), save_dir) :
+            for input_id in input_ids_by_article.get(response["retrieved_article_id"], []) :
+                yield input_id, response | {"normalized_id": self.id_converter.normalize_id(input_id)}
   
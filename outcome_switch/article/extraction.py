@@ -0,0 +1,76 @@
+import torch
+from typing import List, Dict, Any
+from transformers import BertTokenizerFast, BertForTokenClassification, TokenClassificationPipeline
+from outcome_switch.utils import get_batchs
+from outcome_switch.metrics import METRICS
+from outcome_switch.inference import apply_backend
+
+
+class ChunkTokenClassificationPipeline(TokenClassificationPipeline):
+    """Token classification pipeline able to process many documents at once : documents are split
+    into overlapping windows (using the `stride` parameter of the pipeline), windows of all documents
+    are run through the model in fixed-size batches, then entities are aggregated back per document
+    with the same postprocessing as `TokenClassificationPipeline` (character offsets of the entities
+    are relative to their document)."""
+
+    @classmethod
+    def from_pretrained(cls, model_path: str, local_files_only: bool = False, backend: str = "pytorch",
+                        onnx_dir: str = "cache/onnx", **kwargs) -> "ChunkTokenClassificationPipeline":
+        """Load the pipeline of a BERT token classification model, kwargs are passed to the pipeline
+
+        Args:
+            model_path (str): path or huggingface id of the model
+            local_files_only (bool, optional): only read local files (no request to the hub). Defaults to False.
+            backend (str, optional): inference backend of the model, "pytorch", "quantized" or "onnx" (see 
+                `outcome_switch.inference.apply_backend`). Defaults to "pytorch".
+            onnx_dir (str, optional): directory of the exported ONNX graphs. Defaults to "cache/onnx".
+        """
+        model = BertForTokenClassification.from_pretrained(model_path, local_files_only=local_files_only)
+        return cls(
+            model = apply_backend(model, backend, onnx_dir),
+            tokenizer = BertTokenizerFast.from_pretrained(model_path, local_files_only=local_files_only),
+            **kwargs
+        )
+
+    def predict_many(self, texts: List[str], batch_size: int = 8) -> List[List[Dict[str, Any]]]:
+        """Detect entities in many texts, returns the list of entities of each text (same output
+        as calling the pipeline on each text)
+
+        Args:
+            texts (List[str]): list of non empty texts
+            batch_size (int, optional): number of windows run through the model at once. Defaults to 8.
+        """
+        if not texts:
+            return []
+        # same tokenization as `TokenClassificationPipeline.preprocess` applied to all texts at once
+        tokenizer_params = {"padding": True} | self._preprocess_params.get("tokenizer_params", {})
+        truncation = True if self.tokenizer.model_max_length and self.tokenizer.model_max_length > 0 else False
+        inputs = self.tokenizer(
+            texts,
+            return_tensors="pt",
+            truncation=truncation,
+            return_special_tokens_mask=True,
+            return_offsets_mapping=True,
+            **tokenizer_params,
+        )
+        windows_texts = inputs.pop("overflow_to_sample_mapping", torch.arange(len(texts))).tolist()
+        METRICS.increment("ner_windows", len(windows_texts))
+        METRICS.increment("ner_tokens", int(inputs["attention_mask"].sum()))
+        special_tokens_mask = inputs.pop("special_tokens_mask")
+        offset_mapping = inputs.pop("offset_mapping")
+        texts_outputs = [[] for _ in texts]
+        for windows_batch in get_batchs(list(range(len(windows_texts))), batch_size):
+            model_inputs = {key: value[windows_batch].to(self.device) for key, value in inputs.items()}
+            with torch.no_grad():
+                logits = self.model(**model_inputs)[0].cpu()
+            for batch_index, window_index in enumerate(windows_batch):
+                text_index = windows_texts[window_index]
+                # same output as `TokenClassificationPipeline._forward` for a single window
+                texts_outputs[text_index].append({
+                    "logits": logits[batch_index:batch_index + 1],
+                    "input_ids": inputs["input_ids"][window_index:window_index + 1],
+                    "special_tokens_mask": special_tokens_mask[window_index:window_index + 1],
+                    "offset_mapping": offset_mapping[window_index:window_index + 1],
+                    "sentence": texts[text_index],
+                })
+        return [self.postprocess(text_outputs, **self._postprocess_params) for text_outputs in texts_outputs]
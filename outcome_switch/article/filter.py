@@ -4,15 +4,15 @@ import re
 
 class SectionFilter :
 
-    STRICT_OUTCOME_REGEX = '(outcome|end(\s)?point)'
-    OUTCOME_REGEX = '(outcome|end(\s)?point|measure|objective|assessment|analysis)'
+    STRICT_OUTCOME_REGEX = r'(outcome|end(\s)?point)'
+    OUTCOME_REGEX = r'(outcome|end(\s)?point|measure|objective|assessment|analysis)'
     
     METHOD_REGEX = '(method|approach|strategy|design|protocol)'
-    SAMPLE_SIZE_REGEX = 'sample\s(size|number)'
+    SAMPLE_SIZE_REGEX = r'sample\s(size|number)'
     ABSTRACT_REGEX = '(abstract|summary)'
 
-    STRICT_PRIM_SEC_REGEX = f'(primary|secondary|main|)\s(efficacy\s)?{STRICT_OUTCOME_REGEX}'
-    PRIM_SEC_REGEX = f'(primary|secondary|main|)\s(efficacy\s)?{OUTCOME_REGEX}'
+    STRICT_PRIM_SEC_REGEX = rf'(primary|secondary|main|)\s(efficacy\s)?{STRICT_OUTCOME_REGEX}'
+    PRIM_SEC_REGEX = rf'(primary|secondary|main|)\s(efficacy\s)?{OUTCOME_REGEX}'
     STRICT_METHOD_AND_PRIM_SEC_REGEX = f'{METHOD_REGEX}.+{STRICT_PRIM_SEC_REGEX}' 
     METHOD_AND_PRIM_SEC_REGEX = f'{METHOD_REGEX}.+{PRIM_SEC_REGEX}'
 
@@ -35,6 +35,8 @@ class SectionFilter :
         ("method","title",METHOD_REGEX),
         ("abstract","title",ABSTRACT_REGEX),
     ]
+    # regexes are compiled once, when the class is loaded
+    COMPILED_CHECK_PRIORITY = [(name, content_type, re.compile(regex, re.IGNORECASE)) for name, content_type, regex in CHECK_PRIORITY]
 
     def filter_sections(self, sections_dict: Dict[str, List[str]], text_type:str) -> Dict[str, Any] :
         """Filter sections to keep only the ones containing relevant information if the text is a fulltext
@@ -60,19 +62,29 @@ class SectionFilter :
         if text_type == "abstract" and sections_dict :
             filter_output["filtered_sections"] = sections_dict
         elif sections_dict and text_type == "fulltext":
-            match_found = False
-            for i, el  in enumerate(self.CHECK_PRIORITY) :
-                priority_name, content_type, current_regex = el
-                current_regex = re.compile(current_regex, re.IGNORECASE)
-                for title, content_list in sections_dict.items() :
-                    content = title if content_type == "title" else '\n'.join(content_list)
-                    if current_regex.search(content) :
-                        filter_output["check_type"] = content_type
-                        filter_output["regex_priority_name"] = priority_name
-                        filter_output["regex_priority_index"] = i
-                        filter_output["filtered_sections"][title] = content_list
-                        match_found = True
-                if match_found :
-                    break
+            # single pass over the sections : find the highest priority check matched by each section, 
+            # only checks with a priority higher or equal to the best one found so far can change the result
+            best_index = len(self.COMPILED_CHECK_PRIORITY)
+            sections_index = {}
+            for title, content_list in sections_dict.items() :
+                content = None # section content is joined once, only if a content check is needed
+                for i in range(min(best_index + 1, len(self.COMPILED_CHECK_PRIORITY))) :
+                    _, content_type, current_regex = self.COMPILED_CHECK_PRIORITY[i]
+                    if content_type == "title" :
+                        text = title
+                    else :
+                        if content is None :
+                            content = '\n'.join(content_list)
+                        text = content
+                    if current_regex.search(text) :
+                        sections_index[title] = i
+                        best_index = i
+                        break
+            if sections_index :
+                priority_name, content_type, _ = self.COMPILED_CHECK_PRIORITY[best_index]
+                filter_output["check_type"] = content_type
+                filter_output["regex_priority_name"] = priority_name
+                filter_output["regex_priority_index"] = best_index
+                filter_output["filtered_sections"] = {title: sections_dict[title] for title, i in sections_index.items() if i == best_index}
         return filter_output
 
@@ -0,0 +1,77 @@
+import os
+import tarfile
+from typing import Tuple, Iterator, Optional, Set
+
+
+class LocalArticleReader:
+    """Read article XMLs from a local mirror of the PMC Open Access bulk packages (or any directory
+    of article XMLs / efetch responses) without network access. Sources can be a single XML file, a
+    directory tree (walked recursively, `.tar.gz` packages found in it are read too) or a `.tar.gz`
+    package, packages are streamed member by member without being extracted to disk.
+
+    Yields the raw bytes of each xml file (not parsed in the reading process, files containing many
+    articles are split by the parsing workers) as (xml_bytes, db) tuples, ready for
+    `ParallelArticleProcessor.process` or `OutcomeSwitchingDetector.detect_xml_many`. Files are selected
+    by name only, files that are not named after their PMCID are read and their articles are filtered on
+    their PMCID by the parsing workers (see the `pmcids` attribute)."""
+
+    XML_EXTENSIONS = (".xml", ".nxml")
+    TAR_EXTENSIONS = (".tar.gz", ".tgz")
+
+    def __init__(self, db: str = "pmc", pmcids: Optional[Set[str]] = None) -> None:
+        """
+        Args:
+            db (str, optional): database of the articles ("pmc" for JATS articles, "pubmed" for PubMed articles). Defaults to "pmc".
+            pmcids (Set[str], optional): only read articles of these PMCIDs (with or without "PMC" prefix), filtered on
+            file names "PMC<id>.xml" / "PMC<id>.nxml" when possible. Defaults to None (all articles).
+        """
+        self.db = db
+        self.pmcids = {self._normalize_pmcid(pmcid) for pmcid in pmcids} if pmcids is not None else None
+
+    @staticmethod
+    def _normalize_pmcid(pmcid: str) -> str:
+        pmcid = pmcid.strip().upper()
+        return pmcid if pmcid.startswith("PMC") else "PMC" + pmcid
+
+    def _is_xml(self, name: str) -> bool:
+        return name.lower().endswith(self.XML_EXTENSIONS)
+
+    def _is_tar(self, name: str) -> bool:
+        return name.lower().endswith(self.TAR_EXTENSIONS)
+
+    def _is_named_after_pmcid(self, name: str) -> bool:
+        return os.path.basename(name).upper().startswith("PMC")
+
+    def _is_selected(self, name: str) -> bool:
+        """Filter on file name, files not named after a PMCID are always read (and filtered on their article ids by the parsing workers)"""
+        if self.pmcids is None or not self._is_named_after_pmcid(name):
+            return True
+        return os.path.basename(name).split(".")[0].upper() in self.pmcids
+
+    def iter_articles(self, path: str) -> Iterator[Tuple[bytes, str]]:
+        """Iterate over all xml files of a directory tree or a `.tar.gz` package (or a single XML file)
+
+        Args:
+            path (str): path of the source
+
+        Yields:
+            Tuple[bytes,str]: (xml_bytes, db) of each file
+        """
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort() # deterministic order
+                for filename in sorted(filenames):
+                    yield from self.iter_articles(os.path.join(dirpath, filename))
+        elif self._is_tar(path):
+            yield from self._iter_tar_articles(path)
+        elif self._is_xml(path) and self._is_selected(path):
+            with open(path, "rb") as f:
+                yield f.read(), self.db
+
+    def _iter_tar_articles(self, tar_path: str) -> Iterator[Tuple[bytes, str]]:
+        """Stream a (gzipped) tar package, members are read sequentially"""
+        with tarfile.open(tar_path, mode="r|*") as tar:
+            for member in tar:
+                if not member.isfile() or not self._is_xml(member.name) or not self._is_selected(member.name):
+                    continue
+                yield tar.extractfile(member).read(), self.db
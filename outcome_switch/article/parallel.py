@@ -0,0 +1,120 @@
+import io
+import logging
+from collections import deque
+from itertools import islice
+from xml.etree import ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Any, Iterable, Iterator, Optional, Set, Union
+from outcome_switch.article.parse import ResponseParser
+from outcome_switch.article.filter import SectionFilter
+
+
+def parse_and_filter_articles(sources: List[Tuple[Union[str, bytes], str]],
+                              pmcids: Optional[Set[str]] = None) -> List[List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]]:
+    """Split, parse and filter the sections of a chunk of xml documents, run in the worker processes (must
+    stay a module level function to be pickled).
+
+    Args:
+        sources (List[Tuple[Union[str,bytes],str]]): list of (xml document, db) tuples, a document contains a single
+            article or many articles (efetch response), db is "pmc" or "pubmed"
+        pmcids (Set[str], optional): only keep the PMC articles of these PMCIDs ("PMC" prefixed). Defaults to None (all articles).
+
+    Returns:
+        List[List[Tuple[Dict[str,Any],Dict[str,Any]]]]: list of (parse_output, filter_output) tuples of the articles
+        of each document, parse_output has the same keys as `ResponseParser._parse_article_response` output, except
+        `article_xml_string` for single article documents (already known by the caller), filter_output is the output
+        of `SectionFilter.filter_sections`. If the document could not be parsed, its last parse_output only contains
+        the parse `error` message and its filter_output is None.
+    """
+    response_parser, section_filter = ResponseParser(), SectionFilter()
+    results = []
+    for source, db in sources:
+        source_results = []
+        try:
+            source_file = io.BytesIO(source.encode("utf-8") if isinstance(source, str) else source)
+            for article_element, is_document in response_parser.iter_document_articles(source_file, db):
+                if pmcids is not None and db == "pmc" and not _has_pmcid(response_parser, article_element, pmcids):
+                    continue
+                # only the articles of multi-article documents are serialized
+                parse_output = response_parser._parse_article_response(article_element, db, keep_xml=not is_document)
+                if is_document:
+                    del parse_output["article_xml_string"]
+                filter_output = section_filter.filter_sections(parse_output["text_sections"], parse_output["text_type"])
+                source_results.append((parse_output, filter_output))
+        except Exception as e:
+            logging.error(f"Could not parse article : {e}")
+            source_results.append(({"error": f"{type(e).__name__}: {e}"}, None))
+        results.append(source_results)
+    return results
+
+
+def _has_pmcid(response_parser: ResponseParser, article_element: ET.Element, pmcids: Set[str]) -> bool:
+    try:
+        return response_parser._get_pmcid(article_element) in pmcids
+    except AttributeError: # no pmc article id
+        return False
+
+
+class ParallelArticleProcessor:
+    """Split, parse and filter xml documents in a pool of worker processes, XML parsing and regex filtering
+    are CPU-bound and would otherwise hold the GIL of the main process. Documents are sent to the workers
+    as they are (no parsing in the main process) by chunks of `chunksize` documents, at most `2*max_workers`
+    chunks are in flight at a time so that arbitrarily long (lazy) inputs can be streamed, and results are
+    yielded back in input order."""
+
+    def __init__(self, max_workers: Optional[int] = None, chunksize: int = 16) -> None:
+        """
+        Args:
+            max_workers (int, optional): number of worker processes, None for the number of cpus, 0 to parse
+            and filter in the main process. Defaults to None.
+            chunksize (int, optional): number of documents sent to a worker at once. Defaults to 16.
+        """
+        self.max_workers = max_workers
+        self.chunksize = chunksize
+
+    def _iter_chunks(self, articles: Iterable[Tuple[Union[str, bytes], str]]) -> Iterator[List[Tuple[Union[str, bytes], str]]]:
+        articles = iter(articles)
+        while chunk := list(islice(articles, self.chunksize)):
+            yield chunk
+
+    def process(self, articles: Iterable[Tuple[Union[str, bytes], str]],
+                pmcids: Optional[Set[str]] = None) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Parse and filter articles, yields one (download_output, filter_output) tuple per article in input order,
+        download_output has the same keys as `IDDownloader.fetch_xml` outputs. If a document could not be parsed,
+        download_output only contains the parse `error` message and the `source_index` of the document in the input,
+        and filter_output is None (see `parse_and_filter_articles`).
+
+        Args:
+            articles (Iterable[Tuple[Union[str,bytes],str]]): iterable of (xml document, db) tuples, consumed lazily,
+                a document contains a single article or many articles (utf-8 encoded if given as bytes)
+            pmcids (Set[str], optional): only yield the PMC articles of these PMCIDs ("PMC" prefixed). Defaults to None (all articles).
+        """
+        source_index = 0
+        for chunk, results in self._iter_processed_chunks(articles, pmcids):
+            for (source, _), source_results in zip(chunk, results):
+                for parse_output, filter_output in source_results:
+                    if filter_output is None:
+                        parse_output = parse_output | {"source_index": source_index}
+                    elif "article_xml_string" not in parse_output: # single article document
+                        article_xml_string = source if isinstance(source, str) else source.decode("utf-8")
+                        parse_output = parse_output | {"article_xml_string": article_xml_string}
+                    yield parse_output, filter_output
+                source_index += 1
+
+    def _iter_processed_chunks(self, articles: Iterable[Tuple[Union[str, bytes], str]],
+                               pmcids: Optional[Set[str]] = None) -> Iterator[Tuple[List[Tuple[Any, str]], List[List[Tuple[Any, Any]]]]]:
+        if self.max_workers == 0:
+            for chunk in self._iter_chunks(articles):
+                yield chunk, parse_and_filter_articles(chunk, pmcids)
+            return
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            max_in_flight = 2 * executor._max_workers
+            in_flight = deque()
+            for chunk in self._iter_chunks(articles):
+                in_flight.append((chunk, executor.submit(parse_and_filter_articles, chunk, pmcids)))
+                if len(in_flight) >= max_in_flight:
+                    chunk, future = in_flight.popleft()
+                    yield chunk, future.result()
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
@@ -1,19 +1,25 @@
+import io
 from xml.etree import ElementTree as ET
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Iterator, IO, Tuple
 from os.path import join
+from outcome_switch.metrics import METRICS
 
 class XMLParser :
 
     def _get_text(self, element: ET.Element) -> str:
         """Extract text contained in `xml.etree.ElementTree.Element` 
-        object(text and tail of all children)"""
-        text = element.text if element.text else ''
-        text += " " + element.tail if element.tail else ''
+        object(text and tail of all children), non ascii characters are removed"""
+        parts = [element.text or '']
+        if element.tail:
+            parts.append(" " + element.tail)
         for child in element:
-            te = child.text if child.text else ''
-            ta = child.tail if child.tail else ''
-            text += " " + te + ta
-        return text.encode("ascii", "ignore").decode("utf-8").strip()
+            parts.append(" ")
+            parts.append(child.text or '')
+            parts.append(child.tail or '')
+        text = "".join(parts)
+        if not text.isascii():
+            text = text.encode("ascii", "ignore").decode("utf-8")
+        return text.strip()
 
     def _get_table(self, table_element: ET.Element) -> List[str]:
         """Extract text from XML table element with first column as title and other columns 
@@ -30,8 +36,9 @@ class XMLParser :
             row_index = 0
             for cell in row:
                 cell_type = cell.tag.split('}')[1] if '}' in cell.tag else cell.tag
-                cell_text = cell.text.encode("ascii", "ignore").decode(
-                    "utf-8") if cell.text else ''
+                cell_text = cell.text or ''
+                if not cell_text.isascii():
+                    cell_text = cell_text.encode("ascii", "ignore").decode("utf-8")
                 if cell_type == "th":
                     columns.append(cell_text + " : ")
                 elif cell_type == "td" and row_index < len(columns):
@@ -52,28 +59,34 @@ class XMLParser :
         """
         prefix = [prefix] if prefix else []
         title_stack = []
+        # joined title of the current title stack, computed again only when the stack changes
+        title = None
         result_dict = {}
-        for element, depth in self._depth_iter(element):
-            el_type = element.tag.split('}')[1] if '}' in element.tag else element.tag
+        # depth-first (preorder) traversal, same order and depths as `_depth_iter`
+        elements_stack = [(element, 1)]
+        while elements_stack:
+            element, depth = elements_stack.pop()
+            if len(element):
+                elements_stack.extend([(child, depth + 1) for child in reversed(element)])
+            tag = element.tag
+            el_type = tag[tag.index('}') + 1:] if '}' in tag else tag
 
             if el_type == "title":
-                if not title_stack or title_stack[-1][0] < depth:
-                    title_stack.append((depth, element.text))
-                elif title_stack[-1][0] >= depth:
-                    while depth <= title_stack[-1][0]:
-                        title_stack.pop(-1)
-                        if not title_stack:
-                            break
-                    title_stack.append((depth, element.text))
-
-            elif el_type in ["p","table","label"]:
-                title = " - ".join(prefix + [text for _,
-                                   text in title_stack if text])
-                content_text = self._get_table(element) if el_type == "table" else [self._get_text(element)]
-                if title not in result_dict:
-                    result_dict[title] = content_text
+                while title_stack and title_stack[-1][0] >= depth:
+                    title_stack.pop()
+                title_stack.append((depth, element.text))
+                title = None
+
+            elif el_type == "p" or el_type == "table" or el_type == "label":
+                if title is None:
+                    title = " - ".join(prefix + [text for _, text in title_stack if text])
+                section_content = result_dict.get(title)
+                if section_content is None:
+                    section_content = result_dict[title] = []
+                if el_type == "table":
+                    section_content.extend(self._get_table(element))
                 else:
-                    result_dict[title] += content_text
+                    section_content.append(self._get_text(element))
             
         return result_dict
 
@@ -83,11 +96,11 @@ class XMLParser :
         stack.append(iter([element]))
         while stack:
             e = next(stack[-1], None)
-            if e == None:
+            if e is None:
                 stack.pop()
             else:
                 stack.append(iter(e))
-                if tag == None or e.tag == tag:
+                if tag is None or e.tag == tag:
                     yield (e, len(stack) - 1)
 
 class PMCXMLParser(XMLParser):
@@ -156,16 +169,6 @@ class PMCXMLParser(XMLParser):
 
 
 class PubMedXMLParser(XMLParser):
-    def _get_text(self, element: ET.Element) -> str:
-        """Extract text contained in `xml.etree.ElementTree.Element` 
-        object(text and tail of all children)"""
-        text = element.text if element.text else ''
-        text += " " + element.tail if element.tail else ''
-        for child in element:
-            te = child.text if child.text else ''
-            ta = child.tail if child.tail else ''
-            text += " " + te + ta
-        return text.encode("ascii", "ignore").decode("utf-8").strip()
 
     def _get_sections(self, abstract_element: ET.Element) -> Dict[str, List[str]]:
         sections = {}
@@ -190,11 +193,17 @@ class PubMedXMLParser(XMLParser):
 
 class ResponseParser(XMLParser):
 
-    def _parse_article_response(self, article_element:ET.Element, db:str, save_dir:str="") -> Dict[str,Any]:
-        """ Parse a single article XML element (PMC or PubMed) depending on the `db` parameter."""
+    def _parse_article_response(self, article_element:ET.Element, db:str, save_dir:str="", keep_xml:bool=True) -> Dict[str,Any]:
+        """ Parse a single article XML element (PMC or PubMed) depending on the `db` parameter, 
+        the article is serialized to `article_xml_string` only if `keep_xml` is True or `save_dir` is set
+        (empty string otherwise)."""
+        with METRICS.span("xml_parsing"):
+            return self._parse_article(article_element, db, save_dir, keep_xml)
+
+    def _parse_article(self, article_element:ET.Element, db:str, save_dir:str="", keep_xml:bool=True) -> Dict[str,Any]:
         ret = {
             "retrieved_article_id": None,
-            "article_xml_string":ET.tostring(article_element, encoding="unicode", method="xml"),
+            "article_xml_string": ET.tostring(article_element, encoding="unicode", method="xml") if keep_xml or save_dir else "",
             "db": db,
             "text_type": None,
             "text_sections": None,
@@ -203,24 +212,78 @@ class ResponseParser(XMLParser):
             ret["retrieved_article_id"] = article_element.find(".//{*}ArticleId[@IdType='pubmed']").text
             ret["db"], ret["text_type"] = "pubmed", "abstract"
             pubmed_parser = PubMedXMLParser()
-            ret['text_sections'] = pubmed_parser.parse(ret["article_xml_string"])
+            ret['text_sections'] = pubmed_parser.parse(article_element)
         elif db == "pmc" :
-            ret["retrieved_article_id"] = 'PMC' + article_element.find(".//{*}article-id[@pub-id-type='pmc']").text
+            ret["retrieved_article_id"] = self._get_pmcid(article_element)
             ret["db"]="pmc"
             ret['text_type'] = "fulltext" if article_element.find('.//{*}body') is not None else "abstract"
             pmc_parser = PMCXMLParser()
-            ret['text_sections'] = pmc_parser.parse_fulltext(ret["article_xml_string"])
+            ret['text_sections'] = pmc_parser.parse_fulltext(article_element)
         if save_dir : # if save_dir is set save the xmls to save_dir
             output_path = join(save_dir, f'{ret["retrieved_article_id"]}.xml')
             with open(output_path, "w") as f:
                 f.write(ret["article_xml_string"])
         return ret
     
+    def _get_pmcid(self, article_element:ET.Element) -> str:
+        """Get the PMCID of a PMC article element, efetch responses give the id without the "PMC" prefix 
+        (`pmc` article-id) while recent Open Access packages may give it with the prefix (`pmc` or `pmcid` article-id)"""
+        id_element = article_element.find(".//{*}article-id[@pub-id-type='pmc']")
+        if id_element is None:
+            id_element = article_element.find(".//{*}article-id[@pub-id-type='pmcid']")
+        pmcid = id_element.text.strip()
+        return pmcid if pmcid.upper().startswith("PMC") else "PMC" + pmcid
+
     def parse_multiple_response(self, response_xml: str, db: str, save_dir:str="") -> List[Dict[str,str]]:
         """ Parse a Entrez esearch XML response potentially containing multiple articles (PMC or PubMed)
         depending on the `db` parameter."""
-        root = ET.fromstring(response_xml)
-        article_tag = "{*}article" if db == "pmc" else "{*}PubmedArticle"
-        return [self._parse_article_response(a,db,save_dir) for a in root.findall(f'.//{article_tag}')]
-    
-    
\ No newline at end of file
+        return list(self.iter_parse_response(io.BytesIO(response_xml.encode("utf-8")), db, save_dir, keep_xml=True))
+
+    def iter_parse_response(self, response_source: IO[bytes], db: str, save_dir:str="", keep_xml:bool=False) -> Iterator[Dict[str,Any]]:
+        """ Incrementally parse a Entrez efetch XML response potentially containing multiple articles 
+        (PMC or PubMed depending on the `db` parameter) and yield each parsed article as soon as its 
+        closing tag is read. Each article element is passed as is to the sections extractor and is cleared
+        once parsed, so that only one article is kept in memory at a time.
+
+        Args:
+            response_source (IO[bytes]): binary file-like object (or file path) of the XML response
+            db (str): database of the articles (pmc or pubmed)
+            save_dir (str, optional): if set, saves each article xml to save_dir. Defaults to "".
+            keep_xml (bool, optional): whether to keep the serialized xml of each article in 
+                `article_xml_string`. Defaults to False.
+        """
+        for article_element in self._iter_article_elements(response_source, db):
+            yield self._parse_article_response(article_element, db, save_dir, keep_xml)
+
+    def iter_split_response(self, response_source: IO[bytes], db: str) -> Iterator[str]:
+        """ Incrementally split a Entrez efetch XML response (or a file) potentially containing multiple 
+        articles (PMC or PubMed depending on the `db` parameter) and yield the xml string of each article, 
+        without parsing its sections"""
+        for article_element in self._iter_article_elements(response_source, db):
+            yield ET.tostring(article_element, encoding="unicode", method="xml")
+
+    def _iter_article_elements(self, response_source: IO[bytes], db: str) -> Iterator[ET.Element]:
+        """Yield each (outermost) article element of the response as soon as its closing tag is read, 
+        the element is cleared once the consumer asks for the next one"""
+        for article_element, _ in self.iter_document_articles(response_source, db):
+            yield article_element
+
+    def iter_document_articles(self, response_source: IO[bytes], db: str) -> Iterator[Tuple[ET.Element, bool]]:
+        """Same as `_iter_article_elements` but also yields whether the article element is the root of the
+        document (single article file, whose xml does not need to be serialized again)"""
+        article_tag = "article" if db == "pmc" else "PubmedArticle"
+        root = None
+        article_depth = 0 # number of article elements currently opened (nested articles are kept in their parent)
+        for event, element in ET.iterparse(response_source, events=("start", "end")):
+            if root is None:
+                root = element
+            if element.tag.split('}')[-1] != article_tag:
+                continue
+            if event == "start":
+                article_depth += 1
+                continue
+            article_depth -= 1
+            if article_depth == 0:
+                yield element, element is root
+                element.clear()
+                root.clear()
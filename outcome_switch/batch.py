@@ -0,0 +1,225 @@
+"""Resumable batch detection of outcome switching, writes one JSON result per line.
+
+Usage : python -m outcome_switch.batch ids.txt -o results.jsonl [--config config.json] [--shard 0 --num-shards 4]
+
+Completed and failed ids are kept in a sqlite index (next to the output file by default), an interrupted
+run is restarted with the same command and only processes the remaining ids. Runs can be split between
+workers with `--num-shards` : each id belongs to a single shard (stable hash of the id).
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import argparse
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, TextIO, Union
+from outcome_switch.data import Outcome, DetectionResult
+from outcome_switch.utils import get_batchs
+from outcome_switch.metrics import METRICS
+
+
+def get_shard(input_id: str, num_shards: int) -> int:
+    """Shard of an input id, stable across runs and machines (unlike python `hash`)"""
+    return int(hashlib.md5(input_id.strip().encode("utf-8")).hexdigest(), 16) % num_shards
+
+
+def _to_json_default(value: Any) -> Any:
+    """Convert the values of detection outputs that are not serializable by `json`"""
+    if isinstance(value, Outcome):
+        return value.to_json()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def serialize_output(output: Union[DetectionResult, Dict[str, Any]]) -> str:
+    """Serialize a detection result (or a detection output dict, see `OutcomeSwitchingDetector.detect`, the 
+    article xml is then dropped) to a single JSON line"""
+    if isinstance(output, DetectionResult):
+        return output.to_json()
+    output = {key: value for key, value in output.items() if key != "article_xml_string"}
+    return json.dumps(output, default=_to_json_default, ensure_ascii=False)
+
+
+class CheckpointIndex:
+    """Persistent index of the processed ids of a batch run (sqlite table keyed by input id), so that an
+    interrupted run can be restarted without scanning its outputs or logs"""
+
+    COMPLETED = "completed"
+    FAILED = "failed"
+    # maximum number of ids of a query
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, index_path: str) -> None:
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.connection = sqlite3.connect(index_path)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS ids (input_id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, updated REAL)")
+
+    def get_status(self, input_id: str) -> Optional[str]:
+        row = self.connection.execute("SELECT status FROM ids WHERE input_id = ?", (input_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_statuses(self, input_ids: List[str]) -> Dict[str, str]:
+        """Statuses of the indexed ids among `input_ids`, queried by chunks (below the sqlite variables limit)"""
+        statuses = {}
+        for ids_chunk in get_batchs(list(dict.fromkeys(input_ids)), self.QUERY_CHUNK_SIZE):
+            placeholders = ",".join("?" * len(ids_chunk))
+            statuses.update(self.connection.execute(f"SELECT input_id, status FROM ids WHERE input_id IN ({placeholders})", ids_chunk))
+        return statuses
+
+    def get_remaining(self, input_ids: List[str], retry_failed: bool = False) -> List[str]:
+        """Ids that are not completed (nor failed unless `retry_failed`), duplicates are removed"""
+        done_statuses = {self.COMPLETED} if retry_failed else {self.COMPLETED, self.FAILED}
+        statuses = self.get_statuses(input_ids)
+        return [input_id for input_id in dict.fromkeys(input_ids) if statuses.get(input_id) not in done_statuses]
+
+    def mark(self, input_ids: List[str], status: str, error: str = "") -> None:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO ids VALUES (?, ?, ?, ?)",
+                                        [(input_id, status, error, now) for input_id in input_ids])
+
+    def count(self, status: str) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM ids WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class BatchRunner:
+    """Run `OutcomeSwitchingDetector.detect_many` on a list of ids, results are appended to a JSONL file and
+    the index is updated after each chunk of ids (a chunk interrupted before the index update is processed
+    again at restart, its results can then appear twice in the output file). If the detection of a chunk
+    fails, the results already yielded are kept and the ids left are retried one at a time, only the ids
+    whose own detection fails are marked as failed."""
+
+    def __init__(self, detector, output_path: str, index_path: str = "", batch_size: int = 200,
+                 shard: int = 0, num_shards: int = 1, retry_failed: bool = False,
+                 metrics_json_path: str = "", metrics_prometheus_path: str = "") -> None:
+        """
+        Args:
+            detector (OutcomeSwitchingDetector): detector used for the run
+            output_path (str): path of the JSONL output file (results are appended)
+            index_path (str, optional): path of the checkpoint index. Defaults to "" (`<output_path>.index.sqlite`).
+            batch_size (int, optional): number of ids processed (and checkpointed) at once. Defaults to 200.
+            shard (int, optional): shard of the ids processed by this runner. Defaults to 0.
+            num_shards (int, optional): number of shards the ids are split in. Defaults to 1.
+            retry_failed (bool, optional): process again the ids that failed in previous runs. Defaults to False.
+            metrics_json_path (str, optional): JSONL file where a snapshot of the metrics is appended after each chunk. Defaults to "" (no snapshot).
+            metrics_prometheus_path (str, optional): file rewritten with the metrics in Prometheus text format after each chunk. Defaults to "" (no export).
+        """
+        if not 0 <= shard < num_shards:
+            raise ValueError("shard must be between 0 and num_shards - 1")
+        self.detector = detector
+        self.output_path = output_path
+        self.index = CheckpointIndex(index_path if index_path else output_path + ".index.sqlite")
+        self.batch_size = batch_size
+        self.shard = shard
+        self.num_shards = num_shards
+        self.retry_failed = retry_failed
+        self.metrics_json_path = metrics_json_path
+        self.metrics_prometheus_path = metrics_prometheus_path
+
+    def get_remaining(self, input_ids: List[str]) -> List[str]:
+        """Ids of the shard of the runner that still need to be processed"""
+        input_ids = [input_id.strip() for input_id in input_ids if input_id.strip()]
+        if self.num_shards > 1:
+            input_ids = [input_id for input_id in input_ids if get_shard(input_id, self.num_shards) == self.shard]
+        return self.index.get_remaining(input_ids, self.retry_failed)
+
+    def run(self, input_ids: List[str]) -> Dict[str, int]:
+        """Process the remaining ids and returns the number of completed and failed ids of the run"""
+        remaining_ids = self.get_remaining(input_ids)
+        logging.info(f"{len(remaining_ids)} ids to process (shard {self.shard}/{self.num_shards})")
+        counts = {CheckpointIndex.COMPLETED: 0, CheckpointIndex.FAILED: 0}
+        with open(self.output_path, "a", encoding="utf-8") as output_file:
+            for ids_batch in get_batchs(remaining_ids, self.batch_size):
+                for status, status_count in self._run_batch(ids_batch, output_file).items():
+                    counts[status] += status_count
+                self._export_metrics()
+                logging.info(f"{counts[CheckpointIndex.COMPLETED]} completed, {counts[CheckpointIndex.FAILED]} failed / {len(remaining_ids)}")
+        return counts
+
+    def _export_metrics(self) -> None:
+        if self.metrics_json_path:
+            METRICS.write_json(self.metrics_json_path)
+        if self.metrics_prometheus_path:
+            METRICS.write_prometheus(self.metrics_prometheus_path)
+
+    def _detect(self, ids_batch: List[str], lines: List[str]) -> Optional[Exception]:
+        """Append the serialized results of the ids to `lines` as they are yielded, returns the exception
+        that stopped the detection (None if all ids were processed)"""
+        try:
+            for output in self.detector.detect_many(ids_batch, batch_size=len(ids_batch)):
+                lines.append(serialize_output(output))
+        except Exception as e:
+            return e
+        return None
+
+    def _run_batch(self, ids_batch: List[str], output_file: TextIO) -> Dict[str, int]:
+        """Process a chunk of ids and returns the number of completed and failed ids"""
+        lines, failed = [], {} # failed input id : error
+        error = self._detect(ids_batch, lines)
+        if error is not None:
+            unprocessed_ids = ids_batch[len(lines):]
+            logging.error(f"batch of {len(ids_batch)} ids failed ({error!r}), retrying its {len(unprocessed_ids)} unprocessed ids one at a time",
+                          exc_info=error)
+            for input_id in unprocessed_ids:
+                error = self._detect([input_id], lines)
+                if error is not None:
+                    logging.error(f"{input_id} failed", exc_info=error)
+                    failed[input_id] = repr(error)
+        output_file.write("".join(line + "\n" for line in lines))
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        self.index.mark([input_id for input_id in ids_batch if input_id not in failed], CheckpointIndex.COMPLETED)
+        for input_id, error in failed.items():
+            self.index.mark([input_id], CheckpointIndex.FAILED, error)
+        return {CheckpointIndex.COMPLETED: len(ids_batch) - len(failed), CheckpointIndex.FAILED: len(failed)}
+
+def iter_ids(ids_path: str) -> Iterator[str]:
+    """Read input ids, one per line"""
+    with open(ids_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("ids_path", help="file with one pmid, pmcid or doi per line")
+    arg_parser.add_argument("-o", "--output", required=True, help="JSONL output file (results are appended)")
+    arg_parser.add_argument("--config", default="config.json", help="detector config file")
+    arg_parser.add_argument("--index", default="", help="checkpoint index path (default : <output>.index.sqlite)")
+    arg_parser.add_argument("--batch-size", type=int, default=200, help="number of ids processed and checkpointed at once")
+    arg_parser.add_argument("--shard", type=int, default=0, help="shard processed by this worker")
+    arg_parser.add_argument("--num-shards", type=int, default=1, help="number of shards (workers)")
+    arg_parser.add_argument("--retry-failed", action="store_true", help="process again the ids that failed in previous runs")
+    arg_parser.add_argument("--metrics-json", default="", help="JSONL file where a metrics snapshot is appended after each chunk")
+    arg_parser.add_argument("--metrics-prom", default="", help="file rewritten with the metrics in Prometheus text format after each chunk")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    # imported here so that the command line help does not load the models dependencies
+    from outcome_switch.main import OutcomeSwitchingDetector
+    runner = BatchRunner(OutcomeSwitchingDetector(config), args.output, args.index, args.batch_size,
+                         args.shard, args.num_shards, args.retry_failed, args.metrics_json, args.metrics_prom)
+    counts = runner.run(list(iter_ids(args.ids_path)))
+    logging.info(f"done : {counts}")
+    if counts[CheckpointIndex.FAILED]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
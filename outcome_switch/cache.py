@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from os.path import join
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # not available on windows, the on-disk embeddings tier then needs a single writer process
+    fcntl = None
+
+
+class LRUCache:
+    """Thread-safe in-memory key-value cache evicting least recently used entries when the total 
+    size of the entries (number of entries by default, see `getsizeof`) is greater than `maxsize`"""
+
+    def __init__(self, maxsize:int=1024, getsizeof:Optional[Callable[[Any], int]]=None) -> None:
+        """
+        Args:
+            maxsize (int, optional): maximum total size of the entries. Defaults to 1024.
+            getsizeof (Callable[[Any], int], optional): function returning the size of a value. 
+                Defaults to None (each value has a size of 1).
+        """
+        self.maxsize = maxsize
+        self.getsizeof = getsizeof if getsizeof is not None else lambda value: 1
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key:Any, default:Any=None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key:Any, value:Any) -> None:
+        value_size = self.getsizeof(value)
+        if value_size > self.maxsize:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= self.getsizeof(self._data.pop(key))
+            self._data[key] = value
+            self.size += value_size
+            while self.size > self.maxsize:
+                _, evicted_value = self._data.popitem(last=False)
+                self.size -= self.getsizeof(evicted_value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __contains__(self, key:Any) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """Persistent key-value cache of json serializable values. Each value is stored in its own file,
+    named after the sha256 hash of its key, so the cache survives process restarts and can be shared
+    by several processes. Entries older than `ttl` are discarded and, when the cache grows over
+    `max_size` bytes, least recently used entries are evicted.
+    """
+
+    # eviction goes down to this fraction of `max_size`, so that the cache directory is only scanned
+    # once every many writes and not at each write once the cache is full
+    LOW_WATER_RATIO = 0.9
+
+    def __init__(self, cache_dir:str, ttl:Optional[float]=None, max_size:Optional[int]=None) -> None:
+        """
+        Args:
+            cache_dir (str): directory where the cache files are stored (created if it does not exist)
+            ttl (float, optional): time to live of the entries in seconds. Defaults to None (no expiration).
+            max_size (int, optional): maximum size of the cache directory in bytes. Defaults to None (no limit).
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._iter_files())
+
+    def _path(self, key:str) -> str:
+        key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return join(self.cache_dir, key_hash[:2], key_hash + ".json")
+
+    def _iter_files(self):
+        """Iterate over all cache files and yield (path, last access time, size)"""
+        for subdir in os.scandir(self.cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get_entry(self, key:str) -> Optional[Tuple[Any, float]]:
+        """Get the value stored for the key and its age in seconds (whatever the ttl),
+        returns None if the key is not in cache"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # file modification time is used as last access time for LRU eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if entry["key"] != key:
+            return None
+        return entry["value"], time.time() - entry["created"]
+
+    def get(self, key:str, default:Any=None) -> Any:
+        """Get the value stored for the key, returns `default` if the key is not in cache or expired"""
+        entry = self.get_entry(key)
+        if entry is None:
+            return default
+        value, age = entry
+        if self.ttl is not None and age > self.ttl:
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key:str, value:Any) -> None:
+        """Store the value for the key, the value must be json serializable"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = json.dumps({"key": key, "created": time.time(), "value": value})
+        # write in a temporary file and rename it so that readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path) - previous_size
+            if self.max_size is not None and self._size > self.max_size:
+                self._evict()
+
+    def delete(self, key:str) -> None:
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def clear(self) -> None:
+        for path, _, _ in list(self._iter_files()):
+            os.remove(path)
+        with self._lock:
+            self._size = 0
+
+    def __contains__(self, key:str) -> bool:
+        return self.get(key) is not None
+
+    def _evict(self) -> None:
+        """Remove least recently used files until the cache size is under `LOW_WATER_RATIO * max_size`
+        (the size is recomputed from the files as other processes may share the directory)"""
+        files = sorted(self._iter_files(), key=lambda f: f[1])
+        self._size = sum(size for _, _, size in files)
+        if self._size <= self.max_size:
+            return
+        for path, _, size in files:
+            if self._size <= self.LOW_WATER_RATIO * self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+
+class EmbeddingCache:
+    """Cache of the sentence embeddings computed by a model, keyed by normalized sentence. Embeddings 
+    are kept in an in-memory LRU tier bounded in bytes and, if `cache_dir` is given, in an on-disk tier 
+    made of a float32 matrix file (memory-mapped for reading, one row per sentence) and an append-only
+    index of the sentences rows. Appends to the on-disk tier are serialized by an exclusive file lock,
+    so that several processes (e.g. workers of a server) can share the same directory.
+    """
+
+    def __init__(self, model_id:str, max_memory:int=64*2**20, cache_dir:Optional[str]=None) -> None:
+        """
+        Args:
+            model_id (str): id (or path) of the model computing the embeddings
+            max_memory (int, optional): maximum size in bytes of the in-memory tier. Defaults to 64MB.
+            cache_dir (str, optional): directory of the on-disk tier, each model has its own subdirectory.
+                Defaults to None (in-memory tier only).
+        """
+        self.model_id = model_id
+        self.memory = LRUCache(maxsize=max_memory, getsizeof=lambda embedding: embedding.nbytes)
+        self.cache_dir = None
+        self.dim = None
+        self._rows: Dict[str, int] = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        if cache_dir:
+            model_hash = hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:16]
+            self.cache_dir = join(cache_dir, model_hash)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def normalize(sentence:str) -> str:
+        """Normalize unicode characters and whitespaces of a sentence"""
+        return " ".join(unicodedata.normalize("NFKC", sentence).split())
+
+    @property
+    def _matrix_path(self) -> str:
+        return join(self.cache_dir, "embeddings.f32")
+
+    @property
+    def _index_path(self) -> str:
+        return join(self.cache_dir, "index.jsonl")
+
+    def _load_index(self) -> None:
+        meta_path = join(self.cache_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r") as f:
+            self.dim = json.load(f)["dim"]
+        n_rows = os.path.getsize(self._matrix_path) // (4 * self.dim) if os.path.exists(self._matrix_path) else 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError: # partially written last line
+                        continue
+                    # rows are written before their index line, ignore rows missing after a crash
+                    if entry["row"] < n_rows:
+                        self._rows[entry["key"]] = entry["row"]
+
+    def _read_row(self, row:int) -> np.ndarray:
+        if self._matrix is None or row >= self._matrix.shape[0]: # map the rows appended since last mapping
+            n_rows = os.path.getsize(self._matrix_path) // (4 * self.dim)
+            self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+        return np.array(self._matrix[row])
+
+    @contextmanager
+    def _disk_lock(self) -> Iterator[None]:
+        """Exclusive lock of the on-disk tier shared by all processes (released when the lock file is closed)"""
+        with open(join(self.cache_dir, "lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _write_row(self, key:str, embedding:np.ndarray) -> None:
+        # the row number, the row and its index line are written by a single process at a time
+        with self._disk_lock():
+            meta_path = join(self.cache_dir, "meta.json")
+            if self.dim is None and os.path.exists(meta_path): # tier created by another process
+                with open(meta_path, "r") as f:
+                    self.dim = json.load(f)["dim"]
+            if self.dim is None:
+                self.dim = embedding.shape[0]
+                with open(meta_path, "w") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+            row_size = 4 * self.dim
+            with open(self._matrix_path, "ab") as f:
+                size = f.tell()
+                if size % row_size: # partial row of a writer that crashed
+                    f.truncate(size - size % row_size)
+                row = size // row_size
+                f.write(embedding.astype(np.float32).tobytes())
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "row": row}) + "\n")
+        self._rows[key] = row
+
+    def get(self, sentence:str) -> Optional[np.ndarray]:
+        """Get the embedding of the sentence, returns None if it is not in cache"""
+        key = self.normalize(sentence)
+        embedding = self.memory.get(key)
+        if embedding is None and key in self._rows:
+            with self._lock:
+                embedding = self._read_row(self._rows[key])
+            self.memory.set(key, embedding)
+        return embedding
+
+    def set(self, sentence:str, embedding:np.ndarray) -> None:
+        """Store the embedding (1D float32 array) of the sentence"""
+        key = self.normalize(sentence)
+        self.memory.set(key, embedding)
+        if self.cache_dir is not None and key not in self._rows:
+            with self._lock:
+                self._write_row(key, embedding)
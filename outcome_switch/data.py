@@ -1,6 +1,8 @@
+import json
 from enum import Enum
 from datetime import datetime
-from typing import Optional, Dict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
 
 
 class OutcomeType(Enum):
@@ -52,6 +54,19 @@ class Outcome:
             "submission_date": string_date,
         }
 
+    @classmethod
+    def from_json(cls, json_dict: Dict[str, Any]) -> "Outcome":
+        """Build an outcome from the output of `to_json`"""
+        submission_date = json_dict.get("submission_date")
+        return cls(
+            text=json_dict["text"],
+            outcome_type=json_dict["outcome_type"],
+            date_type=json_dict.get("date_type") or None,
+            submission_date=datetime.strptime(submission_date, "%Y-%m-%d") if submission_date else None,
+            description=json_dict.get("description", ""),
+            time_frame=json_dict.get("time_frame", ""),
+        )
+
     def __str__(self) -> str:
         return str(self.to_json())
 
@@ -69,4 +84,127 @@ class Outcome:
         if not diff :
             diff.append("same")
         return " ".join(diff)
-    
\ No newline at end of file
+    
+
+@dataclass(slots=True)
+class DetectionResult:
+    """Compact and serializable outcome switching detection result of an article, built from the output dict 
+    of `OutcomeSwitchingDetector` (see `OutcomeSwitchingDetector.detect` for the meaning of the fields). 
+    Heavy fields are optional : `article_xml_string`, `text_sections` and `o_entities` (entities of the "O" 
+    group, not outcomes) are None unless they are kept, `entities` only contains the outcome entities."""
+
+    input_id: str
+    normalized_id: str = ""
+    retrieved_article_id: str = ""
+    db: str = ""
+    text_type: str = ""
+    check_type: Optional[str] = None
+    regex_priority_name: Optional[str] = None
+    regex_priority_index: Optional[int] = None
+    filtered_sections: Dict[str, List[str]] = field(default_factory=dict)
+    entities: List[Dict[str, Any]] = field(default_factory=list)
+    article_outcomes: List[Tuple[str, str]] = field(default_factory=list)
+    detected_nct_id: str = ""
+    date_type: str = ""
+    primary_current_original_modif: str = ""
+    full_registry_outcomes: Dict[str, List[Outcome]] = field(default_factory=dict)
+    registry_outcomes: List[Tuple[str, str]] = field(default_factory=list)
+    connections: List[Tuple[int, int, float]] = field(default_factory=list)
+    article_xml_string: Optional[str] = None
+    text_sections: Optional[Dict[str, List[str]]] = None
+    o_entities: Optional[List[Dict[str, Any]]] = None
+    error: str = ""
+
+    @staticmethod
+    def _compact_entity(entity: Dict[str, Any]) -> Dict[str, Any]:
+        """Entity with python types (scores of the token classifier are numpy floats)"""
+        return {
+            "entity_group": entity["entity_group"],
+            "score": float(entity["score"]),
+            "word": entity["word"],
+            "start": int(entity["start"]) if entity.get("start") is not None else None,
+            "end": int(entity["end"]) if entity.get("end") is not None else None,
+        }
+
+    @classmethod
+    def from_output(cls, output: Dict[str, Any], keep_xml: bool = False, keep_sections: bool = False,
+                    keep_o_entities: bool = False) -> "DetectionResult":
+        """Build a result from a detection output dict
+
+        Args:
+            output (Dict[str,Any]): output of `OutcomeSwitchingDetector.detect` (or of its steps)
+            keep_xml (bool, optional): keep the article xml. Defaults to False.
+            keep_sections (bool, optional): keep all the sections of the article (filtered sections are always kept). Defaults to False.
+            keep_o_entities (bool, optional): keep the entities of the "O" group. Defaults to False.
+        """
+        raw_entities = output.get("raw_entities") or []
+        connections = output.get("connections")
+        return cls(
+            input_id=output["input_id"],
+            normalized_id=output.get("normalized_id") or "",
+            retrieved_article_id=output.get("retrieved_article_id") or "",
+            db=output.get("db") or "",
+            text_type=output.get("text_type") or "",
+            check_type=output.get("check_type"),
+            regex_priority_name=output.get("regex_priority_name"),
+            regex_priority_index=output.get("regex_priority_index"),
+            filtered_sections=output.get("filtered_sections") or {},
+            entities=[cls._compact_entity(e) for e in raw_entities if e["entity_group"] != "O"],
+            article_outcomes=[tuple(o) for o in output.get("article_outcomes", [])],
+            detected_nct_id=output.get("detected_nct_id") or "",
+            date_type=output.get("date_type") or "",
+            primary_current_original_modif=output.get("primary_current-original_modif") or "",
+            full_registry_outcomes=output.get("full_registry_outcomes") or {},
+            registry_outcomes=[tuple(o) for o in output.get("registry_outcomes", [])],
+            connections=[(int(i), int(j), float(score)) for i, j, score in connections] if connections is not None else [],
+            article_xml_string=output.get("article_xml_string") if keep_xml else None,
+            text_sections=output.get("text_sections") if keep_sections else None,
+            o_entities=[cls._compact_entity(e) for e in raw_entities if e["entity_group"] == "O"] if keep_o_entities else None,
+            error=output.get("error") or "",
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict of the result with json types only, optional fields that are not kept are left out"""
+        ret = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None and name in ("article_xml_string", "text_sections", "o_entities"):
+                continue
+            if name == "full_registry_outcomes":
+                value = {title: [o.to_json() for o in outcomes] for title, outcomes in value.items()}
+            ret[name] = value
+        return ret
+
+    @classmethod
+    def from_dict(cls, json_dict: Dict[str, Any]) -> "DetectionResult":
+        """Build a result from the output of `to_dict`"""
+        full_registry_outcomes = {title: [Outcome.from_json(o) for o in outcomes] 
+                                  for title, outcomes in json_dict.get("full_registry_outcomes", {}).items()}
+        ret = cls(**(json_dict | {"full_registry_outcomes": full_registry_outcomes}))
+        for name in ("article_outcomes", "registry_outcomes", "connections"):
+            setattr(ret, name, [tuple(value) for value in getattr(ret, name)])
+        return ret
+
+    def to_json(self) -> str:
+        """Serialize the result to a single line json string"""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, json_string: str) -> "DetectionResult":
+        return cls.from_dict(json.loads(json_string))
+
+    def to_msgpack(self) -> bytes:
+        """Serialize the result to msgpack (requires the optional `msgpack` package)"""
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError("msgpack serialization requires the msgpack package : pip install msgpack") from e
+        return msgpack.packb(self.to_dict(), use_bin_type=True)
+
+    @classmethod
+    def from_msgpack(cls, data: bytes) -> "DetectionResult":
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError("msgpack serialization requires the msgpack package : pip install msgpack") from e
+        return cls.from_dict(msgpack.unpackb(data, raw=False))
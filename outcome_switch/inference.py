@@ -0,0 +1,170 @@
+import os
+import json
+import inspect
+import hashlib
+import logging
+import itertools
+import torch
+from typing import List, Tuple
+
+INFERENCE_BACKENDS = ("pytorch", "quantized", "onnx")
+
+# inputs of the exported graphs, only the ones accepted by the model are exported
+MODEL_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+# checkpoint files of the transformers models, in loading order
+WEIGHTS_NAMES = ("model.safetensors", "model.safetensors.index.json", "pytorch_model.bin", "pytorch_model.bin.index.json")
+
+
+def quantize(model: torch.nn.Module) -> torch.nn.Module:
+    """Dynamic int8 quantization of the linear layers of a model (weights are quantized once, activations
+    at each forward pass), for CPU inference"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class _FirstOutput(torch.nn.Module):
+    """Model returning only its first output (logits of a token classifier, token embeddings of an encoder)"""
+
+    def __init__(self, model: torch.nn.Module, input_names: Tuple[str, ...]) -> None:
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, inputs)))[0]
+
+
+def get_input_names(model: torch.nn.Module) -> Tuple[str, ...]:
+    parameters = inspect.signature(model.forward).parameters
+    return tuple(name for name in MODEL_INPUT_NAMES if name in parameters)
+
+
+def export_onnx(model: torch.nn.Module, onnx_path: str, opset_version: int = 17) -> None:
+    """Export the first output of a transformers model to an ONNX graph with dynamic batch and sequence axes"""
+    input_names = get_input_names(model)
+    dummy_inputs = tuple(torch.ones((2, 8), dtype=torch.long) if name != "token_type_ids" else torch.zeros((2, 8), dtype=torch.long)
+                         for name in input_names)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ("output",)}
+    if os.path.dirname(onnx_path):
+        os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    tmp_path = onnx_path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(_FirstOutput(model.eval(), input_names), dummy_inputs, tmp_path, input_names=list(input_names),
+                          output_names=["output"], dynamic_axes=dynamic_axes, opset_version=opset_version, dynamo=False)
+    # atomic replacement, other processes never load a partially written graph
+    os.replace(tmp_path, onnx_path)
+
+
+class ONNXRuntimeForward:
+    """Replacement of the `forward` method of a transformers model running its exported ONNX graph with
+    onnxruntime (optional dependency). The model object is kept for its config and for the pipelines,
+    outputs are returned as a tuple whose first element is the first output of the model."""
+
+    def __init__(self, onnx_path: str) -> None:
+        """
+        Args:
+            onnx_path (str): path of the graph exported with `export_onnx`
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("the onnx inference backend requires onnxruntime : pip install onnxruntime onnx") from e
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_names = [session_input.name for session_input in self.session.get_inputs()]
+
+    def __call__(self, input_ids: torch.Tensor, **kwargs) -> Tuple[torch.Tensor]:
+        inputs = kwargs | {"input_ids": input_ids}
+        feed = {}
+        for name in self.input_names:
+            value = inputs.get(name)
+            if value is None: # e.g. token type ids not returned by the tokenizer
+                value = torch.zeros_like(input_ids) if name == "token_type_ids" else torch.ones_like(input_ids)
+            feed[name] = value.cpu().numpy()
+        output = self.session.run(["output"], feed)[0]
+        return (torch.from_numpy(output),)
+
+
+def _resolve_model_file(name_or_path: str, filename: str) -> str:
+    """Path of a file of a local model directory or of a model of the huggingface cache ("" if not found)"""
+    if os.path.isdir(name_or_path):
+        path = os.path.join(name_or_path, filename)
+        return path if os.path.isfile(path) else ""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        path = try_to_load_from_cache(name_or_path, filename)
+    except Exception: # not a valid repository id
+        return ""
+    return path if isinstance(path, str) else ""
+
+
+def get_checkpoint_files(model: torch.nn.Module) -> List[str]:
+    """Weights files the model was loaded from (shards of a sharded checkpoint), empty if not found"""
+    for filename in WEIGHTS_NAMES:
+        path = _resolve_model_file(model.config.name_or_path, filename)
+        if not path:
+            continue
+        if not filename.endswith(".index.json"):
+            return [path]
+        with open(path, "r") as f:
+            shard_names = sorted(set(json.load(f)["weight_map"].values()))
+        return [path] + [os.path.join(os.path.dirname(path), shard_name) for shard_name in shard_names]
+    return []
+
+
+def get_weights_hash(model: torch.nn.Module) -> str:
+    """Hash of the names, shapes and values of the parameters and buffers of a model (reads all the weights,
+    only used for models without checkpoint files)"""
+    weights_hash = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        tensor = tensor.detach().cpu().contiguous()
+        weights_hash.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode("utf-8"))
+        weights_hash.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes() if tensor.numel() else b"")
+    return weights_hash.hexdigest()
+
+
+def get_weights_id(model: torch.nn.Module) -> str:
+    """Id of the weights of a model : size and modification time of its checkpoint files (the weights are
+    not read), hash of its weights if it was not loaded from files"""
+    checkpoint_files = get_checkpoint_files(model)
+    if not checkpoint_files:
+        return get_weights_hash(model)
+    return ",".join(f"{os.path.basename(path)}:{os.stat(path).st_size}:{os.stat(path).st_mtime_ns}" for path in checkpoint_files)
+
+
+def release_weights(model: torch.nn.Module) -> None:
+    """Free the memory of the parameters and buffers of a model whose forward pass does not use them
+    anymore, tensors are replaced by empty tensors of the same dtype and device"""
+    with torch.no_grad():
+        for tensor in itertools.chain(model.parameters(), model.buffers()):
+            tensor.data = torch.empty(0, dtype=tensor.dtype, device=tensor.device)
+
+
+def get_onnx_path(model: torch.nn.Module, onnx_dir: str) -> str:
+    """Path of the exported graph of a model, graphs of different models, of different weights of the same
+    model (e.g. fine-tuned again in place) and of different versions of torch do not collide"""
+    model_id = f"{model.config.name_or_path}:{type(model).__name__}:{get_weights_id(model)}:{torch.__version__}"
+    return os.path.join(onnx_dir, hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:16] + ".onnx")
+
+
+def apply_backend(model: torch.nn.Module, backend: str = "pytorch", onnx_dir: str = "cache/onnx") -> torch.nn.Module:
+    """Prepare a transformers model for inference with the given backend
+
+    Args:
+        model (torch.nn.Module): transformers model (fp32 pytorch)
+        backend (str, optional): "pytorch" (model unchanged), "quantized" (dynamic int8 quantization) or "onnx"
+            (graph exported once in `onnx_dir` then run with onnxruntime, the torch weights are released).
+            Defaults to "pytorch".
+        onnx_dir (str, optional): directory of the exported graphs. Defaults to "cache/onnx".
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"inference backend must be one of {INFERENCE_BACKENDS}")
+    model.eval()
+    if backend == "quantized":
+        return quantize(model)
+    if backend == "onnx":
+        onnx_path = get_onnx_path(model, onnx_dir)
+        if not os.path.exists(onnx_path):
+            logging.info(f"exporting {model.config.name_or_path} to {onnx_path}")
+            export_onnx(model, onnx_path)
+        model.forward = ONNXRuntimeForward(onnx_path)
+        release_weights(model)
+    return model
@@ -1,40 +1,209 @@
-from outcome_switch.registry import CTGOVExtractor
+import logging
+import threading
+from outcome_switch.registry import CTGOVExtractor, CTGOVSnapshotBackend, CTGOVAPIv2Backend
 from outcome_switch.article.download import IDDownloader
-from outcome_switch.outcome_comparison import OutcomeSimilarity
 from outcome_switch.article.filter import SectionFilter
-from outcome_switch.utils import get_sections_text, filter_outcomes, convert_registry_outcomes
-from typing import List, Dict, Tuple, Any
-from transformers import BertTokenizerFast, BertForTokenClassification, TokenClassificationPipeline
+from outcome_switch.article.parallel import ParallelArticleProcessor
+from outcome_switch.article.local import LocalArticleReader
+from outcome_switch.session import get_session
+from outcome_switch.ratelimit import RequestScheduler, BATCH, get_ncbi_session
+from outcome_switch.cache import DiskCache, EmbeddingCache
+from concurrent.futures import ThreadPoolExecutor
+from outcome_switch.utils import get_batchs, get_sections_text, filter_outcomes, convert_registry_outcomes
+from itertools import islice
+from typing import List, Dict, Tuple, Any, Iterator, Iterable, Optional, Set, Union, TYPE_CHECKING
+from outcome_switch.data import DetectionResult
+from outcome_switch.metrics import METRICS, submit
+
+if TYPE_CHECKING : # imported when the models are loaded (torch and transformers)
+    from outcome_switch.article.extraction import ChunkTokenClassificationPipeline
+    from outcome_switch.outcome_comparison import OutcomeSimilarity
+
+def empty_download_output(input_id:str) -> Dict[str, Any]:
+    """Download output used when the article of the input id could not be retrieved"""
+    return {"input_id" : input_id, "retrieved_article_id":"", "article_xml_string": "", "db": "", "text_type":"", "text_sections": {}}
+
 
 class OutcomeSwitchingDetector:
     """Main Class for the whole pipeline of outcome switching detection"""
+    MODEL_LOADING_MODES = ("eager", "lazy", "background")
+
     def __init__(self, config: Dict[str,str]) -> None:
-        self.outcomes_ner = TokenClassificationPipeline(
-            model = BertForTokenClassification.from_pretrained(config["outcome_extractor_path"]),
-            tokenizer = BertTokenizerFast.from_pretrained(config["outcome_extractor_path"]),
+        self.config = config
+        # models (and torch / transformers) are loaded at construction, at first use or in a background thread
+        self.model_loading = config.get("model_loading", "eager")
+        if self.model_loading not in self.MODEL_LOADING_MODES :
+            raise ValueError(f"model_loading must be one of {self.MODEL_LOADING_MODES}")
+        self._models = None
+        self._models_error = None
+        self._models_lock = threading.Lock()
+        self._models_done = threading.Event()
+        # embeddings of the inference backends differ slightly, each backend has its own cache
+        self.embedding_cache = EmbeddingCache(
+            f'{config["outcome_sim_path"]}:{config.get("inference_backend", "pytorch")}',
+            max_memory=int(config.get("embedding_cache_max_memory", 64*2**20)),
+            cache_dir=config.get("embedding_cache_dir"),
+        )
+        self.ner_batch_size = int(config.get("ner_batch_size", 8))
+        # long-lived clients sharing the same pooled session for all upstream requests
+        self.session = get_session(
+            pool_size=int(config.get("http_pool_size", 10)),
+            max_retries=int(config.get("http_max_retries", 3)),
+            backoff_factor=float(config.get("http_backoff_factor", 0.5)),
+        )
+        article_cache = DiskCache(
+            config["article_cache_dir"],
+            ttl=config.get("article_cache_ttl"),
+            max_size=config.get("article_cache_max_size"),
+        ) if config.get("article_cache_dir") else None
+        id_store = DiskCache(config["id_store_dir"]) if config.get("id_store_dir") else None
+        # all NCBI requests share the same rate limit, rate limited responses are retried by the scheduler
+        self.ncbi_scheduler = RequestScheduler(
+            rate=config.get("ncbi_request_rate"),
+            api_key=config.get("ncbi_api_key", ""),
+        )
+        ncbi_session = get_ncbi_session(
+            pool_size=int(config.get("http_pool_size", 10)),
+            max_retries=int(config.get("http_max_retries", 3)),
+            backoff_factor=float(config.get("http_backoff_factor", 0.5)),
+        )
+        self.article_downloader = IDDownloader(logging_mode='console', session=ncbi_session, cache=article_cache, 
+                                               id_store=id_store, scheduler=self.ncbi_scheduler)
+        # in concurrent mode, registry requests run in background threads while the article is processed
+        registry_workers = int(config.get("registry_workers", 4)) if config.get("concurrent_requests", False) else 0
+        registry_cache = DiskCache(
+            config["registry_cache_dir"],
+            max_size=config.get("registry_cache_max_size"),
+        ) if config.get("registry_cache_dir") else None
+        registry_backend = None
+        if config.get("registry_backend") == "snapshot" :
+            registry_backend = CTGOVSnapshotBackend(config["registry_snapshot_path"])
+        elif config.get("registry_backend") == "api_v2" :
+            registry_backend = CTGOVAPIv2Backend(self.session)
+        self.registry_extractor = CTGOVExtractor(
+            session=self.session, 
+            max_workers=3*registry_workers,
+            cache=registry_cache,
+            max_staleness=config.get("registry_cache_max_staleness"),
+            conditional_refresh=config.get("registry_cache_conditional_refresh", False),
+            backend=registry_backend,
+        )
+        # backends without outcomes history can only be compared with their current outcomes
+        default_date_type = "original" if self.registry_extractor.backend.has_original_outcomes else "current"
+        self.registry_date_type = config.get("registry_date_type", default_date_type)
+        self.executor = ThreadPoolExecutor(max_workers=registry_workers) if registry_workers > 0 else None
+        self.section_filter = SectionFilter()
+        # heavy fields kept in the results of batch detections (`detect_many`, `detect_xml_many`, `detect_local`)
+        self.result_options = {
+            "keep_xml": config.get("keep_article_xml", False),
+            "keep_sections": config.get("keep_text_sections", False),
+            "keep_o_entities": config.get("keep_o_entities", False),
+        }
+        # parsing and filtering of raw xml articles (offline runs) is fanned out to worker processes
+        self.article_processor = ParallelArticleProcessor(
+            max_workers=config.get("parse_workers"),
+            chunksize=int(config.get("parse_chunksize", 16)),
+        )
+        # attach the spans and counters of each `detect` request to its output
+        self.trace_requests = config.get("trace_requests", False)
+        if self.model_loading == "eager" :
+            self.load_models()
+        elif self.model_loading == "background" :
+            threading.Thread(target=self._load_models_in_background, name="model-loading", daemon=True).start()
+
+    def _load_models(self) -> Tuple["ChunkTokenClassificationPipeline", "OutcomeSimilarity"]:
+        # heavy imports (torch, transformers) are deferred until the models are loaded
+        from outcome_switch.article.extraction import ChunkTokenClassificationPipeline
+        from outcome_switch.outcome_comparison import OutcomeSimilarity
+        local_files_only = self.config.get("local_model_files", False)
+        # inference backend shared by both models : "pytorch", "quantized" (dynamic int8) or "onnx" (onnxruntime)
+        backend = self.config.get("inference_backend", "pytorch")
+        onnx_dir = self.config.get("onnx_dir", "cache/onnx")
+        outcomes_ner = ChunkTokenClassificationPipeline.from_pretrained(
+            self.config["outcome_extractor_path"],
+            local_files_only=local_files_only,
+            backend=backend,
+            onnx_dir=onnx_dir,
             ignore_labels = [],
             aggregation_strategy = "average",
             stride=64
         )
-        self.similarity_assessor = OutcomeSimilarity(config["outcome_sim_path"])
+        similarity_assessor = OutcomeSimilarity(
+            self.config["outcome_sim_path"], 
+            self.embedding_cache, 
+            batch_size=int(self.config.get("similarity_batch_size", 32)),
+            matching_strategy=self.config.get("matching_strategy", "greedy"),
+            matching_kwargs=self.config.get("matching_kwargs"),
+            local_files_only=local_files_only,
+            backend=backend,
+            onnx_dir=onnx_dir,
+        )
+        return outcomes_ner, similarity_assessor
+
+    def load_models(self) -> Tuple["ChunkTokenClassificationPipeline", "OutcomeSimilarity"]:
+        """Load the ner and similarity models if they are not loaded yet (waits for the loading in progress 
+        in another thread) and returns them"""
+        with self._models_lock :
+            if self._models is None :
+                with METRICS.span("model_loading"):
+                    self._models = self._load_models()
+                self._models_error = None
+                self._models_done.set()
+        return self._models
+
+    def _load_models_in_background(self) -> None:
+        try :
+            self.load_models()
+            logging.info("models loaded")
+        except Exception as e :
+            logging.exception("models could not be loaded")
+            self._models_error = e
+            self._models_done.set()
+
+    def is_ready(self) -> bool:
+        """True when the models are loaded (readiness signal, e.g. for health checks)"""
+        return self._models is not None
+
+    def wait_until_ready(self, timeout:Optional[float]=None) -> bool:
+        """Wait for the end of the models loading (started at construction in "background" mode), returns 
+        whether the models are loaded. Raises a RuntimeError if the background loading failed.
+
+        Args:
+            timeout (float, optional): maximum waiting time in seconds. Defaults to None (no limit).
+        """
+        if self.model_loading == "lazy" :
+            self.load_models()
+        self._models_done.wait(timeout)
+        if self._models is None and self._models_error is not None :
+            raise RuntimeError("models could not be loaded") from self._models_error
+        return self.is_ready()
+
+    @property
+    def outcomes_ner(self) -> "ChunkTokenClassificationPipeline":
+        return self.load_models()[0]
+
+    @property
+    def similarity_assessor(self) -> "OutcomeSimilarity":
+        return self.load_models()[1]
 
-    def detect_registry_outcomes(self, nct_id_or_text:str, date_type:str="original") -> Tuple[str, Dict[str, List[str]]] :
+    def detect_registry_outcomes(self, nct_id_or_text:str, date_type:str=None) -> Tuple[str, Dict[str, List[str]]] :
         """detect nct id in text (or directly from nct_id) and get outcomes from ctgov database using html parser
         returns a dict with retrieved information on outcomes and trial registration dates
         
         Args:
             nct_id_or_text (str): nct id or article text containing nct id
             date_type (str, optional): "original" or "current" , filter applied to outcomes to only take 
-            in account the ones we want to consider. Defaults to "original".
+            in account the ones we want to consider. Defaults to None (`registry_date_type` setting).
         """
-        cte = CTGOVExtractor()
-        detected_nct_id = cte.find_nct_id(nct_id_or_text)
+        date_type = date_type if date_type is not None else self.registry_date_type
+        detected_nct_id = self.registry_extractor.find_nct_id(nct_id_or_text)
         # get outcomes from ctgov database using S api
-        infos_dict = cte.get_all_infos(detected_nct_id)
+        with METRICS.span("registry"):
+            infos_dict = self.registry_extractor.get_all_infos(detected_nct_id)
         # outcomes_dict = cte.get_outcomes(detected_nct_id)
         # reformat and filter registry outcomes :
-        outcomes_lot = convert_registry_outcomes(infos_dict["full_registry_outcomes"], add_time_frame=False)
-        return {"detected_nct_id": detected_nct_id } | infos_dict | {"registry_outcomes": outcomes_lot}
+        outcomes_lot = convert_registry_outcomes(infos_dict["full_registry_outcomes"], date_type_filter=date_type, add_time_frame=False)
+        return {"detected_nct_id": detected_nct_id } | infos_dict | {"date_type": date_type, "registry_outcomes": outcomes_lot}
 
     def detect_article_outcomes(self, article_sections:Dict[str,List[str]], text_type:str) -> Dict[str, Any]:
         """filter outcome-related sections and detect outcomes in them
@@ -47,27 +216,55 @@ class OutcomeSwitchingDetector:
         - raw_entities : list of all entities detected in the article (output of huggingface token classifier)
         - article_outcomes : dict of all outcomes detected in the article key=type, value=list of outcomes
         """
-        section_filter = SectionFilter()
         # Filter outcome-related sections
-        filtered_output = section_filter.filter_sections(article_sections, text_type)
-        input_text = get_sections_text(filtered_output["filtered_sections"])
-        # get article outcomes (all pieces of text annotated)
-        entities_list = self.outcomes_ner(input_text)
-        # filter outcomes only
-        detected_outcomes =  filter_outcomes(entities_list)
-        return filtered_output | {"raw_entities" :entities_list, "article_outcomes" : detected_outcomes}
+        with METRICS.span("section_filter"):
+            filtered_output = self.section_filter.filter_sections(article_sections, text_type)
+        # same ner path (and metrics) as batch detections
+        return self.detect_filtered_articles_outcomes([filtered_output])[0]
+
+    def detect_many_articles_outcomes(self, articles:List[Tuple[Dict[str,List[str]],str]]) -> List[Dict[str, Any]]:
+        """Same as `detect_article_outcomes` for a list of (article_sections, text_type) tuples, 
+        windows of all articles are run through the ner model by batches of `ner_batch_size` windows"""
+        with METRICS.span("section_filter"):
+            filtered_outputs = [self.section_filter.filter_sections(sections, text_type) for sections, text_type in articles]
+        return self.detect_filtered_articles_outcomes(filtered_outputs)
+
+    def detect_filtered_articles_outcomes(self, filtered_outputs:List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Detect outcomes in articles whose sections are already filtered (outputs of `SectionFilter.filter_sections`), 
+        same outputs as `detect_many_articles_outcomes`"""
+        input_texts = [get_sections_text(f["filtered_sections"]) for f in filtered_outputs]
+        # only non empty texts are sent to the ner model
+        non_empty_indexes = [i for i, text in enumerate(input_texts) if text]
+        entities_lists = [[] for _ in input_texts]
+        if non_empty_indexes :
+            with METRICS.span("ner"):
+                ner_outputs = self.outcomes_ner.predict_many([input_texts[i] for i in non_empty_indexes], batch_size=self.ner_batch_size)
+            for i, entities_list in zip(non_empty_indexes, ner_outputs):
+                entities_lists[i] = entities_list
+        return [filtered_output | {"raw_entities" :entities_list, "article_outcomes" : filter_outcomes(entities_list)}
+                for filtered_output, entities_list in zip(filtered_outputs, entities_lists)]
 
     
     def compare_outcomes(self, registry_outcomes: List[Tuple[str,str]], article_outcomes: List[Tuple[str,str]]) -> Dict[str,Any]:   
         # get similarity
+        with METRICS.span("similarity"):
+            connections = self.similarity_assessor.get_similarity(registry_outcomes, article_outcomes)
         similarity_output = {
             "registry": registry_outcomes,
             "article": article_outcomes,
-            "connections" : self.similarity_assessor.get_similarity(registry_outcomes, article_outcomes)
+            "connections" : connections
         }
         return similarity_output
 
-    def detect(self, input_id:str) :
+    def compare_many_outcomes(self, outcomes_pairs: List[Tuple[List[Tuple[str,str]], List[Tuple[str,str]]]]) -> List[Dict[str,Any]]:
+        """Same as `compare_outcomes` for a list of (registry_outcomes, article_outcomes) pairs, 
+        all outcomes of all pairs are encoded in a single pass"""
+        with METRICS.span("similarity"):
+            connections = self.similarity_assessor.get_similarity_many(outcomes_pairs)
+        return [{"registry": registry_outcomes, "article": article_outcomes, "connections": pair_connections}
+                for (registry_outcomes, article_outcomes), pair_connections in zip(outcomes_pairs, connections)]
+
+    def detect(self, input_id:str, trace:bool=None) :
         """detect outcome switching in input id (pmid, pmcid or doi)
         returns a dictionary with the following keys:
         
@@ -95,15 +292,128 @@ class OutcomeSwitchingDetector:
         Similarity and Decision:
         - decision
         - outcomes_associations
+
+        Trace (only if `trace` is True, defaults to the `trace_requests` setting):
+        - trace : spans (stage, start and duration in seconds) and counters recorded while handling the request
         """
+        if trace is None :
+            trace = self.trace_requests
+        if not trace :
+            with METRICS.span("detect"):
+                return self._detect(input_id)
+        with METRICS.trace() as request_trace, METRICS.span("detect"):
+            output = self._detect(input_id)
+        return output | {"trace": request_trace.to_dict()}
+
+    def _detect(self, input_id:str) -> Dict[str, Any]:
         # get articles
-        self.article_downloader = IDDownloader(logging_mode='console')
-        download_responses = self.article_downloader.fetch_xml([input_id])
+        with METRICS.span("download"):
+            download_responses = self.article_downloader.fetch_xml([input_id])
         if download_responses :
             download_output = {"input_id" : input_id} |  download_responses[0]
         else :
-            download_output = {"input_id" : input_id, "retrieved_article_id":"", "article_xml_string": "", "text_type":""}
-        registry_output = self.detect_registry_outcomes(download_output["article_xml_string"]) 
-        article_output = self.detect_article_outcomes(download_output["text_sections"], download_output["text_type"] )
+            download_output = empty_download_output(input_id)
+        if self.executor is None :
+            registry_output = self.detect_registry_outcomes(download_output["article_xml_string"]) 
+            article_output = self.detect_article_outcomes(download_output["text_sections"], download_output["text_type"] )
+        else : # registry is downloaded while outcomes are detected in the article
+            registry_future = submit(self.executor, self.detect_registry_outcomes, download_output["article_xml_string"])
+            article_output = self.detect_article_outcomes(download_output["text_sections"], download_output["text_type"] )
+            registry_output = registry_future.result()
         comparison_output = self.compare_outcomes(registry_output["registry_outcomes"], article_output["article_outcomes"])
         return download_output | registry_output | article_output | comparison_output
+
+    def detect_many(self, input_ids:List[str], batch_size:int=200) -> Iterator[DetectionResult]:
+        """detect outcome switching in many input ids (pmid, pmcid or doi), yields one compact `DetectionResult`
+        (same information as `detect` output, heavy fields are only kept if set in the config) per input id, in input order.
+        `input_id` is the id as given, `normalized_id` its normalized form (e.g. "PMC" prefixed upper-cased pmcid).
+        
+        Input ids are processed by chunks of `batch_size` ids : id conversion and article download 
+        are made in chunks of 200 ids, registry information is retrieved once per distinct nct id of 
+        the chunk, and ner model is run on all articles of the chunk by batches of `ner_batch_size`.
+        
+        Args:
+            input_ids (List[str]): list of pmids, pmcids or dois
+            batch_size (int, optional): number of input ids processed at the same time. Defaults to 200.
+        """
+        for ids_batch in get_batchs(input_ids, batch_size):
+            # batch downloads give way to interactive requests (`detect`) sharing the same rate limit
+            with RequestScheduler.priority(BATCH), METRICS.span("download"):
+                download_responses = {input_id : self._compact_download_output(response) for input_id, response
+                                      in self.article_downloader.iter_fetch_xml_by_id(ids_batch)}
+            download_outputs = [{"input_id" : input_id} | download_responses[input_id] if input_id in download_responses
+                                else empty_download_output(input_id) for input_id in ids_batch]
+            yield from self._detect_downloaded(download_outputs)
+
+    def detect_xml_many(self, articles:Iterable[Tuple[Union[str,bytes],str]], batch_size:int=200, pmcids:Set[str]=None) -> Iterator[DetectionResult]:
+        """detect outcome switching in raw article xmls (offline runs, no article download), yields one 
+        `DetectionResult` (`input_id` is the retrieved article id) per article, in input order. Documents that 
+        could not be parsed have the "#<index of the document in the input>" `input_id` and their parse `error`.
+
+        Documents are split, parsed and filtered in worker processes (see `ParallelArticleProcessor`, configured by 
+        `parse_workers` and `parse_chunksize`) while the ner and similarity models run in the main process 
+        on chunks of `batch_size` articles.
+
+        Args:
+            articles (Iterable[Tuple[Union[str,bytes],str]]): iterable of (xml document, db) tuples, a document contains 
+                a single article or many articles (efetch response), db is "pmc" or "pubmed"
+            batch_size (int, optional): number of articles processed at the same time by the models. Defaults to 200.
+            pmcids (Set[str], optional): only process the PMC articles of these PMCIDs ("PMC" prefixed). Defaults to None (all articles).
+        """
+        processed_articles = self.article_processor.process(articles, pmcids)
+        while processed_batch := list(islice(processed_articles, batch_size)):
+            download_outputs, filtered_outputs = [], []
+            for download_output, filtered_output in processed_batch:
+                if filtered_output is None : # document could not be parsed
+                    download_outputs.append(empty_download_output(f'#{download_output["source_index"]}') | download_output)
+                    filtered_output = self.section_filter.filter_sections({}, "")
+                else :
+                    download_outputs.append({"input_id" : download_output["retrieved_article_id"]} | self._compact_download_output(download_output))
+                filtered_outputs.append(filtered_output)
+            yield from self._detect_downloaded(download_outputs, filtered_outputs)
+
+    def detect_local(self, path:str, db:str="pmc", pmcids:List[str]=None, batch_size:int=200) -> Iterator[DetectionResult]:
+        """detect outcome switching in local articles (e.g. mirror of the PMC Open Access bulk packages), 
+        `path` is a XML file, a directory tree or a `.tar.gz` package (read without extraction), see `LocalArticleReader`. 
+        Yields the same outputs as `detect_xml_many`.
+
+        Args:
+            path (str): path of the articles source
+            db (str, optional): database of the articles ("pmc" or "pubmed"). Defaults to "pmc".
+            pmcids (List[str], optional): only process these PMCIDs. Defaults to None (all articles).
+            batch_size (int, optional): number of articles processed at the same time by the models. Defaults to 200.
+        """
+        reader = LocalArticleReader(db, set(pmcids) if pmcids is not None else None)
+        yield from self.detect_xml_many(reader.iter_articles(path), batch_size, reader.pmcids)
+
+    def _compact_download_output(self, download_output:Dict[str, Any]) -> Dict[str, Any]:
+        """Look up the nct id of a downloaded article as soon as it is retrieved and drop its xml (unless 
+        `keep_article_xml` is set), so that a batch of articles does not keep all their xmls in memory"""
+        detected_nct_id = self.registry_extractor.find_nct_id(download_output["article_xml_string"])
+        if not self.result_options["keep_xml"] :
+            download_output = {key : value for key, value in download_output.items() if key != "article_xml_string"}
+        return download_output | {"detected_nct_id": detected_nct_id}
+
+    def _detect_downloaded(self, download_outputs:List[Dict[str, Any]], filtered_outputs:List[Dict[str, Any]]=None) -> Iterator[DetectionResult]:
+        """Run registry, article and comparison detection steps on already downloaded articles 
+        (and already filtered if `filtered_outputs` is given), yields compact results"""
+        if filtered_outputs is None :
+            with METRICS.span("section_filter"):
+                filtered_outputs = [self.section_filter.filter_sections(d["text_sections"], d["text_type"]) for d in download_outputs]
+        # registry information is retrieved only once per distinct nct id
+        nct_ids = [d["detected_nct_id"] if "detected_nct_id" in d else self.registry_extractor.find_nct_id(d["article_xml_string"])
+                   for d in download_outputs]
+        self.registry_extractor.prefetch(list(dict.fromkeys(nct_ids)))
+        if self.executor is None :
+            registry_outputs = {nct_id : self.detect_registry_outcomes(nct_id) for nct_id in dict.fromkeys(nct_ids)}
+            article_outputs = self.detect_filtered_articles_outcomes(filtered_outputs)
+        else : # registries are downloaded while outcomes are detected in the articles
+            registry_futures = {nct_id : submit(self.executor, self.detect_registry_outcomes, nct_id) for nct_id in dict.fromkeys(nct_ids)}
+            article_outputs = self.detect_filtered_articles_outcomes(filtered_outputs)
+            registry_outputs = {nct_id : future.result() for nct_id, future in registry_futures.items()}
+        comparison_outputs = self.compare_many_outcomes([(registry_outputs[nct_id]["registry_outcomes"], article_output["article_outcomes"])
+                                                         for nct_id, article_output in zip(nct_ids, article_outputs)])
+        for download_output, nct_id, article_output, comparison_output in zip(download_outputs, nct_ids, article_outputs, comparison_outputs):
+            output = download_output | registry_outputs[nct_id] | article_output | comparison_output
+            METRICS.increment("articles_processed")
+            yield DetectionResult.from_output(output, **self.result_options)
@@ -0,0 +1,77 @@
+import numpy as np
+from typing import Callable, Dict
+
+# a connection links a registry outcome (row of the score matrix) to an article outcome (column)
+CONNECTION_DTYPE = np.dtype([("registry", np.int64), ("article", np.int64), ("score", np.float64)])
+
+
+def get_connections(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Build a structured array of connections (registry index, article index, score)
+    sorted by registry index then article index"""
+    connections = np.empty(len(rows), dtype=CONNECTION_DTYPE)
+    connections["registry"] = rows
+    connections["article"] = cols
+    connections["score"] = scores[rows, cols]
+    return np.sort(connections, order=["registry", "article"])
+
+
+def greedy_bidirectional(scores: np.ndarray) -> np.ndarray:
+    """Connect each registry outcome to its most similar article outcome, then connect each article
+    outcome that is still not connected to its most similar registry outcome"""
+    rows = np.arange(scores.shape[0])
+    cols = scores.argmax(axis=1)
+    remaining_cols = np.setdiff1d(np.arange(scores.shape[1]), cols)
+    remaining_rows = scores[:, remaining_cols].argmax(axis=0)
+    return get_connections(np.concatenate([rows, remaining_rows]), np.concatenate([cols, remaining_cols]), scores)
+
+
+def thresholded_top_k(scores: np.ndarray, k: int = 1, threshold: float = 0.0) -> np.ndarray:
+    """Connect each registry outcome to its `k` most similar article outcomes whose score is
+    greater than or equal to `threshold` (many-to-many matching)"""
+    if k <= 0:
+        raise ValueError(f"k must be a positive number of connections per registry outcome, got {k}")
+    k = min(k, scores.shape[1])
+    top_cols = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_rows = np.repeat(np.arange(scores.shape[0]), k)
+    top_cols = top_cols.ravel()
+    kept = scores[top_rows, top_cols] >= threshold
+    return get_connections(top_rows[kept], top_cols[kept], scores)
+
+
+def optimal_assignment(scores: np.ndarray, threshold: float = -1.0) -> np.ndarray:
+    """One-to-one matching maximizing the sum of the scores of the connections (Hungarian algorithm),
+    connections whose score is lower than `threshold` are removed"""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError as e:
+        raise ImportError("scipy is required for the optimal assignment matching strategy") from e
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    kept = scores[rows, cols] >= threshold
+    return get_connections(rows[kept], cols[kept], scores)
+
+
+MATCHING_STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    "greedy": greedy_bidirectional,
+    "top_k": thresholded_top_k,
+    "hungarian": optimal_assignment,
+}
+
+
+def match(scores: np.ndarray, strategy: str = "greedy", **kwargs) -> np.ndarray:
+    """Match registry outcomes (rows) with article outcomes (columns) of a similarity score matrix
+
+    Args:
+        scores (np.ndarray): similarity scores matrix of shape (n_registry_outcomes, n_article_outcomes)
+        strategy (str, optional): matching strategy, one of "greedy" (bidirectional best match),
+            "top_k" (thresholded top-k) or "hungarian" (optimal one-to-one assignment). Defaults to "greedy".
+        **kwargs: parameters of the strategy (`k` and `threshold` for "top_k", `threshold` for "hungarian")
+
+    Returns:
+        np.ndarray: structured array of connections with fields "registry", "article" and "score"
+    """
+    if strategy not in MATCHING_STRATEGIES:
+        raise ValueError(f"strategy must be one of {', '.join(MATCHING_STRATEGIES)}")
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim != 2 or 0 in scores.shape:
+        return np.empty(0, dtype=CONNECTION_DTYPE)
+    return MATCHING_STRATEGIES[strategy](scores, **kwargs)
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Spans and counters recorded while handling a single request (see `Metrics.trace`)"""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append({"stage": name, "start": round(start - self.start, 6), "duration": round(duration, 6),
+                               "thread": threading.current_thread().name})
+
+    def increment(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"duration": round(time.perf_counter() - self.start, 6),
+                    "spans": sorted(self.spans, key=lambda span: span["start"]),
+                    "counters": dict(self.counters)}
+
+
+class Metrics:
+    """Thread-safe registry of stage latencies (histograms of the span durations) and counters (bytes downloaded,
+    tokens processed, cache hits...), exported in Prometheus text format or as json. Spans and counters are also
+    added to the trace of the current context if there is one."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, prefix: str = "outcome_switch") -> None:
+        self.prefix = prefix
+        self._stages = {} # stage name : {"count", "sum", "max", "buckets"}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a stage of the pipeline
+
+        ```python
+        with METRICS.span("ner"):
+            entities = ner_pipeline(text)
+        ```
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, start)
+
+    def observe(self, name: str, duration: float, start: Optional[float] = None) -> None:
+        """Record the duration (in seconds) of a stage"""
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(self.BUCKETS)}
+            stage["count"] += 1
+            stage["sum"] += duration
+            stage["max"] = max(stage["max"], duration)
+            bucket_index = bisect.bisect_left(self.BUCKETS, duration)
+            if bucket_index < len(self.BUCKETS):
+                stage["buckets"][bucket_index] += 1
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start if start is not None else time.perf_counter() - duration, duration)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.increment(name, value)
+
+    @contextmanager
+    def trace(self) -> Iterator[Trace]:
+        """Record the spans and counters of the enclosed block (and of the tasks submitted with `submit`) in a new trace"""
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the metrics, with mean and maximum duration of each stage"""
+        with self._lock:
+            stages = {name: {"count": stage["count"], "sum": round(stage["sum"], 6), "mean": round(stage["sum"] / stage["count"], 6),
+                             "max": round(stage["max"], 6)} for name, stage in self._stages.items()}
+            return {"timestamp": time.time(), "stages": stages, "counters": dict(self._counters)}
+
+    def write_json(self, path: str) -> None:
+        """Append a snapshot of the metrics to a JSON lines file"""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
+
+    def _metric_name(self, name: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{name}")
+
+    def to_prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format : one histogram of the stage durations and one counter per counter name"""
+        lines = []
+        with self._lock:
+            if self._stages:
+                name = self._metric_name("stage_duration_seconds")
+                lines += [f"# HELP {name} Duration of the pipeline stages", f"# TYPE {name} histogram"]
+                for stage_name, stage in sorted(self._stages.items()):
+                    cumulative_count = 0
+                    for upper_bound, bucket_count in zip(self.BUCKETS, stage["buckets"]):
+                        cumulative_count += bucket_count
+                        lines.append(f'{name}_bucket{{stage="{stage_name}",le="{upper_bound}"}} {cumulative_count}')
+                    lines.append(f'{name}_bucket{{stage="{stage_name}",le="+Inf"}} {stage["count"]}')
+                    lines.append(f'{name}_sum{{stage="{stage_name}"}} {stage["sum"]}')
+                    lines.append(f'{name}_count{{stage="{stage_name}"}} {stage["count"]}')
+            for counter_name, value in sorted(self._counters.items()):
+                name = self._metric_name(counter_name + "_total")
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Write the metrics in Prometheus text format (e.g. for the node exporter textfile collector)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        # atomic replacement, the file is never read half written
+        os.replace(tmp_path, path)
+
+
+# metrics of the process, shared by all the pipeline components
+METRICS = Metrics()
+
+
+def submit(executor: Executor, function: Callable, *args, **kwargs) -> Future:
+    """Submit a task to a thread pool in a copy of the current context, so that the spans and counters of
+    the task are added to the trace of the caller"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, function, *args, **kwargs)
@@ -1,17 +1,48 @@
 import torch
+import numpy as np
 import torch.nn.functional as F
-from sentence_transformers import util
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Dict, Any
 from transformers import AutoTokenizer, AutoModel
+from outcome_switch.cache import EmbeddingCache
+from outcome_switch.utils import get_batchs
+from outcome_switch.matching import match
+from outcome_switch.metrics import METRICS
+from outcome_switch.inference import apply_backend
 
 
 class OutcomeSimilarity:
     """ similarity detector between outcomes statements"""
     ID2LABEL = ["different", "similar"]
 
-    def __init__(self, model_path: str):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModel.from_pretrained(model_path)
+    def __init__(self, 
+                 model_path: str, 
+                 embedding_cache: Optional[EmbeddingCache] = None, 
+                 batch_size: int = 32,
+                 matching_strategy: str = "greedy",
+                 matching_kwargs: Optional[Dict[str, Any]] = None,
+                 local_files_only: bool = False,
+                 backend: str = "pytorch",
+                 onnx_dir: str = "cache/onnx"):
+        """
+        Args:
+            model_path (str): path or huggingface id of the sentence embedding model
+            embedding_cache (EmbeddingCache, optional): cache of the sentences embeddings, only 
+                sentences missing from the cache are encoded by the model. Defaults to None.
+            batch_size (int, optional): maximum number of sentences encoded by the model at once. Defaults to 32.
+            matching_strategy (str, optional): strategy used to connect registry and article outcomes 
+                (see `outcome_switch.matching.match`). Defaults to "greedy".
+            matching_kwargs (Dict[str, Any], optional): parameters of the matching strategy. Defaults to None.
+            local_files_only (bool, optional): only read local files (no request to the hub). Defaults to False.
+            backend (str, optional): inference backend of the model, "pytorch", "quantized" or "onnx" (see 
+                `outcome_switch.inference.apply_backend`). Defaults to "pytorch".
+            onnx_dir (str, optional): directory of the exported ONNX graphs. Defaults to "cache/onnx".
+        """
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=local_files_only)
+        self.model = apply_backend(AutoModel.from_pretrained(model_path, local_files_only=local_files_only), backend, onnx_dir)
+        self.embedding_cache = embedding_cache
+        self.batch_size = batch_size
+        self.matching_strategy = matching_strategy
+        self.matching_kwargs = matching_kwargs if matching_kwargs is not None else {}
 
     # Mean Pooling - Take attention mask into account for correct averaging
     def mean_pooling(self, model_output, attention_mask: torch.Tensor):
@@ -22,40 +53,98 @@ class OutcomeSimilarity:
         return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
 
     def encode(self, outcomes_lot: List[Tuple[str,str]]):
+        """Get normalized embeddings of the outcomes texts, using the embedding cache if there is one"""
         # Parse sentences
         sentences = []
         if len(outcomes_lot) > 0:
             _, sentences = zip(*outcomes_lot)
-        # Tokenize sentences
-        encoded_input = self.tokenizer(
-            sentences, padding=True, truncation=True, return_tensors='pt')
-        # Compute token embeddings
-        with torch.no_grad():
-            model_output = self.model(**encoded_input)
-        # Perform pooling
-        sentence_embeddings = self.mean_pooling(
-            model_output, encoded_input['attention_mask'])
+        if self.embedding_cache is None or not sentences:
+            return self.encode_sentences(sentences)
+        embeddings = [self.embedding_cache.get(sentence) for sentence in sentences]
+        # encode each missing sentence only once and merge them back in input order
+        missing_sentences = {EmbeddingCache.normalize(s): s for s, e in zip(sentences, embeddings) if e is None}
+        METRICS.increment("embedding_cache_misses", sum(e is None for e in embeddings))
+        METRICS.increment("embedding_cache_hits", sum(e is not None for e in embeddings))
+        if missing_sentences:
+            missing_embeddings = dict(zip(missing_sentences, self.encode_sentences(list(missing_sentences.values())).numpy()))
+            for key, embedding in missing_embeddings.items():
+                self.embedding_cache.set(missing_sentences[key], embedding)
+            embeddings = [e if e is not None else missing_embeddings[EmbeddingCache.normalize(s)] for s, e in zip(sentences, embeddings)]
+        return torch.from_numpy(np.stack(embeddings))
+
+    def encode_sentences(self, sentences: List[str]):
+        """Get normalized embeddings of the sentences with the model. Sentences are sorted by length 
+        and encoded by batches of at most `batch_size` sentences, so that each batch is only padded 
+        to the length of its longest sentence, embeddings are returned in input order"""
+        if len(sentences) == 0:
+            return torch.empty((0, self.model.config.hidden_size))
+        with METRICS.span("encode"):
+            return self._encode_sentences(sentences)
+
+    def _encode_sentences(self, sentences: List[str]):
+        # Tokenize sentences without padding to sort them by length
+        encoded_input = self.tokenizer(list(sentences), truncation=True)
+        lengths = [len(input_ids) for input_ids in encoded_input['input_ids']]
+        order = sorted(range(len(sentences)), key=lambda i: lengths[i])
+        batchs_embeddings = []
+        for batch_indexes in get_batchs(order, self.batch_size):
+            batch_input = self.tokenizer.pad(
+                {key: [values[i] for i in batch_indexes] for key, values in encoded_input.items()}, 
+                return_tensors='pt')
+            # Compute token embeddings
+            with torch.no_grad():
+                model_output = self.model(**batch_input)
+            # Perform pooling
+            batchs_embeddings.append(self.mean_pooling(model_output, batch_input['attention_mask']))
+        # Restore input order
+        sentence_embeddings = torch.cat(batchs_embeddings)[torch.argsort(torch.tensor(order))]
         # Normalize embeddings
         sentence_embeddings = F.normalize(sentence_embeddings, p=2, dim=1)
         return sentence_embeddings
 
-    def get_similarity(self, registry_outcomes:List[Tuple[str,str]], article_outcomes:List[Tuple[str,str]]) -> List[Tuple[int,int,float]]:
-        """For each outcome in true_dict, find the most similar outcome in compared_dict and return a mapping
-        of all matchs"""
-        if not registry_outcomes or not article_outcomes:
-            return []
-        connections = set()
-        rembs = self.encode(registry_outcomes)
-        aembs = self.encode(article_outcomes)
-        cosines_scores = util.cos_sim(rembs, aembs)
-        lines_max = torch.argmax(cosines_scores, dim=1)
-        col_max = torch.argmax(cosines_scores, dim=0)
-        remaining_cols = set(range(len(col_max)))
-        for i in range(len(lines_max)):
-            connection = (i, lines_max[i].item(), cosines_scores[i, lines_max[i]].item())
-            remaining_cols.discard(lines_max[i].item())
-            connections.add(connection)
-        for j in remaining_cols:
-            connection = (col_max[j].item(), j, cosines_scores[col_max[j], j].item())
-            connections.add(connection)
+    def get_similarity(self, 
+                       registry_outcomes:List[Tuple[str,str]], 
+                       article_outcomes:List[Tuple[str,str]], 
+                       scores:Optional[np.ndarray]=None,
+                       strategy:Optional[str]=None,
+                       **matching_kwargs) -> np.ndarray:
+        """Connect registry outcomes with their most similar article outcomes (according to the 
+        matching strategy) and return the connections as a structured array with fields "registry" 
+        (registry outcome index), "article" (article outcome index) and "score" (cosine similarity)
+
+        Args:
+            registry_outcomes (List[Tuple[str,str]]): list of (type, outcome) of the registry
+            article_outcomes (List[Tuple[str,str]]): list of (type, outcome) of the article
+            scores (np.ndarray, optional): precomputed cosine similarity matrix between registry (rows) and
+                article (columns) outcomes, outcomes are not encoded if given. Defaults to None.
+            strategy (str, optional): matching strategy, defaults to the strategy of the instance.
+            **matching_kwargs: parameters of the matching strategy, defaults to the ones of the instance.
+        """
+        if scores is None:
+            if not registry_outcomes or not article_outcomes:
+                return match(np.empty((0, 0)))
+            rembs = self.encode(registry_outcomes)
+            aembs = self.encode(article_outcomes)
+            # embeddings are normalized so their dot product is their cosine similarity
+            scores = (rembs @ aembs.T).numpy()
+        strategy = strategy if strategy is not None else self.matching_strategy
+        return match(scores, strategy, **(matching_kwargs or self.matching_kwargs))
+
+    def get_similarity_many(self, outcomes_pairs: List[Tuple[List[Tuple[str,str]], List[Tuple[str,str]]]]) -> List[np.ndarray]:
+        """Same as `get_similarity` for many (registry_outcomes, article_outcomes) pairs : all distinct 
+        sentences of all pairs are encoded in a single batched pass, then the similarity matrix of each 
+        pair is computed from the rows of the resulting embeddings matrix. Returns the connections 
+        of each pair in input order."""
+        sentences_index: Dict[str, int] = {}
+        for registry_outcomes, article_outcomes in outcomes_pairs:
+            for _, sentence in registry_outcomes + article_outcomes:
+                sentences_index.setdefault(sentence, len(sentences_index))
+        embeddings = self.encode([("", sentence) for sentence in sentences_index]).numpy()
+        connections = []
+        for registry_outcomes, article_outcomes in outcomes_pairs:
+            registry_rows = [sentences_index[sentence] for _, sentence in registry_outcomes]
+            article_rows = [sentences_index[sentence] for _, sentence in article_outcomes]
+            # embeddings are normalized so their dot product is their cosine similarity
+            scores = embeddings[registry_rows] @ embeddings[article_rows].T
+            connections.append(self.get_similarity(registry_outcomes, article_outcomes, scores=scores))
         return connections
@@ -0,0 +1,166 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+import contextvars
+import requests
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+from outcome_switch.session import get_session
+
+# priorities of the requests, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+_request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+class RequestScheduler:
+    """Token bucket scheduler shared by all the clients of an API (e.g. NCBI E-utilities, ID converter
+    and OAI-PMH service) so that their requests together respect the allowed request rate. Pending requests
+    are served by priority (interactive requests before batch requests) then in arrival order, rate limited
+    responses (429 / 503) are retried after their `Retry-After` delay (or an exponential backoff) and pause
+    all the clients of the scheduler.
+
+    NCBI allows 3 requests per second without api key and 10 requests per second with an api key.
+    The sessions used with a scheduler should not retry the `RETRY_STATUSES` themselves (see `get_ncbi_session`).
+    """
+
+    RETRY_STATUSES = (429, 503)
+
+    def __init__(self,
+                 rate:Optional[float]=None,
+                 api_key:str="",
+                 burst:float=1.0,
+                 max_retries:int=5,
+                 backoff_factor:float=1.0,
+                 max_backoff:float=60.0) -> None:
+        """
+        Args:
+            rate (float, optional): number of requests per second. Defaults to None (10 with an api key, 3 otherwise).
+            api_key (str, optional): NCBI api key, added to the E-utilities requests. Defaults to "".
+            burst (float, optional): number of requests that can be sent at once after an idle period. Defaults to 1.
+            max_retries (int, optional): number of retries of rate limited requests. Defaults to 5.
+            backoff_factor (float, optional): delay before the first retry when no `Retry-After` header is sent,
+                doubled at each retry. Defaults to 1.0.
+            max_backoff (float, optional): maximum delay between two retries. Defaults to 60.0.
+        """
+        self.api_key = api_key
+        self.rate = rate if rate is not None else (10.0 if api_key else 3.0)
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = [] # heap of (priority, arrival number) of the pending requests
+        self._arrivals = itertools.count()
+        self._condition = threading.Condition()
+
+    @staticmethod
+    @contextmanager
+    def priority(priority:int) -> Iterator[None]:
+        """Context manager setting the priority of the requests made in the current context
+
+        ```python
+        with RequestScheduler.priority(BATCH):
+            downloader.fetch_xml(ids)
+        ```
+        """
+        token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(token)
+
+    def add_api_key(self, params:Dict[str, Any]) -> Dict[str, Any]:
+        """Add the api key to the parameters of a request if there is one"""
+        return params | {"api_key": self.api_key} if self.api_key else params
+
+    def _refill(self, now:float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, cost:float=1.0, priority:Optional[int]=None) -> None:
+        """Wait until the request can be sent, requests costing more than one token (e.g. heavy requests
+        during busy hours) delay the following requests accordingly
+
+        Args:
+            cost (float, optional): number of tokens used by the request. Defaults to 1.0.
+            priority (int, optional): priority of the request. Defaults to None (priority of the current context).
+        """
+        waiter = (_request_priority.get() if priority is None else priority, next(self._arrivals))
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    required_tokens = min(cost, self.burst)
+                    if self._waiters[0] == waiter and now >= self._paused_until and self._tokens >= required_tokens:
+                        self._tokens -= cost
+                        return
+                    timeout = None # waiting requests are notified when the first one is sent
+                    if self._waiters[0] == waiter:
+                        timeout = max(self._paused_until - now, (required_tokens - self._tokens) / self.rate, 0)
+                    self._condition.wait(timeout)
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+
+    def pause(self, delay:float) -> None:
+        """Pause all the requests of the scheduler for `delay` seconds"""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._condition.notify_all()
+
+    def _get_retry_after(self, response:requests.Response) -> Optional[float]:
+        """Delay in seconds given by the `Retry-After` header (number of seconds or http date)"""
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return None
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, session:requests.Session, method:str, url:str, cost:float=1.0, priority:Optional[int]=None, **kwargs) -> requests.Response:
+        """Send a request through the scheduler, rate limited responses are retried up to `max_retries` times
+        and the last response is returned
+
+        Args:
+            session (requests.Session): session used to send the request
+            method (str): http method
+            url (str): url of the request
+            cost (float, optional): number of tokens used by the request. Defaults to 1.0.
+            priority (int, optional): priority of the request. Defaults to None (priority of the current context).
+            kwargs: parameters of `requests.Session.request`
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(cost, priority)
+            response = session.request(method, url, **kwargs)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = self._get_retry_after(response)
+            if delay is None:
+                delay = self.backoff_factor * 2 ** attempt
+            delay = min(delay, self.max_backoff)
+            logging.warning(f"{url} : status {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+            self.pause(delay)
+        return response
+
+
+def get_ncbi_session(**kwargs) -> requests.Session:
+    """Pooled session for rate limited clients, rate limit statuses are left to the `RequestScheduler`
+    (kwargs are passed to `get_session`)"""
+    retry_statuses = [status for status in (429, 500, 502, 503, 504) if status not in RequestScheduler.RETRY_STATUSES]
+    return get_session(retry_statuses=retry_statuses, **kwargs)
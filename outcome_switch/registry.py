@@ -1,10 +1,22 @@
 import bs4
+import os
 import re
+import json
+import logging
+import sqlite3
+import zipfile
 import requests
+from abc import ABC, abstractmethod
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unicodedata import normalize
-from typing import List, Dict, Union, Tuple, Any
+from typing import List, Dict, Union, Tuple, Any, Optional, Iterator
 from outcome_switch.data import Outcome
+from outcome_switch.session import get_session
+from outcome_switch.cache import DiskCache, LRUCache
+from outcome_switch.utils import get_batchs
+from outcome_switch.metrics import METRICS, submit
         
 # - look for nct id in the registration part if it exists
 class CTGOVAPILinker:
@@ -18,10 +30,14 @@ class CTGOVAPILinker:
                      "OtherOutcomeDescription", "OtherOutcomeMeasure", "OtherOutcomeTimeFrame"], 
         "dates": ["StartDate", "StartDateType","PrimaryCompletionDate", 
                   "PrimaryCompletionDateType","CompletionDate","StudyFirstPostDate",
-                  "StudyFirstPostDateType","StudyFirstSubmitDate","StudyFirstSubmitQCDate"],
+                  "StudyFirstPostDateType","StudyFirstSubmitDate","StudyFirstSubmitQCDate",
+                  "LastUpdatePostDate"],
         "references": ["ReferencePMID", "ReferenceCitation","ReferenceType"],
     }
 
+    def __init__(self, session:Optional[requests.Session]=None) :
+        self.session = session if session is not None else get_session()
+
     def get_study_fields(self, search_expression: str, study_fields: List[str], min_rank=1, max_rank=1000) -> List[Dict]:
         ret = []
         params = {
@@ -31,7 +47,9 @@ class CTGOVAPILinker:
             "min_rnk": min_rank,
             "max_rnk": max_rank,
         }
-        r = requests.get(self.CTGOV_API_URL + 'study_fields', params=params)
+        with METRICS.span("ctgov_api"):
+            r = self.session.get(self.CTGOV_API_URL + 'study_fields', params=params)
+        METRICS.increment("downloaded_bytes", len(r.content))
         data = r.json()['StudyFieldsResponse']
         if data["NStudiesFound"] != 0:
             ret = data["StudyFields"]
@@ -88,6 +106,9 @@ class CTGOVHTMLParser :
     ]
     URL = "https://classic.clinicaltrials.gov/ct2/show/record/{nct_id}"
 
+    def __init__(self, session:Optional[requests.Session]=None) :
+        self.session = session if session is not None else get_session()
+
     def filter_rows(self, tr_lines:bs4.ResultSet[bs4.element.Tag]) -> List[Tuple[str,bs4.element.Tag]]:
         """Find rows in html table that contains outcomes using useful_rows"""
         search_row_pile = self.useful_rows.copy()
@@ -103,7 +124,11 @@ class CTGOVHTMLParser :
         return filtered_rows
 
     def get_lines_soup(self, nct_id:str) -> bs4.ResultSet[bs4.element.Tag]:
-        return bs4.BeautifulSoup(requests.get(self.URL.format(nct_id=nct_id)).text, "lxml").find_all("tr") 
+        with METRICS.span("ctgov_html"):
+            response = self.session.get(self.URL.format(nct_id=nct_id))
+        METRICS.increment("downloaded_bytes", len(response.content))
+        with METRICS.span("ctgov_html_parsing"):
+            return bs4.BeautifulSoup(response.text, "lxml").find_all("tr") 
 
 
     def extract_outcome_lines(self, nct_id:str) -> Dict[str, List[Outcome]]:
@@ -155,12 +180,358 @@ class CTGOVHTMLParser :
         return outcome_text, outcome_description, time_frame
 
 
+class RegistryBackend(ABC) :
+    """Source of the registry records used by `CTGOVExtractor`, outputs use the formats of the classic
+    ctgov sources : outcomes are grouped by `CTGOVHTMLParser.useful_rows` titles and dates and references
+    use the field names of `CTGOVAPILinker.FIELDS`"""
+
+    # False if the backend only knows the current version of the outcomes (no "Original" outcomes)
+    has_original_outcomes = True
+
+    @abstractmethod
+    def extract_outcome_lines(self, nct_id:str) -> Dict[str, List[Outcome]]:
+        """Get the outcomes of the trial, keyed by `CTGOVHTMLParser.useful_rows` titles"""
+
+    @abstractmethod
+    def get_outcome_related_informations(self, nct_id:str) -> Dict[str, Any]:
+        """Get the dates and references of the trial (empty dict if the trial is not found)"""
+
+    def get_last_update(self, nct_id:str) -> Optional[List[str]]:
+        """Get the last update post date of the trial record (None if the trial is not found)"""
+        return self.get_outcome_related_informations(nct_id).get("LastUpdatePostDate")
+
+    def prefetch(self, nct_ids:List[str]) -> None:
+        """Retrieve the records of many trials at once ahead of their lookups, if the backend supports it"""
+        pass
+
+
+class CTGOVClassicBackend(RegistryBackend) :
+    """Backend using the legacy ctgov api (dates and references) and the classic html record (outcomes)"""
+
+    def __init__(self, session:Optional[requests.Session]=None, max_workers:int=0) :
+        """
+        Args:
+            session (requests.Session, optional): session shared by the api linker and the html parser. Defaults to None.
+            max_workers (int, optional): if greater than 0, dates and references are requested concurrently. Defaults to 0.
+        """
+        # api linker and html parser share the same session (and so the same connection pool)
+        self.session = session if session is not None else get_session()
+        self.api_linker = CTGOVAPILinker(self.session)
+        self.html_parser = CTGOVHTMLParser(self.session)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 0 else None
+
+    def extract_outcome_lines(self, nct_id:str) -> Dict[str, List[Outcome]]:
+        return self.html_parser.extract_outcome_lines(nct_id)
+
+    def get_outcome_related_informations(self, nct_id:str) -> Dict[str, Any]:
+        if self.executor is None :
+            return self.api_linker.get_outcome_related_informations(nct_id)
+        dates_future = submit(self.executor, self.api_linker.get_fields, nct_id, "dates")
+        references_future = submit(self.executor, self.api_linker.get_fields, nct_id, "references")
+        return dict(dates_future.result(), **references_future.result())
+
+    def get_last_update(self, nct_id:str) -> Optional[List[str]]:
+        last_update = self.api_linker.get_study_fields(nct_id, ["LastUpdatePostDate"])
+        return last_update[0]["LastUpdatePostDate"] if last_update else None
+
+
+class CTGOVV2Backend(RegistryBackend) :
+    """Base of the backends reading ClinicalTrials.gov API v2 study records (see `test/examples/ctgov_example_apiv2.json`),
+    records are mapped to the classic formats. API v2 records only contain the current version of the outcomes,
+    the "Original" outcome rows are always empty (use the "current" date type to compare them with the article)."""
+
+    has_original_outcomes = False
+
+    # fields of the study records used by the mapping
+    FIELDS = [
+        "protocolSection.identificationModule.nctId",
+        "protocolSection.statusModule",
+        "protocolSection.outcomesModule",
+        "protocolSection.referencesModule.references",
+    ]
+    OUTCOME_ROWS = {
+        "primaryOutcomes": ("primary", "Current Primary Outcome Measures"),
+        "secondaryOutcomes": ("secondary", "Current Secondary Outcome Measures"),
+        "otherOutcomes": ("other", "Current Other Pre-specified Outcome Measures "),
+    }
+    # classic api field name : path in the status module
+    DATE_FIELDS = {
+        "StartDate": ("startDateStruct", "date"),
+        "StartDateType": ("startDateStruct", "type"),
+        "PrimaryCompletionDate": ("primaryCompletionDateStruct", "date"),
+        "PrimaryCompletionDateType": ("primaryCompletionDateStruct", "type"),
+        "CompletionDate": ("completionDateStruct", "date"),
+        "StudyFirstPostDate": ("studyFirstPostDateStruct", "date"),
+        "StudyFirstPostDateType": ("studyFirstPostDateStruct", "type"),
+        "StudyFirstSubmitDate": ("studyFirstSubmitDate",),
+        "StudyFirstSubmitQCDate": ("studyFirstSubmitQcDate",),
+        "LastUpdatePostDate": ("lastUpdatePostDateStruct", "date"),
+    }
+    REFERENCE_FIELDS = {"ReferencePMID": "pmid", "ReferenceCitation": "citation", "ReferenceType": "type"}
+
+    @abstractmethod
+    def get_study(self, nct_id:str) -> Optional[Dict[str, Any]]:
+        """Get the API v2 record of the trial (None if not found)"""
+
+    @staticmethod
+    def get_nct_id(study:Dict[str, Any]) -> str:
+        return study["protocolSection"]["identificationModule"]["nctId"]
+
+    @classmethod
+    def prune_study(cls, study:Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the `FIELDS` of a study record"""
+        pruned = {}
+        for field in cls.FIELDS:
+            *path, key = field.split(".")
+            source, target = study, pruned
+            for module in path:
+                source = source.get(module, {})
+                target = target.setdefault(module, {})
+            if key in source:
+                target[key] = source[key]
+        return pruned
+
+    def extract_outcome_lines(self, nct_id:str) -> Dict[str, List[Outcome]]:
+        outcomes: Dict[str, List[Outcome]] = {key:[] for key in CTGOVHTMLParser.useful_rows}
+        study = self.get_study(nct_id) if nct_id else None
+        if study is None :
+            return outcomes
+        outcomes_module = study["protocolSection"].get("outcomesModule", {})
+        for v2_key, (outcome_type, title) in self.OUTCOME_ROWS.items():
+            for outcome in outcomes_module.get(v2_key, []):
+                outcomes[title].append(Outcome(
+                    normalize("NFKD", outcome.get("measure", "")).strip(),
+                    outcome_type,
+                    "current",
+                    None,
+                    normalize("NFKD", outcome.get("description", "")).strip(),
+                    normalize("NFKD", outcome.get("timeFrame", "")).strip(),
+                ))
+        return outcomes
+
+    def get_outcome_related_informations(self, nct_id:str) -> Dict[str, Any]:
+        study = self.get_study(nct_id) if nct_id else None
+        if study is None :
+            return {}
+        status_module = study["protocolSection"].get("statusModule", {})
+        infos = {}
+        for field, path in self.DATE_FIELDS.items():
+            value = status_module
+            for key in path:
+                value = value.get(key, {}) if isinstance(value, dict) else {}
+            infos[field] = [value] if value and isinstance(value, str) else []
+        references = study["protocolSection"].get("referencesModule", {}).get("references", [])
+        for field, key in self.REFERENCE_FIELDS.items():
+            infos[field] = [str(reference.get(key, "")) for reference in references]
+        return infos
+
+
+class CTGOVAPIv2Backend(CTGOVV2Backend) :
+    """Backend using the ClinicalTrials.gov API v2 : only the `FIELDS` of the study records are requested
+    (json, no html scraping) and many trials are retrieved in a single request with `prefetch`. Retrieved
+    records are kept in memory, trials not found are remembered too."""
+
+    API_URL = "https://clinicaltrials.gov/api/v2/studies"
+
+    _MISSING = object()
+
+    def __init__(self, session:Optional[requests.Session]=None, batch_size:int=100, cache_size:int=10000, api_url:str=API_URL) :
+        """
+        Args:
+            session (requests.Session, optional): session used for the requests. Defaults to None.
+            batch_size (int, optional): maximum number of trials requested at once. Defaults to 100.
+            cache_size (int, optional): number of study records kept in memory. Defaults to 10000.
+            api_url (str, optional): url of the studies endpoint. Defaults to API_URL.
+        """
+        self.session = session if session is not None else get_session()
+        self.batch_size = batch_size
+        self.cache = LRUCache(maxsize=cache_size)
+        self.api_url = api_url
+
+    def get_studies(self, nct_ids:List[str], fields:List[str]=None) -> Dict[str, Dict[str, Any]]:
+        """Request the records of many trials (by batches of `batch_size` ids), returns the found records keyed by nct id
+
+        Args:
+            nct_ids (List[str]): nct ids of the trials
+            fields (List[str], optional): fields of the records to request. Defaults to None (`FIELDS`).
+
+        Raises:
+            requests.HTTPError: if the api does not answer a request successfully (the trials of the batch
+                may exist, they must not be considered not found)
+        """
+        studies = {}
+        for ids_batch in get_batchs(list(dict.fromkeys(nct_ids)), self.batch_size):
+            params = {
+                "filter.ids": ",".join(ids_batch),
+                "fields": ",".join(fields if fields is not None else self.FIELDS),
+                "pageSize": len(ids_batch),
+                "format": "json",
+            }
+            while True :
+                with METRICS.span("ctgov_api_v2"):
+                    response = self.session.get(self.api_url, params=params)
+                METRICS.increment("downloaded_bytes", len(response.content))
+                if response.status_code != 200 :
+                    logging.error(f"ctgov api v2 error {response.status_code} for {ids_batch} : {response.text}")
+                    raise requests.HTTPError(f"ctgov api v2 error {response.status_code}", response=response)
+                data = response.json()
+                for study in data.get("studies", []):
+                    studies[self.get_nct_id(study)] = study
+                if not data.get("nextPageToken") :
+                    break
+                params["pageToken"] = data["nextPageToken"]
+        return studies
+
+    def prefetch(self, nct_ids:List[str]) -> None:
+        missing_ids = [nct_id for nct_id in dict.fromkeys(nct_ids) if nct_id and self.cache.get(nct_id, self._MISSING) is self._MISSING]
+        for ids_batch in get_batchs(missing_ids, self.batch_size):
+            try :
+                studies = self.get_studies(ids_batch)
+            except requests.RequestException :
+                continue # already logged, the trials of the batch are requested again by `get_study`
+            # trials absent from a successful answer are remembered as not found
+            for nct_id in ids_batch:
+                self.cache.set(nct_id, studies.get(nct_id))
+
+    def get_study(self, nct_id:str) -> Optional[Dict[str, Any]]:
+        study = self.cache.get(nct_id, self._MISSING)
+        if study is self._MISSING :
+            study = self.get_studies([nct_id]).get(nct_id)
+            self.cache.set(nct_id, study)
+        return study
+
+    def get_last_update(self, nct_id:str) -> Optional[List[str]]:
+        # always requested (used to check the freshness of cached registry infos)
+        studies = self.get_studies([nct_id], ["protocolSection.identificationModule.nctId", "protocolSection.statusModule.lastUpdatePostDateStruct"])
+        if nct_id not in studies :
+            return None
+        last_update = studies[nct_id]["protocolSection"].get("statusModule", {}).get("lastUpdatePostDateStruct", {}).get("date")
+        return [last_update] if last_update else []
+
+
+class CTGOVSnapshotBackend(CTGOVV2Backend) :
+    """Offline backend reading a local snapshot of ClinicalTrials.gov : API v2 study records (bulk download
+    or api responses) are loaded once in a sqlite store keyed by nct id, lookups are then local reads.
+
+    ```python
+    backend = CTGOVSnapshotBackend("cache/ctgov.sqlite")
+    backend.load_dump("ctg-studies.json.zip")
+    ```
+    """
+
+    def __init__(self, db_path:str) :
+        """
+        Args:
+            db_path (str): path of the sqlite store (created if it does not exist)
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # the connection is shared by the registry threads, queries are serialized by a lock
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = Lock()
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS studies (nct_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM studies").fetchone()[0]
+
+    def get_study(self, nct_id:str) -> Optional[Dict[str, Any]]:
+        with METRICS.span("registry_snapshot"), self.lock:
+            row = self.connection.execute("SELECT record FROM studies WHERE nct_id = ?", (nct_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_studies(self, studies:List[Dict[str, Any]]) -> None:
+        """Add (or replace) API v2 study records in the store, only the `FIELDS` of the records are stored"""
+        rows = [(self.get_nct_id(study), json.dumps(self.prune_study(study))) for study in studies]
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO studies VALUES (?, ?)", rows)
+
+    def load_dump(self, dump_path:str, batch_size:int=1000) -> int:
+        """Load a bulk dump of API v2 study records in the store and returns the number of loaded records.
+        The dump can be a json file (single study, list of studies or api response with a "studies" list),
+        a jsonl file (one study per line), a zip archive of such files (ClinicalTrials.gov bulk download) 
+        or a directory tree of such files.
+        """
+        n_studies, batch = 0, []
+        for study in self._iter_dump_studies(dump_path):
+            batch.append(study)
+            if len(batch) >= batch_size:
+                self.add_studies(batch)
+                n_studies, batch = n_studies + len(batch), []
+        self.add_studies(batch)
+        return n_studies + len(batch)
+
+    def _iter_dump_studies(self, dump_path:str) -> Iterator[Dict[str, Any]]:
+        if os.path.isdir(dump_path):
+            for dirpath, dirnames, filenames in os.walk(dump_path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield from self._iter_dump_studies(os.path.join(dirpath, filename))
+        elif dump_path.endswith(".zip"):
+            with zipfile.ZipFile(dump_path) as archive:
+                for name in archive.namelist():
+                    if name.endswith((".json", ".jsonl")):
+                        with archive.open(name) as f:
+                            yield from self._iter_file_studies(f.read().decode("utf-8"), name)
+        elif dump_path.endswith((".json", ".jsonl")):
+            with open(dump_path, "r", encoding="utf-8") as f:
+                yield from self._iter_file_studies(f.read(), dump_path)
+
+    def _iter_file_studies(self, content:str, name:str) -> Iterator[Dict[str, Any]]:
+        if name.endswith(".jsonl"):
+            studies = [json.loads(line) for line in content.splitlines() if line.strip()]
+        else:
+            studies = json.loads(content)
+            if isinstance(studies, dict):
+                studies = studies["studies"] if "studies" in studies else [studies]
+        for study in studies:
+            if "protocolSection" in study:
+                yield study
+
+
 class CTGOVExtractor : 
 
-    def __init__(self) :
-        self.api_linker = CTGOVAPILinker()
-        self.html_parser = CTGOVHTMLParser()
+    def __init__(self, 
+                 session:Optional[requests.Session]=None, 
+                 max_workers:int=0, 
+                 cache:Optional[DiskCache]=None, 
+                 max_staleness:Optional[float]=None, 
+                 conditional_refresh:bool=False,
+                 backend:Optional[RegistryBackend]=None) :
+        """Extractor of registry information from ctgov database
+
+        Args:
+            session (requests.Session, optional): session of the default backend (shared by the api linker 
+                and the html parser), a new pooled session is created if not given. Defaults to None.
+            max_workers (int, optional): if greater than 0, the independent requests of `get_all_infos` 
+                (api dates, api references and html record) are run concurrently in a thread pool of 
+                `max_workers` threads. Defaults to 0 (sequential requests).
+            cache (DiskCache, optional): cache of `get_all_infos` outputs keyed by nct id. Defaults to None.
+            max_staleness (float, optional): age in seconds after which a cached entry is considered stale 
+                and retrieved again. Defaults to None (cached entries are never stale).
+            conditional_refresh (bool, optional): if True, a stale entry is only retrieved again if the 
+                last update date of the registry record changed since it was cached (a single api request 
+                is made otherwise). Defaults to False.
+            backend (RegistryBackend, optional): source of the registry records. Defaults to None 
+                (`CTGOVClassicBackend`, legacy api and classic html record).
+        """
+        self.cache = cache
+        self.max_staleness = max_staleness
+        self.conditional_refresh = conditional_refresh
+        self.backend = backend if backend is not None else CTGOVClassicBackend(session, max_workers=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 0 else None
     
+    def prefetch(self, nct_ids: List[str]) -> None:
+        """Retrieve the registry records of many trials at once (if the backend supports it) ahead of 
+        `get_all_infos` calls, trials with a fresh cached entry are skipped"""
+        if self.cache is not None :
+            nct_ids = [nct_id for nct_id in nct_ids if self._is_stale(self.cache.get_entry(nct_id))]
+        self.backend.prefetch([nct_id for nct_id in nct_ids if nct_id])
+
+    def _is_stale(self, entry: Optional[Tuple[Any, float]]) -> bool:
+        return entry is None or (self.max_staleness is not None and entry[1] > self.max_staleness)
+
     # TODO : first search in XML for registration title part and then search in whole text if not found
     def find_nct_id(self, text: str) -> Union[str,None]:
         """Finds the first NCT ID mentioned in the text and returns it,
@@ -173,17 +544,57 @@ class CTGOVExtractor :
         return ret
     
     def get_all_infos(self, nct_id: str):
-        api_info = self.api_linker.get_outcome_related_informations(nct_id)
-        return dict(api_info, **self.get_outcomes(nct_id))
+        """Get registry information of the trial (dates, references and outcomes from the registry 
+        backend), from the cache if it contains a fresh entry for the nct id"""
+        if self.cache is None or not nct_id :
+            return self._get_all_infos(nct_id)
+        entry = self.cache.get_entry(nct_id)
+        METRICS.increment("registry_cache_hits" if entry is not None and not self._is_stale(entry) else "registry_cache_misses")
+        if entry is not None :
+            cached_infos, age = entry
+            if not self._is_stale(entry) :
+                return self._from_cache(cached_infos)
+            if self.conditional_refresh and not self._is_updated(nct_id, cached_infos) :
+                self.cache.set(nct_id, cached_infos) # renew the entry age
+                return self._from_cache(cached_infos)
+        infos = self._get_all_infos(nct_id)
+        self.cache.set(nct_id, self._to_cache(infos))
+        return infos
+
+    def _is_updated(self, nct_id: str, cached_infos: Dict[str, Any]) -> bool:
+        """Check if the registry record was updated since the cached infos were retrieved"""
+        last_update = self.backend.get_last_update(nct_id)
+        return last_update is None or last_update != cached_infos.get("LastUpdatePostDate")
+
+    def _to_cache(self, infos: Dict[str, Any]) -> Dict[str, Any]:
+        full_registry_outcomes = {title: [o.to_json() for o in outcomes] for title, outcomes in infos["full_registry_outcomes"].items()}
+        return infos | {"full_registry_outcomes": full_registry_outcomes}
+
+    def _from_cache(self, cached_infos: Dict[str, Any]) -> Dict[str, Any]:
+        full_registry_outcomes = {title: [Outcome.from_json(o) for o in outcomes] for title, outcomes in cached_infos["full_registry_outcomes"].items()}
+        return cached_infos | {"full_registry_outcomes": full_registry_outcomes}
+
+    def _get_all_infos(self, nct_id: str):
+        if self.executor is None :
+            api_info = self.backend.get_outcome_related_informations(nct_id)
+            outcomes = self.get_outcomes(nct_id)
+        else : # the requests do not depend on each other
+            api_info_future = submit(self.executor, self.backend.get_outcome_related_informations, nct_id)
+            outcomes_future = submit(self.executor, self.get_outcomes, nct_id)
+            api_info = api_info_future.result()
+            outcomes = outcomes_future.result()
+        return dict(api_info, **outcomes)
     
     def get_outcomes(self, nct_id: str, date_type:str="original") -> List[str]:
-        outcomes_dict = self.html_parser.extract_outcome_lines(nct_id)
+        outcomes_dict = self.backend.extract_outcome_lines(nct_id)
         modifs = self.is_current_original_modif(outcomes_dict)
         return {"date_type":date_type, "primary_current-original_modif": modifs, "full_registry_outcomes": outcomes_dict}
     
     def is_current_original_modif(self, outcomes: Dict[str,List[Outcome]]) -> str:
         """Check if there is a switch between original and current primary outcomes"""
-        current, original = outcomes[self.html_parser.useful_rows[0]], outcomes[self.html_parser.useful_rows[1]]
+        if not self.backend.has_original_outcomes :
+            return ""
+        current, original = outcomes[CTGOVHTMLParser.useful_rows[0]], outcomes[CTGOVHTMLParser.useful_rows[1]]
         ret = ""
         if len(current) > len(original):
             ret += "added_primary_outcomes"
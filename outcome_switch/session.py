@@ -0,0 +1,35 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Sequence
+
+
+def get_session(pool_size:int=10, max_retries:int=3, backoff_factor:float=0.5, 
+                retry_statuses:Sequence[int]=(429, 500, 502, 503, 504)) -> requests.Session:
+    """Create a `requests.Session` keeping connections alive (so that successive requests to the same
+    host reuse the same TCP+TLS connection) and retrying failed requests with exponential backoff.
+    A single session is meant to be shared by all downloaders and registry extractors.
+
+    Args:
+        pool_size (int, optional): maximum number of connections kept alive per host. Defaults to 10.
+        max_retries (int, optional): number of retries on connection errors and 429/5xx responses. Defaults to 3.
+        backoff_factor (float, optional): backoff factor between retries, sleeps for
+            `backoff_factor * 2 ** (retry_number - 1)` seconds. Defaults to 0.5.
+        retry_statuses (Sequence[int], optional): response statuses retried by the session, rate limit statuses
+            should be left to the `RequestScheduler` of rate limited clients. Defaults to (429, 500, 502, 503, 504).
+
+    Returns:
+        requests.Session: session with pooled http and https adapters
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=list(retry_statuses),
+        allowed_methods=["GET", "POST"], # efetch POST requests are idempotent
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
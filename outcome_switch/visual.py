@@ -1,5 +1,6 @@
 import plotly.graph_objects as go
 from typing import List, Dict, Any, Tuple, Union
+from outcome_switch.metrics import METRICS
 
 # gradio highlitghted text
 def get_highlighted_text(entities:List[Dict[str,Any]], original_text:str) -> List[Tuple[str,Union[str,None]]] :
@@ -80,6 +81,11 @@ def format_display(true,compared,connections, raw_entities):
 
 
 def get_sankey_diagram(detection_output: Dict[str, Any]):
+    with METRICS.span("sankey"):
+        return _get_sankey_diagram(detection_output)
+
+
+def _get_sankey_diagram(detection_output: Dict[str, Any]):
     labels, colors, sources, targets, values, connection_colors = format_data(detection_output["registry"],detection_output["article"],detection_output["connections"])
     node_customdata, node_hovertemplate, link_customdata, link_hovertemplate = format_display(detection_output["registry"],detection_output["article"],detection_output["connections"], detection_output["raw_entities"])
     sankey =  go.Sankey(node=dict(
@@ -0,0 +1,44 @@
+import io
+import sys
+import json
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.parse import ResponseParser
+
+EXAMPLE_DIR = Path(__file__).parent / "examples" / "NCT01623843_PMC6206648"
+
+
+class ResponseParserTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = ResponseParser()
+        article_xml = (EXAMPLE_DIR / "raw.xml").read_text()
+        # efetch response with two articles
+        cls.response_xml = ('<?xml version="1.0" encoding="UTF-8"?>\n<pmc-articleset>' + article_xml
+                            + article_xml.replace("6206648", "1111111") + '</pmc-articleset>')
+        with open(EXAMPLE_DIR / "parsed.json", "r") as f:
+            cls.parsed = json.load(f)
+
+    def test_parse_multiple_response(self):
+        articles = self.parser.parse_multiple_response(self.response_xml, "pmc")
+        self.assertEqual([a["retrieved_article_id"] for a in articles], ["PMC6206648", "PMC1111111"])
+        self.assertEqual(articles[0]["text_type"], self.parsed["text_type"])
+        self.assertEqual(articles[0]["text_sections"], self.parsed["text_sections"])
+        self.assertTrue(articles[0]["article_xml_string"].startswith("<article"))
+
+    def test_iter_parse_response(self):
+        articles = self.parser.iter_parse_response(io.BytesIO(self.response_xml.encode("utf-8")), "pmc")
+        first_article = next(articles)
+        self.assertEqual(first_article["retrieved_article_id"], "PMC6206648")
+        self.assertEqual(first_article["text_sections"], self.parsed["text_sections"])
+        self.assertEqual(first_article["article_xml_string"], "") # xml is not kept by default
+        self.assertEqual(next(articles)["retrieved_article_id"], "PMC1111111")
+        self.assertIsNone(next(articles, None))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,110 @@
+import sys
+import json
+import tempfile
+import unittest
+import numpy as np
+from os.path import join
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.batch import BatchRunner, CheckpointIndex, get_shard, serialize_output
+from outcome_switch.data import Outcome
+from outcome_switch.matching import match
+
+
+class FakeDetector:
+    """Detector returning fixed outputs (same types as `OutcomeSwitchingDetector.detect_many` outputs),
+    fails before any output on chunks with an id containing "fail", fails when it reaches an id containing
+    "crash", and records the processed ids"""
+
+    def __init__(self):
+        self.processed_ids = []
+        self.calls = []
+
+    def detect_many(self, input_ids, batch_size=200):
+        self.calls.append(list(input_ids))
+        if any("fail" in input_id for input_id in input_ids):
+            raise RuntimeError("detection failed")
+        for input_id in input_ids:
+            if "crash" in input_id:
+                raise RuntimeError("detection crashed")
+            self.processed_ids.append(input_id)
+            yield {
+                "input_id": input_id,
+                "article_xml_string": "<article/>",
+                "raw_entities": [{"entity_group": "PrimaryOutcome", "score": np.float32(0.9), "word": "pain"}],
+                "full_registry_outcomes": {"Original Primary Outcome Measures": [Outcome("pain", "primary", "original")]},
+                "registry_outcomes": [("primary", "pain")],
+                "connections": match(np.array([[0.8]])),
+            }
+
+
+class BatchRunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = join(self.tmp_dir.name, "results.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_output(self):
+        with open(self.output_path, "r") as f:
+            return [json.loads(line) for line in f]
+
+    def test_serialize_output(self):
+        output = json.loads(serialize_output(next(FakeDetector().detect_many(["PMC1"]))))
+        self.assertNotIn("article_xml_string", output)
+        self.assertEqual(output["connections"], [[0, 0, 0.8]])
+        self.assertEqual(output["full_registry_outcomes"]["Original Primary Outcome Measures"][0]["text"], "pain")
+
+    def test_resume(self):
+        ids = [f"PMC{i}" for i in range(10)]
+        detector = FakeDetector()
+        counts = BatchRunner(detector, self.output_path, batch_size=3).run(ids[:5])
+        self.assertEqual(counts, {"completed": 5, "failed": 0})
+        # restarted run only processes the remaining ids
+        BatchRunner(detector, self.output_path, batch_size=3).run(ids)
+        self.assertEqual(detector.processed_ids, ids)
+        self.assertEqual([output["input_id"] for output in self.read_output()], ids)
+
+    def test_failed(self):
+        ids = ["PMC1", "PMC2", "fail", "PMC3"]
+        detector = FakeDetector()
+        runner = BatchRunner(detector, self.output_path, batch_size=2)
+        self.assertEqual(runner.run(ids), {"completed": 3, "failed": 1})
+        # ids of a failed chunk are retried one at a time, only the failing id is marked as failed
+        self.assertEqual(detector.calls[1:], [["fail", "PMC3"], ["fail"], ["PMC3"]])
+        self.assertEqual(runner.index.get_status("PMC3"), CheckpointIndex.COMPLETED)
+        self.assertEqual(runner.index.get_status("fail"), CheckpointIndex.FAILED)
+        self.assertEqual([output["input_id"] for output in self.read_output()], ["PMC1", "PMC2", "PMC3"])
+        # failed ids are skipped unless retry_failed is set
+        self.assertEqual(runner.get_remaining(ids), [])
+        self.assertEqual(BatchRunner(detector, self.output_path, retry_failed=True).get_remaining(ids), ["fail"])
+
+    def test_partial_results_kept(self):
+        ids = ["PMC1", "PMC2", "crash", "PMC3"]
+        detector = FakeDetector()
+        runner = BatchRunner(detector, self.output_path, batch_size=4)
+        self.assertEqual(runner.run(ids), {"completed": 3, "failed": 1})
+        # results yielded before the failure are not computed again
+        self.assertEqual(detector.calls, [ids, ["crash"], ["PMC3"]])
+        self.assertEqual([output["input_id"] for output in self.read_output()], ["PMC1", "PMC2", "PMC3"])
+
+    def test_get_remaining_chunks(self):
+        ids = [f"PMC{i}" for i in range(1200)]
+        runner = BatchRunner(FakeDetector(), self.output_path)
+        runner.index.mark(ids[::2], CheckpointIndex.COMPLETED)
+        self.assertEqual(runner.get_remaining(ids + ids[:3]), ids[1::2])
+
+    def test_shards(self):
+        ids = [f"PMC{i}" for i in range(100)]
+        shards = [BatchRunner(FakeDetector(), self.output_path, shard=i, num_shards=3).get_remaining(ids) for i in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(ids))
+        self.assertTrue(all(shards))
+        self.assertEqual(get_shard("PMC1", 3), get_shard("PMC1 ", 3))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
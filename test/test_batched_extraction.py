@@ -0,0 +1,49 @@
+import sys
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.extraction import ChunkTokenClassificationPipeline
+from test.tiny_model import save_tiny_token_classifier
+
+WORDS = ["the", "primary", "outcome", "was", "pain", "at", "12", "months", "secondary", "outcomes",
+         "were", "hip", "function", "quality", "of", "life", ".", ",", "measured", "by", "vas", "score"]
+
+
+class BatchedExtractionTests(unittest.TestCase):
+    """Compare batched multi-document extraction with the standard pipeline on a tiny random model"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        save_tiny_token_classifier(cls.tmp_dir.name, WORDS, model_max_length=32, hidden_size=16, num_hidden_layers=1,
+                                   num_attention_heads=2, intermediate_size=32, max_position_embeddings=64)
+        cls.pipeline = ChunkTokenClassificationPipeline.from_pretrained(
+            cls.tmp_dir.name, ignore_labels=[], aggregation_strategy="average", stride=8)
+        random.seed(0)
+        # texts longer than the model max length are split in several windows
+        cls.texts = [" ".join(random.choice(WORDS) for _ in range(n)) for n in [5, 40, 100, 3, 70]]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_same_entities_as_pipeline(self):
+        batched_entities = self.pipeline.predict_many(self.texts, batch_size=3)
+        self.assertEqual(len(batched_entities), len(self.texts))
+        for text, entities in zip(self.texts, batched_entities):
+            expected_entities = self.pipeline(text)
+            self.assertEqual([(e["entity_group"], e["start"], e["end"]) for e in entities],
+                             [(e["entity_group"], e["start"], e["end"]) for e in expected_entities])
+            for entity, expected_entity in zip(entities, expected_entities):
+                self.assertAlmostEqual(float(entity["score"]), float(expected_entity["score"]), places=5)
+
+    def test_empty(self):
+        self.assertEqual(self.pipeline.predict_many([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
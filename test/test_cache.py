@@ -0,0 +1,163 @@
+import sys
+import time
+import tempfile
+import unittest
+import multiprocessing
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.cache import DiskCache, EmbeddingCache
+from outcome_switch.data import Outcome
+from outcome_switch.registry import CTGOVExtractor
+
+
+class CountingExtractor(CTGOVExtractor):
+    """Extractor returning fixed registry infos and counting the (simulated) registry requests"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.n_requests = 0
+
+    def _get_all_infos(self, nct_id):
+        self.n_requests += 1
+        outcome = Outcome("pain", "primary", "original", None, "", "12 months")
+        return {"LastUpdatePostDate": ["June 1, 2020"], "full_registry_outcomes": {"Original Primary Outcome Measures": [outcome]}}
+
+
+class DiskCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_set_and_get(self):
+        cache = DiskCache(self.cache_dir)
+        value = {"retrieved_article_id": "PMC6206648", "text_sections": {"Title": ["title"]}}
+        cache.set("PMC6206648", value)
+        self.assertEqual(cache.get("PMC6206648"), value)
+        self.assertIsNone(cache.get("PMC0000000"))
+
+    def test_persistence(self):
+        DiskCache(self.cache_dir).set("PMC6206648", ["value"])
+        self.assertEqual(DiskCache(self.cache_dir).get("PMC6206648"), ["value"])
+
+    def test_ttl(self):
+        cache = DiskCache(self.cache_dir, ttl=0.05)
+        cache.set("PMC6206648", "value")
+        self.assertEqual(cache.get("PMC6206648"), "value")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("PMC6206648"))
+        self.assertIsNone(cache.get_entry("PMC6206648"))
+
+    def test_lru_eviction(self):
+        cache = DiskCache(self.cache_dir, max_size=350)
+        for i in range(3):
+            cache.set(f"key{i}", "x" * 50)
+            time.sleep(0.01)
+        cache.get("key0") # key1 is now the least recently used key
+        time.sleep(0.01)
+        cache.set("key3", "x" * 50)
+        self.assertIn("key0", cache)
+        self.assertNotIn("key1", cache)
+        self.assertIn("key3", cache)
+        self.assertLessEqual(cache._size, 350)
+
+    def test_eviction_low_water_mark(self):
+        cache = DiskCache(self.cache_dir, max_size=10000)
+        scans = []
+        iter_files = cache._iter_files
+        cache._iter_files = lambda: scans.append(1) or iter_files()
+        for i in range(300):
+            cache.set(f"key{i:03d}", "x" * 50)
+        # entries of ~100 bytes : the cache is full after ~100 writes, each eviction frees ~10 entries
+        # so the directory is scanned every ~10 writes (instead of at each of the ~200 next writes)
+        self.assertLess(len(scans), 30)
+        self.assertLessEqual(cache._size, 10000)
+
+
+class RegistryCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cached_infos(self):
+        extractor = CountingExtractor(cache=self.cache)
+        infos = extractor.get_all_infos("NCT01623843")
+        cached_infos = extractor.get_all_infos("NCT01623843")
+        self.assertEqual(extractor.n_requests, 1)
+        outcome = cached_infos["full_registry_outcomes"]["Original Primary Outcome Measures"][0]
+        self.assertIsInstance(outcome, Outcome)
+        self.assertEqual(outcome.compare(infos["full_registry_outcomes"]["Original Primary Outcome Measures"][0]), "same")
+
+    def test_stale_infos(self):
+        extractor = CountingExtractor(cache=self.cache, max_staleness=0)
+        extractor.get_all_infos("NCT01623843")
+        time.sleep(0.01)
+        extractor.get_all_infos("NCT01623843")
+        self.assertEqual(extractor.n_requests, 2)
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalized_key(self):
+        cache = EmbeddingCache("model")
+        embedding = np.arange(4, dtype=np.float32)
+        cache.set("overall  survival ", embedding)
+        np.testing.assert_array_equal(cache.get("overall survival"), embedding)
+        self.assertIsNone(cache.get("adverse events"))
+
+    def test_memory_bound(self):
+        cache = EmbeddingCache("model", max_memory=32)
+        cache.set("a", np.zeros(4, dtype=np.float32))
+        cache.set("b", np.zeros(4, dtype=np.float32))
+        cache.set("c", np.zeros(4, dtype=np.float32))
+        self.assertIsNone(cache.get("a"))
+        self.assertLessEqual(cache.memory.size, 32)
+
+    def test_disk_tier(self):
+        embeddings = np.random.rand(3, 8).astype(np.float32)
+        cache = EmbeddingCache("model", max_memory=0, cache_dir=self.tmp_dir.name)
+        for i, embedding in enumerate(embeddings):
+            cache.set(f"outcome {i}", embedding)
+        reloaded_cache = EmbeddingCache("model", cache_dir=self.tmp_dir.name)
+        for i, embedding in enumerate(embeddings):
+            np.testing.assert_array_equal(reloaded_cache.get(f"outcome {i}"), embedding)
+        self.assertIsNone(EmbeddingCache("other model", cache_dir=self.tmp_dir.name).get("outcome 0"))
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "fork start method is not available")
+    def test_disk_tier_concurrent_writers(self):
+        processes = [multiprocessing.get_context("fork").Process(target=write_embeddings, args=(self.tmp_dir.name, worker))
+                     for worker in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        cache = EmbeddingCache("model", max_memory=0, cache_dir=self.tmp_dir.name)
+        for worker in range(4):
+            for i in range(50):
+                np.testing.assert_array_equal(cache.get(f"outcome {worker} {i}"), np.full(8, worker * 100 + i, dtype=np.float32))
+
+
+def write_embeddings(cache_dir, worker):
+    """Writer process of the concurrent writers test, embeddings are derived from their sentence"""
+    cache = EmbeddingCache("model", max_memory=0, cache_dir=cache_dir)
+    for i in range(50):
+        cache.set(f"outcome {worker} {i}", np.full(8, worker * 100 + i, dtype=np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+import sys
+import json
+import unittest
+import importlib.util
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.data import DetectionResult, Outcome
+from outcome_switch.matching import match
+
+
+class DetectionResultTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.output = {
+            "input_id": "PMC6206648",
+            "retrieved_article_id": "PMC6206648",
+            "article_xml_string": "<article>...</article>",
+            "db": "pmc",
+            "text_type": "fulltext",
+            "text_sections": {"Title": ["title"], "Methods - Outcomes": ["The primary outcome was pain."]},
+            "filtered_sections": {"Methods - Outcomes": ["The primary outcome was pain."]},
+            "regex_priority_index": 1,
+            "regex_priority_name": "strict_prim_sec",
+            "check_type": "title",
+            "raw_entities": [
+                {"entity_group": "O", "score": np.float32(0.99), "word": "the primary outcome was", "start": 0, "end": 23},
+                {"entity_group": "PrimaryOutcome", "score": np.float32(0.9), "word": "pain", "start": 24, "end": 28},
+            ],
+            "article_outcomes": [("primary", "pain")],
+            "detected_nct_id": "NCT01623843",
+            "date_type": "original",
+            "primary_current-original_modif": "same",
+            "full_registry_outcomes": {"Original Primary Outcome Measures": [Outcome("pain", "primary", "original", None, "", "12 months")]},
+            "registry_outcomes": [("primary", "pain")],
+            "registry": [("primary", "pain")],
+            "article": [("primary", "pain")],
+            "connections": match(np.array([[0.75]])),
+        }
+
+    def test_compact_result(self):
+        result = DetectionResult.from_output(self.output)
+        self.assertIsNone(result.article_xml_string)
+        self.assertIsNone(result.o_entities)
+        self.assertEqual([e["word"] for e in result.entities], ["pain"])
+        self.assertIsInstance(result.entities[0]["score"], float)
+        self.assertEqual(result.connections, [(0, 0, 0.75)])
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertNotIn("article_xml_string", json.loads(result.to_json()))
+
+    def test_heavy_fields(self):
+        result = DetectionResult.from_output(self.output, keep_xml=True, keep_sections=True, keep_o_entities=True)
+        self.assertEqual(result.article_xml_string, self.output["article_xml_string"])
+        self.assertEqual(result.text_sections, self.output["text_sections"])
+        self.assertEqual([e["entity_group"] for e in result.o_entities], ["O"])
+
+    def test_json_round_trip(self):
+        result = DetectionResult.from_output(self.output, keep_o_entities=True)
+        loaded = DetectionResult.from_json(result.to_json())
+        self.assertEqual(loaded.to_dict(), result.to_dict())
+        self.assertIsInstance(loaded.full_registry_outcomes["Original Primary Outcome Measures"][0], Outcome)
+        self.assertEqual(loaded.article_outcomes, [("primary", "pain")])
+
+    @unittest.skipUnless(importlib.util.find_spec("msgpack"), "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        result = DetectionResult.from_output(self.output)
+        self.assertEqual(DetectionResult.from_msgpack(result.to_msgpack()).to_dict(), result.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
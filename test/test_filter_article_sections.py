@@ -24,5 +24,31 @@ class SectionFilterTests(unittest.TestCase):
         self.assertEqual(filter_output["regex_priority_name"], "strict_method_and_prim_sec")
         self.assertEqual(filter_output["check_type"], "title")
 
+    def test_filter_example(self):
+        example_dir = Path(__file__).parent / "examples" / "NCT01623843_PMC6206648"
+        with open(example_dir / "parsed.json", 'r') as f:
+            sections_dict = json.load(f)["text_sections"]
+        with open(example_dir / "filtered_sections.json", 'r') as f:
+            filtered_sections = json.load(f)
+        filter_output = self.filter.filter_sections(sections_dict, "fulltext")
+        self.assertEqual(filter_output["filtered_sections"], filtered_sections)
+        self.assertEqual(filter_output["regex_priority_index"], 0)
+        # without method titles, the highest priority match is a title with primary/secondary outcomes
+        sections_dict = {title.replace("Methods - ", ""): content for title, content in sections_dict.items()}
+        filter_output = self.filter.filter_sections(sections_dict, "fulltext")
+        self.assertEqual(filter_output["regex_priority_name"], "strict_prim_sec")
+        self.assertEqual(list(filter_output["filtered_sections"]), [
+            "Outcomes - Primary outcome", 
+            "Outcomes - Secondary outcomes",
+            "Discussion - Analysis plan - Primary outcome analysis",
+            "Discussion - Analysis plan - Secondary outcomes analysis",
+        ])
+
+    def test_filter_abstract(self):
+        sections_dict = {"Abstract - Background": ["text"]}
+        filter_output = self.filter.filter_sections(sections_dict, "abstract")
+        self.assertEqual(filter_output["filtered_sections"], sections_dict)
+        self.assertIsNone(filter_output["regex_priority_index"])
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import sys
+import json
+import unittest
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.download import IDConverter, IDDownloader
+from outcome_switch.ratelimit import RequestScheduler
+
+RECORDS = {
+    "PMC6206648": {"pmcid": "PMC6206648", "pmid": "30373659", "doi": "10.1186/s13063-018-2965-0"},
+    "PMC30373659": {"pmcid": "PMC30373659", "pmid": "11111111", "doi": "10.1000/other"},
+}
+
+
+class StubIDConverterHandler(BaseHTTPRequestHandler):
+    """Answers the known pmcids (with or without "PMC" prefix, case insensitive) in reverse order and drops the unknown ones"""
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.server.requests.append(params)
+        requested_ids = params["ids"][0].split(",")
+        pmcids = {id: id.upper() if id.upper().startswith("PMC") else "PMC" + id for id in requested_ids}
+        records = [{"requested-id": id} | RECORDS[pmcids[id]] for id in reversed(requested_ids) if pmcids[id] in RECORDS]
+        body = json.dumps({"status": "ok", "responseDate": "", "records": records}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IDConverterTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubIDConverterHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.converter = IDConverter(idtype="pmcid", logging_mode="none", scheduler=RequestScheduler(rate=1000))
+        self.converter.ID_CONVERTER_URL = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def test_records_matched_by_requested_id(self):
+        records = self.converter.convert(["PMC99999999", "PMC6206648", "PMC30373659"])
+        self.assertEqual([record.get("pmid") for record in records], [None, "30373659", "11111111"])
+        self.assertEqual([record["requested-id"] for record in records], ["PMC99999999", "PMC6206648", "PMC30373659"])
+
+    def test_cache_keys(self):
+        self.converter.convert(["6206648"])
+        # cached under the pmid as is (not "PMC" + pmid, which is another article), the pmcid and the doi
+        self.assertIsNone(self.converter.cache.get("PMC30373659"))
+        self.assertEqual(self.converter.cache.get("30373659")["pmcid"], "PMC6206648")
+        self.assertEqual(self.converter.cache.get("10.1186/s13063-018-2965-0")["pmcid"], "PMC6206648")
+        self.assertEqual(self.converter.convert(["PMC30373659"])[0]["pmid"], "11111111")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_fetch_xml_by_id_keeps_input_ids(self):
+        downloader = IDDownloader(logging_mode="none", scheduler=self.converter.scheduler)
+        downloader.id_converter = self.converter
+        # articles are not downloaded, their responses only contain their id
+        downloader._iter_fetch_articles = lambda article_ids, save_dir="": ({"retrieved_article_id": id} for id in article_ids)
+        responses = downloader.fetch_xml_by_id(["pmc6206648", "PMC99999999", "PMC6206648"])
+        self.assertEqual(list(responses), ["pmc6206648", "PMC6206648"])
+        self.assertEqual(responses["pmc6206648"], {"retrieved_article_id": "PMC6206648", "normalized_id": "PMC6206648"})
+
+    def test_articles_fetched_lazily(self):
+        downloader = IDDownloader(logging_mode="none", scheduler=self.converter.scheduler)
+        parsed = []
+        def iter_fetch_xml(ids, db="pmc", save_dir="", keep_xml=True):
+            for id in ids:
+                parsed.append(id)
+                yield {"retrieved_article_id": id, "article_xml_string": f"<article>{id}</article>"}
+        downloader.entrez_downloader.iter_fetch_xml = iter_fetch_xml
+        responses = downloader._iter_fetch_articles(["PMC1", "PMC2", "3"])
+        # each article is yielded as soon as it is parsed, before the next one of the response is read
+        self.assertEqual(next(responses)["retrieved_article_id"], "3")
+        self.assertEqual(next(responses)["retrieved_article_id"], "PMC1")
+        self.assertEqual(parsed, ["3", "PMC1"])
+        self.assertEqual(next(responses)["retrieved_article_id"], "PMC2")
+
+
+if __name__ == "__main__":
+    unittest.main()
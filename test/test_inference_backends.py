@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+import torch
+from transformers import BertForTokenClassification, BertTokenizerFast
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.inference import apply_backend, get_onnx_path
+from outcome_switch.article.extraction import ChunkTokenClassificationPipeline
+from test.tiny_model import save_tiny_token_classifier
+
+WORDS = ["the", "primary", "secondary", "outcome", "was", "pain", "at", "12", "months", "hip", "function", "score", ".", ","]
+TEXT = "the primary outcome was pain at 12 months . the secondary outcome was hip function score ."
+
+
+class InferenceBackendsTests(unittest.TestCase):
+    """Backends are compared with the fp32 pytorch model on a small randomly initialized BERT token classifier"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.model_path = os.path.join(cls.tmp_dir.name, "model")
+        os.makedirs(cls.model_path)
+        save_tiny_token_classifier(cls.model_path, WORDS, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                                   intermediate_size=64, max_position_embeddings=128)
+        cls.tokenizer = BertTokenizerFast.from_pretrained(cls.model_path)
+        cls.inputs = cls.tokenizer([TEXT, "pain at 12 months"], return_tensors="pt", padding=True)
+        with torch.no_grad():
+            cls.reference_logits = cls.load_model()(**cls.inputs)[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    @classmethod
+    def load_model(cls):
+        return BertForTokenClassification.from_pretrained(cls.model_path)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            apply_backend(self.load_model(), "tensorrt")
+
+    def test_quantized(self):
+        model = apply_backend(self.load_model(), "quantized")
+        self.assertIsInstance(model.classifier, torch.ao.nn.quantized.dynamic.Linear)
+        with torch.no_grad():
+            logits = model(**self.inputs)[0]
+        self.assertTrue(torch.allclose(logits, self.reference_logits, atol=0.05))
+
+    def test_onnx_path_depends_on_weights(self):
+        model_path = os.path.join(self.tmp_dir.name, "retrained")
+        model = self.load_model()
+        model.save_pretrained(model_path)
+        onnx_path = get_onnx_path(BertForTokenClassification.from_pretrained(model_path), "onnx")
+        self.assertEqual(get_onnx_path(BertForTokenClassification.from_pretrained(model_path), "onnx"), onnx_path)
+        # checkpoint saved again in place
+        with torch.no_grad():
+            model.classifier.bias += 1.0
+        model.save_pretrained(model_path)
+        self.assertNotEqual(get_onnx_path(BertForTokenClassification.from_pretrained(model_path), "onnx"), onnx_path)
+        # models without checkpoint files are keyed by their weights
+        in_memory_model = BertForTokenClassification(model.config)
+        in_memory_model.config.name_or_path = ""
+        in_memory_onnx_path = get_onnx_path(in_memory_model, "onnx")
+        self.assertEqual(get_onnx_path(in_memory_model, "onnx"), in_memory_onnx_path)
+        with torch.no_grad():
+            in_memory_model.classifier.bias += 1.0
+        self.assertNotEqual(get_onnx_path(in_memory_model, "onnx"), in_memory_onnx_path)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "onnxruntime is not installed")
+    def test_onnx(self):
+        onnx_dir = os.path.join(self.tmp_dir.name, "onnx")
+        model = apply_backend(self.load_model(), "onnx", onnx_dir)
+        onnx_path = get_onnx_path(model, onnx_dir)
+        self.assertTrue(os.path.exists(onnx_path))
+        # torch weights are released once the graph is loaded
+        self.assertEqual(sum(parameter.numel() for parameter in model.parameters()), 0)
+        logits = model(**self.inputs)[0]
+        self.assertTrue(torch.allclose(logits, self.reference_logits, atol=1e-4))
+        # longer inputs than the export inputs (dynamic axes), token type ids are optional
+        long_inputs = self.tokenizer([TEXT * 3], return_tensors="pt", return_token_type_ids=False)
+        with torch.no_grad():
+            reference_long_logits = self.load_model()(**long_inputs)[0]
+        self.assertTrue(torch.allclose(model(**long_inputs)[0], reference_long_logits, atol=1e-4))
+        # the graph is exported only once
+        export_time = os.path.getmtime(onnx_path)
+        apply_backend(self.load_model(), "onnx", onnx_dir)
+        self.assertEqual(os.path.getmtime(onnx_path), export_time)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "onnxruntime is not installed")
+    def test_onnx_pipeline(self):
+        kwargs = {"ignore_labels": [], "aggregation_strategy": "average", "stride": 4}
+        tokenizer = BertTokenizerFast.from_pretrained(self.model_path, model_max_length=16)
+        reference = ChunkTokenClassificationPipeline(model=self.load_model(), tokenizer=tokenizer, **kwargs)
+        onnx_model = apply_backend(self.load_model(), "onnx", os.path.join(self.tmp_dir.name, "onnx"))
+        pipeline = ChunkTokenClassificationPipeline(model=onnx_model, tokenizer=tokenizer, **kwargs)
+        reference_entities, entities = reference.predict_many([TEXT])[0], pipeline.predict_many([TEXT])[0]
+        self.assertEqual([(e["entity_group"], e["start"], e["end"]) for e in entities],
+                         [(e["entity_group"], e["start"], e["end"]) for e in reference_entities])
+        self.assertEqual([e["entity_group"] for e in pipeline(TEXT)], [e["entity_group"] for e in reference(TEXT)])
+
+
+if __name__ == "__main__":
+    unittest.main()
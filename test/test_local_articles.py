@@ -0,0 +1,67 @@
+import io
+import sys
+import tarfile
+import tempfile
+import unittest
+from os.path import join
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.local import LocalArticleReader
+from outcome_switch.article.parallel import ParallelArticleProcessor
+
+EXAMPLE_DIR = Path(__file__).parent / "examples" / "NCT01623843_PMC6206648"
+
+
+class LocalArticleReaderTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        article_xml = (EXAMPLE_DIR / "raw.xml").read_text()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        # Open Access package : one article per file, ids with and without "PMC" prefix
+        cls.files = {
+            "PMC000xxxxxx/PMC0000001.xml": article_xml.replace("6206648", "0000001"),
+            "PMC000xxxxxx/PMC0000002.nxml": article_xml.replace(">6206648<", ">PMC0000002<"),
+            "Journal/article_3.nxml": article_xml.replace("6206648", "0000003"),
+            "Journal/broken.xml": "<article><body>",
+            "README.txt": "not an article",
+        }
+        with tarfile.open(join(cls.tmp_dir.name, "oa_package.tar.gz"), "w:gz") as tar:
+            for name, content in cls.files.items():
+                data = content.encode("utf-8")
+                member = tarfile.TarInfo(name)
+                member.size = len(data)
+                tar.addfile(member, io.BytesIO(data))
+        for name, content in cls.files.items():
+            Path(cls.tmp_dir.name, "mirror", name).parent.mkdir(parents=True, exist_ok=True)
+            Path(cls.tmp_dir.name, "mirror", name).write_text(content)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def get_ids(self, path, pmcids=None):
+        reader = LocalArticleReader("pmc", pmcids)
+        outputs = ParallelArticleProcessor(max_workers=0).process(reader.iter_articles(path), reader.pmcids)
+        return [download_output.get("retrieved_article_id", "error") for download_output, _ in outputs]
+
+    def test_tar_package(self):
+        self.assertEqual(self.get_ids(join(self.tmp_dir.name, "oa_package.tar.gz")), ["PMC0000001", "PMC0000002", "PMC0000003", "error"])
+
+    def test_directory(self):
+        self.assertEqual(self.get_ids(join(self.tmp_dir.name, "mirror")), ["PMC0000003", "error", "PMC0000001", "PMC0000002"])
+
+    def test_raw_files(self):
+        # files are yielded unchanged, without parsing
+        articles = list(LocalArticleReader("pmc").iter_articles(join(self.tmp_dir.name, "oa_package.tar.gz")))
+        self.assertEqual([xml for xml, _ in articles], [self.files[name].encode("utf-8") for name in list(self.files)[:4]])
+
+    def test_pmcids_filter(self):
+        # members named after another PMCID are skipped by name, the other files are filtered on their article id
+        self.assertEqual(self.get_ids(join(self.tmp_dir.name, "oa_package.tar.gz"), {"pmc0000002"}), ["PMC0000002", "error"])
+        self.assertEqual(self.get_ids(join(self.tmp_dir.name, "oa_package.tar.gz"), {"pmc0000002", "0000003"}), ["PMC0000002", "PMC0000003", "error"])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,59 @@
+import sys
+import unittest
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.matching import match
+
+
+def legacy_greedy_matching(scores):
+    """Python loop implementation of the greedy bidirectional matching"""
+    connections = set()
+    lines_max, col_max = scores.argmax(axis=1), scores.argmax(axis=0)
+    remaining_cols = set(range(len(col_max)))
+    for i in range(len(lines_max)):
+        connections.add((i, int(lines_max[i]), float(scores[i, lines_max[i]])))
+        remaining_cols.discard(int(lines_max[i]))
+    for j in remaining_cols:
+        connections.add((int(col_max[j]), j, float(scores[col_max[j], j])))
+    return connections
+
+
+class MatchingTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_greedy_same_as_legacy(self):
+        for shape in [(1, 1), (3, 8), (8, 3), (10, 10)]:
+            scores = self.rng.uniform(-1, 1, size=shape)
+            connections = match(scores, "greedy")
+            self.assertEqual({(int(i), int(j), float(s)) for i, j, s in connections}, legacy_greedy_matching(scores))
+
+    def test_top_k(self):
+        scores = np.array([[0.9, 0.5, 0.1], [0.2, 0.3, 0.8]])
+        connections = match(scores, "top_k", k=2, threshold=0.4)
+        self.assertEqual([(i, j) for i, j, _ in connections], [(0, 0), (0, 1), (1, 2)])
+        with self.assertRaises(ValueError):
+            match(scores, "top_k", k=0)
+
+    def test_hungarian(self):
+        scores = np.array([[0.9, 0.8], [0.85, 0.1]])
+        connections = match(scores, "hungarian")
+        self.assertEqual([(i, j) for i, j, _ in connections], [(0, 1), (1, 0)])
+        self.assertAlmostEqual(connections["score"].sum(), 1.65)
+
+    def test_empty(self):
+        self.assertEqual(len(match(np.empty((0, 3)))), 0)
+        self.assertEqual(len(match(np.empty((3, 0)), "hungarian")), 0)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            match(np.ones((2, 2)), "unknown")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+import sys
+import json
+import time
+import tempfile
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.metrics import Metrics, submit
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_spans_and_counters(self):
+        for _ in range(3):
+            with self.metrics.span("ner"):
+                time.sleep(0.01)
+        self.metrics.increment("ner_tokens", 128)
+        self.metrics.increment("ner_tokens", 64)
+        snapshot = self.metrics.to_dict()
+        self.assertEqual(snapshot["stages"]["ner"]["count"], 3)
+        self.assertGreaterEqual(snapshot["stages"]["ner"]["mean"], 0.01)
+        self.assertEqual(snapshot["counters"], {"ner_tokens": 192})
+
+    def test_span_recorded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.span("download"):
+                raise ValueError()
+        self.assertEqual(self.metrics.to_dict()["stages"]["download"]["count"], 1)
+
+    def test_trace_propagation(self):
+        self.metrics.increment("downloaded_bytes", 10) # outside of the trace
+        with ThreadPoolExecutor(max_workers=2) as executor, self.metrics.trace() as trace:
+            with self.metrics.span("detect"):
+                future = submit(executor, self._registry_task)
+                self.metrics.increment("downloaded_bytes", 100)
+                future.result()
+            # tasks submitted without `submit` are not traced
+            executor.submit(self._registry_task).result()
+        trace_dict = trace.to_dict()
+        self.assertEqual([span["stage"] for span in trace_dict["spans"]], ["detect", "registry"])
+        self.assertEqual(trace_dict["counters"], {"downloaded_bytes": 150})
+        self.assertEqual(self.metrics.to_dict()["counters"], {"downloaded_bytes": 210})
+        self.assertEqual(self.metrics.to_dict()["stages"]["registry"]["count"], 2)
+
+    def _registry_task(self):
+        with self.metrics.span("registry"):
+            self.metrics.increment("downloaded_bytes", 50)
+
+    def test_prometheus_export(self):
+        self.metrics.observe("ner", 0.2)
+        self.metrics.observe("ner", 3.0)
+        self.metrics.increment("registry_cache_hits", 2)
+        text = self.metrics.to_prometheus()
+        lines = text.splitlines()
+        self.assertIn("# TYPE outcome_switch_stage_duration_seconds histogram", lines)
+        self.assertIn('outcome_switch_stage_duration_seconds_bucket{stage="ner",le="0.25"} 1', lines)
+        self.assertIn('outcome_switch_stage_duration_seconds_bucket{stage="ner",le="5.0"} 2', lines)
+        self.assertIn('outcome_switch_stage_duration_seconds_bucket{stage="ner",le="+Inf"} 2', lines)
+        self.assertIn('outcome_switch_stage_duration_seconds_count{stage="ner"} 2', lines)
+        self.assertIn("outcome_switch_registry_cache_hits_total 2", lines)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "metrics.prom")
+            self.metrics.write_prometheus(path)
+            self.assertEqual(Path(path).read_text(), text)
+
+    def test_json_export(self):
+        self.metrics.observe("similarity", 0.5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "metrics.jsonl")
+            self.metrics.write_json(path)
+            self.metrics.increment("articles_processed")
+            self.metrics.write_json(path)
+            snapshots = [json.loads(line) for line in Path(path).read_text().splitlines()]
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(snapshots[0]["stages"]["similarity"]["sum"], 0.5)
+        self.assertEqual(snapshots[1]["counters"], {"articles_processed": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
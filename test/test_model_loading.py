@@ -0,0 +1,75 @@
+import sys
+import unittest
+import threading
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.main import OutcomeSwitchingDetector
+
+CONFIG = {"outcome_extractor_path": "ner-model", "outcome_sim_path": "similarity-model"}
+
+
+class SlowLoadingDetector(OutcomeSwitchingDetector):
+    """Detector whose models are placeholders, loaded when `release` is set"""
+
+    def __init__(self, config, fail=False):
+        self.release = threading.Event()
+        self.fail = fail
+        self.load_count = 0
+        super().__init__(config)
+
+    def _load_models(self):
+        self.release.wait(5)
+        self.load_count += 1
+        if self.fail:
+            raise OSError("model not found")
+        return "ner", "similarity"
+
+
+class ModelLoadingTests(unittest.TestCase):
+
+    def test_no_heavy_imports(self):
+        code = "import sys, outcome_switch.main; print('torch' in sys.modules, 'transformers' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ["False", "False"])
+
+    def test_lazy(self):
+        detector = SlowLoadingDetector(CONFIG | {"model_loading": "lazy"})
+        detector.release.set()
+        self.assertFalse(detector.is_ready())
+        self.assertEqual(detector.outcomes_ner, "ner")
+        self.assertEqual(detector.similarity_assessor, "similarity")
+        self.assertTrue(detector.is_ready())
+        self.assertEqual(detector.load_count, 1)
+
+    def test_background(self):
+        detector = SlowLoadingDetector(CONFIG | {"model_loading": "background"})
+        self.assertFalse(detector.is_ready())
+        self.assertFalse(detector.wait_until_ready(timeout=0.1))
+        detector.release.set()
+        # requests wait for the loading in progress instead of loading the models again
+        self.assertEqual(detector.outcomes_ner, "ner")
+        self.assertTrue(detector.wait_until_ready(timeout=5))
+        self.assertEqual(detector.load_count, 1)
+
+    def test_background_error(self):
+        detector = SlowLoadingDetector(CONFIG | {"model_loading": "background"}, fail=True)
+        detector.release.set()
+        with self.assertRaises(RuntimeError):
+            detector.wait_until_ready(timeout=5)
+        self.assertFalse(detector.is_ready())
+        # loading is tried again at first use
+        with self.assertRaises(OSError):
+            detector.outcomes_ner
+        self.assertEqual(detector.load_count, 2)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            OutcomeSwitchingDetector(CONFIG | {"model_loading": "never"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import sys
+import json
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.article.parallel import ParallelArticleProcessor
+from outcome_switch.article.filter import SectionFilter
+
+EXAMPLE_DIR = Path(__file__).parent / "examples" / "NCT01623843_PMC6206648"
+
+
+class ParallelProcessingTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        article_xml = (EXAMPLE_DIR / "raw.xml").read_text()
+        # articles with distinct ids to check the output order, and an invalid article
+        cls.articles = [(article_xml.replace("6206648", str(1000000 + i)), "pmc") for i in range(9)]
+        cls.articles.insert(4, ("<article><body>", "pmc"))
+        with open(EXAMPLE_DIR / "parsed.json", "r") as f:
+            cls.parsed = json.load(f)
+
+    def check_outputs(self, outputs):
+        self.assertEqual(len(outputs), len(self.articles))
+        self.assertIsNone(outputs[4][1])
+        self.assertTrue(outputs[4][0]["error"].startswith("ParseError"))
+        self.assertEqual(outputs[4][0]["source_index"], 4)
+        del outputs[4]
+        self.assertEqual([d["retrieved_article_id"] for d, _ in outputs], [f"PMC{1000000 + i}" for i in range(9)])
+        download_output, filter_output = outputs[0]
+        self.assertEqual(download_output["article_xml_string"], self.articles[0][0])
+        self.assertEqual(download_output["text_sections"], self.parsed["text_sections"])
+        self.assertEqual(filter_output, SectionFilter().filter_sections(self.parsed["text_sections"], self.parsed["text_type"]))
+
+    def test_process_pool(self):
+        processor = ParallelArticleProcessor(max_workers=2, chunksize=2)
+        self.check_outputs(list(processor.process(iter(self.articles))))
+
+    def test_main_process(self):
+        processor = ParallelArticleProcessor(max_workers=0, chunksize=3)
+        self.check_outputs(list(processor.process(self.articles)))
+
+    def test_multi_article_documents(self):
+        # efetch response split in the workers, articles are serialized again, bytes documents are decoded
+        response = "<pmc-articleset>" + "".join(xml for xml, _ in self.articles[:3]) + "</pmc-articleset>"
+        processor = ParallelArticleProcessor(max_workers=0)
+        outputs = list(processor.process([(response, "pmc"), (self.articles[3][0].encode("utf-8"), "pmc")]))
+        self.assertEqual([d["retrieved_article_id"] for d, _ in outputs], [f"PMC{1000000 + i}" for i in range(4)])
+        self.assertTrue(outputs[1][0]["article_xml_string"].startswith("<article"))
+        self.assertEqual(outputs[3][0]["article_xml_string"], self.articles[3][0])
+
+    def test_pmcids_filter(self):
+        response = "<pmc-articleset>" + "".join(xml for xml, _ in self.articles[:3]) + "</pmc-articleset>"
+        outputs = ParallelArticleProcessor(max_workers=0).process([(response, "pmc")], {"PMC1000001"})
+        self.assertEqual([d["retrieved_article_id"] for d, _ in outputs], ["PMC1000001"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
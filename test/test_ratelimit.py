@@ -0,0 +1,78 @@
+import sys
+import time
+import unittest
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.ratelimit import RequestScheduler, INTERACTIVE, BATCH, get_ncbi_session
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Answer 429 with a Retry-After header to the first request, 200 to the next ones"""
+
+    def do_GET(self):
+        self.server.request_times.append(time.monotonic())
+        rate_limited = len(self.server.request_times) == 1
+        self.send_response(429 if rate_limited else 200)
+        if rate_limited:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RequestSchedulerTests(unittest.TestCase):
+
+    def test_rate(self):
+        scheduler = RequestScheduler(rate=20)
+        start = time.monotonic()
+        for _ in range(6):
+            scheduler.acquire()
+        # first request is sent immediately, the next ones every 50ms
+        self.assertGreaterEqual(time.monotonic() - start, 0.24)
+
+    def test_default_rates(self):
+        self.assertEqual(RequestScheduler().rate, 3)
+        self.assertEqual(RequestScheduler(api_key="key").rate, 10)
+        self.assertEqual(RequestScheduler(api_key="key").add_api_key({"db": "pmc"}), {"db": "pmc", "api_key": "key"})
+
+    def test_priority(self):
+        scheduler = RequestScheduler(rate=100)
+        served = []
+        scheduler.pause(0.2)
+        def request(name, priority):
+            with RequestScheduler.priority(priority):
+                scheduler.acquire()
+            served.append(name)
+        threads = []
+        for name, priority in [("batch_1", BATCH), ("batch_2", BATCH), ("interactive", INTERACTIVE)]:
+            threads.append(threading.Thread(target=request, args=(name, priority)))
+            threads[-1].start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(served, ["interactive", "batch_1", "batch_2"])
+
+    def test_retry_after(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+        server.request_times = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            scheduler = RequestScheduler(rate=100)
+            response = scheduler.request(get_ncbi_session(), "GET", f"http://127.0.0.1:{server.server_address[1]}/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(server.request_times), 2)
+            self.assertGreaterEqual(server.request_times[1] - server.request_times[0], 1.0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,110 @@
+import sys
+import json
+import requests
+import unittest
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.registry import CTGOVExtractor, CTGOVAPIv2Backend, CTGOVV2Backend
+from outcome_switch.session import get_session
+
+EXAMPLE_PATH = Path(__file__).parent / "examples" / "ctgov_example_apiv2.json"
+
+
+class StubCTGOVHandler(BaseHTTPRequestHandler):
+    """Serve copies of the example study for all requested ids (except NCT99999999) and record the requests,
+    answer 503 to the requests of ids in `server.failing_ids`"""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.server.requests.append(query)
+        if set(query["filter.ids"][0].split(",")) & self.server.failing_ids :
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        example = EXAMPLE_PATH.read_text()
+        studies = [json.loads(example.replace("NCT04412252", nct_id))
+                   for nct_id in query["filter.ids"][0].split(",") if nct_id != "NCT99999999"]
+        body = json.dumps({"studies": studies}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CTGOVAPIv2BackendTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubCTGOVHandler)
+        cls.server.requests = []
+        cls.server.failing_ids = set()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f"http://127.0.0.1:{cls.server.server_address[1]}/api/v2/studies"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.failing_ids.clear()
+        self.backend = CTGOVAPIv2Backend(session=get_session(max_retries=0), api_url=self.api_url)
+
+    def test_prefetch_in_one_request(self):
+        nct_ids = [f"NCT{i:08d}" for i in range(50)]
+        extractor = CTGOVExtractor(backend=self.backend)
+        extractor.prefetch(nct_ids)
+        infos = [extractor.get_all_infos(nct_id) for nct_id in nct_ids]
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0]["fields"][0].split(","), CTGOVAPIv2Backend.FIELDS)
+        self.assertEqual(len(infos[0]["full_registry_outcomes"]["Current Secondary Outcome Measures"]), 4)
+        self.assertEqual(infos[0]["LastUpdatePostDate"], ["2020-07-31"])
+
+    def test_batches(self):
+        self.backend.batch_size = 20
+        self.backend.prefetch([f"NCT{i:08d}" for i in range(50)])
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_not_found(self):
+        self.assertIsNone(self.backend.get_study("NCT99999999"))
+        self.assertIsNone(self.backend.get_study("NCT99999999"))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.backend.get_outcome_related_informations("NCT99999999"), {})
+
+    def test_failed_batch_not_cached(self):
+        self.backend.batch_size = 2
+        self.server.failing_ids.add("NCT00000003")
+        self.backend.prefetch([f"NCT{i:08d}" for i in range(4)])
+        self.assertEqual(len(self.server.requests), 2)
+        # trials of the failed batch are not remembered as not found, their lookup fails until the api answers
+        self.assertIsNotNone(self.backend.get_study("NCT00000001"))
+        self.assertEqual(len(self.server.requests), 2)
+        with self.assertRaises(requests.HTTPError):
+            self.backend.get_study("NCT00000003")
+        self.server.failing_ids.clear()
+        self.assertIsNotNone(self.backend.get_study("NCT00000002"))
+        self.assertIsNotNone(self.backend.get_study("NCT00000003"))
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_v2_base_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CTGOVV2Backend()
+
+    def test_last_update(self):
+        self.assertEqual(self.backend.get_last_update("NCT00000001"), ["2020-07-31"])
+        self.assertIsNone(self.backend.get_last_update("NCT99999999"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
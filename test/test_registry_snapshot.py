@@ -0,0 +1,70 @@
+import sys
+import json
+import zipfile
+import tempfile
+import unittest
+from os.path import join
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from outcome_switch.registry import CTGOVExtractor, CTGOVSnapshotBackend, RegistryBackend
+from outcome_switch.utils import convert_registry_outcomes
+
+EXAMPLE_PATH = Path(__file__).parent / "examples" / "ctgov_example_apiv2.json"
+
+
+class CTGOVSnapshotBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.backend = CTGOVSnapshotBackend(join(self.tmp_dir.name, "ctgov.sqlite"))
+        self.assertEqual(self.backend.load_dump(str(EXAMPLE_PATH)), 1)
+
+    def tearDown(self):
+        self.backend.connection.close()
+        self.tmp_dir.cleanup()
+
+    def test_outcome_lines(self):
+        outcomes = self.backend.extract_outcome_lines("NCT04412252")
+        primary = outcomes["Current Primary Outcome Measures"]
+        self.assertEqual(len(primary), 1)
+        self.assertEqual((primary[0].text, primary[0].time_frame, primary[0].date_type.value), ("Clinical status using ordinal scale", "Day 28", "current"))
+        self.assertEqual(len(outcomes["Current Secondary Outcome Measures"]), 4)
+        self.assertEqual(outcomes["Original Primary Outcome Measures"], [])
+
+    def test_outcome_related_informations(self):
+        infos = self.backend.get_outcome_related_informations("NCT04412252")
+        self.assertEqual(infos["StartDate"], ["2020-07-06"])
+        self.assertEqual(infos["LastUpdatePostDate"], ["2020-07-31"])
+        self.assertEqual(infos["ReferencePMID"], [])
+        self.assertEqual(self.backend.get_outcome_related_informations("NCT00000000"), {})
+
+    def test_zip_dump(self):
+        study = json.loads(EXAMPLE_PATH.read_text())
+        other_study = json.loads(json.dumps(study).replace("NCT04412252", "NCT00000001"))
+        with zipfile.ZipFile(join(self.tmp_dir.name, "ctg-studies.json.zip"), "w") as archive:
+            archive.writestr("NCT04412252.json", json.dumps(study))
+            archive.writestr("NCT00000001.json", json.dumps(other_study))
+        self.assertEqual(self.backend.load_dump(join(self.tmp_dir.name, "ctg-studies.json.zip")), 2)
+        self.assertEqual(len(self.backend), 2)
+
+    def test_extractor(self):
+        extractor = CTGOVExtractor(backend=self.backend)
+        infos = extractor.get_all_infos("NCT04412252")
+        self.assertEqual(infos["primary_current-original_modif"], "")
+        self.assertEqual(len(convert_registry_outcomes(infos["full_registry_outcomes"], date_type_filter="current")), 5)
+
+
+class RegistryBackendTests(unittest.TestCase):
+
+    def test_incomplete_backend(self):
+        class OutcomesOnlyBackend(RegistryBackend):
+            def extract_outcome_lines(self, nct_id):
+                return {}
+        with self.assertRaises(TypeError):
+            OutcomesOnlyBackend()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,29 @@
+from os.path import join
+from typing import List, Optional
+
+import torch
+from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+LABELS = ["O", "B-PrimaryOutcome", "I-PrimaryOutcome", "B-SecondaryOutcome", "I-SecondaryOutcome"]
+
+
+def save_tiny_token_classifier(model_dir: str, words: List[str], model_max_length: Optional[int] = None, **config_kwargs) -> None:
+    """Save a small randomly initialized (seeded) BERT outcomes token classifier and its word-level tokenizer
+    to `model_dir`, so that the tests do not need to download the outcomes detection model.
+
+    Args:
+        model_dir (str): existing directory of the model files
+        words (List[str]): vocabulary of the tokenizer (special tokens are added)
+        model_max_length (int, optional): max length of the tokenizer. Defaults to None (tokenizer default).
+        config_kwargs: `BertConfig` sizes (hidden_size, num_hidden_layers, ...)
+    """
+    vocab_path = join(model_dir, "vocab.txt")
+    with open(vocab_path, "w") as f:
+        f.write("\n".join(SPECIAL_TOKENS + words))
+    tokenizer_kwargs = {"model_max_length": model_max_length} if model_max_length is not None else {}
+    BertTokenizerFast(vocab_file=vocab_path, **tokenizer_kwargs).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(SPECIAL_TOKENS) + len(words), id2label=dict(enumerate(LABELS)),
+                        label2id={label: i for i, label in enumerate(LABELS)}, **config_kwargs)
+    BertForTokenClassification(config).save_pretrained(model_dir)